@@ -0,0 +1,309 @@
+"""
+واجهة غير متزامنة لعميل الميكروتك
+
+تنفذ أوامر MikroTikAPIClient المتزامنة في خيوط منفصلة لكل راوتر
+حتى لا يتوقف البوت بالكامل بسبب راوتر بطيء.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from config import (
+    MIKROTIK_EXECUTOR_WORKERS, MIKROTIK_CALL_TIMEOUT, MIKROTIK_DIAGNOSTIC_TIMEOUT,
+    MIKROTIK_BULK_TIMEOUT_PER_1000
+)
+from hotspot_mirror import HotspotActiveMirror, HotspotUserIndex, search_users
+from mikrotik_api_client import MikroTikAPIClient, session_key
+from models import (
+    MikroTikDevice, SystemInfo, NetworkInterface, HotspotUser, BulkAddResult, UserSelector,
+    NetworkDevice, PingResult, TracerouteResult, SystemHealth
+)
+
+logger = logging.getLogger(__name__)
+
+# منفذ (Executor) محدود لكل راوتر
+_router_executors: Dict[Tuple[str, int], ThreadPoolExecutor] = {}
+_router_executors_lock = threading.Lock()
+
+
+def get_router_executor(device: MikroTikDevice) -> ThreadPoolExecutor:
+    """الحصول على منفذ الخيوط الخاص بالراوتر (يُنشأ عند أول استخدام)"""
+    key = (device.ip, device.port)
+    with _router_executors_lock:
+        executor = _router_executors.get(key)
+        if executor is None:
+            executor = ThreadPoolExecutor(
+                max_workers=MIKROTIK_EXECUTOR_WORKERS,
+                thread_name_prefix=f"mikrotik-{device.ip}-{device.port}"
+            )
+            _router_executors[key] = executor
+        return executor
+
+
+def shutdown_router_executors(wait: bool = False):
+    """إيقاف جميع منفذات الراوترات"""
+    with _router_executors_lock:
+        executors = list(_router_executors.values())
+        _router_executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
+
+
+class AsyncMikroTikClient:
+    """واجهة غير متزامنة حول MikroTikAPIClient مع مهلة لكل أمر"""
+
+    def __init__(self, client: MikroTikAPIClient, executor: ThreadPoolExecutor = None,
+                 timeout: float = MIKROTIK_CALL_TIMEOUT):
+        self.client = client
+        self.device = client.device
+        self.executor = executor or get_router_executor(client.device)
+        self.timeout = timeout
+        # يُفعّل من مجمع الاتصالات: يعاد الاتصال تلقائياً عند انقطاعه
+        self.auto_reconnect = False
+        # يُضبط من مجمع الاتصالات عند إغلاق مقبس خامل: يُعاد فتحه عند أول أمر
+        self.idle_closed = False
+        # وقت آخر أمر أُرسل للراوتر (يعتمد عليه المجمع في اكتشاف الخمول)
+        self.last_used = time.monotonic()
+        # يُفعّل من مجمع الاتصالات: تُخدم الجلسات النشطة والبحث من نسخ محلية
+        self.mirror_enabled = False
+        self.active_mirror: Optional[HotspotActiveMirror] = None
+        self.user_index: Optional[HotspotUserIndex] = None
+
+    def is_connected(self) -> bool:
+        """حالة المقبس الفعلية (لا يتطلب الوصول إلى الراوتر)؛ المغلق لخموله يُفتح عند أول أمر"""
+        return self.client.is_connected() or (self.auto_reconnect and self.idle_closed)
+
+    def _invoke(self, call, default, retry: bool):
+        """تنفيذ الأمر داخل خيط الراوتر مع إعادة الاتصال عند الحاجة"""
+        if self.auto_reconnect and not self.client.is_connected():
+            # إن فشلت إعادة الاتصال يظهر الاتصال منقطعاً حتى لو أُغلق لخموله
+            self.idle_closed = False
+            logger.info(f"إعادة الاتصال بـ {self.device}")
+            if not self.client.reconnect():
+                return default
+
+        result = call()
+
+        # فشل الأمر قد يعني اتصالاً ميتاً: نتحقق ونعيد المحاولة مرة واحدة
+        if retry and self.auto_reconnect and result == default and not self.client.check_connection():
+            logger.info(f"إعادة الاتصال بـ {self.device} وإعادة تنفيذ الأمر")
+            if self.client.reconnect():
+                result = call()
+
+        return result
+
+    async def _run(self, func, *args, default=None, timeout: float = None, retry: bool = True, **kwargs):
+        """تنفيذ أمر متزامن في منفذ الراوتر مع مهلة قصوى"""
+        loop = asyncio.get_running_loop()
+        self.last_used = time.monotonic()
+        call = functools.partial(self._invoke, functools.partial(func, *args, **kwargs), default, retry)
+        deadline = timeout if timeout is not None else self.timeout
+
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, call), deadline)
+        except asyncio.TimeoutError:
+            # الخيط يستمر حتى تنتهي مهلة المقبس، لكن المعالج لا ينتظره
+            logger.error(f"انتهت مهلة الأمر {getattr(func, '__name__', func)} على {self.device} ({deadline} ثانية)")
+            return default
+
+    async def connect(self) -> bool:
+        """الاتصال بجهاز الميكروتك"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, self.client.connect), self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(f"انتهت مهلة الاتصال بـ {self.device}")
+            return False
+
+    async def disconnect(self):
+        """قطع الاتصال"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, self.client.disconnect)
+
+    async def check_connection(self) -> bool:
+        """فحص فعلي للاتصال (keepalive)"""
+        loop = asyncio.get_running_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.executor, self.client.check_connection),
+                                          self.timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"انتهت مهلة فحص الاتصال بـ {self.device}")
+            return False
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """عدادات الذاكرة المؤقتة للراوتر"""
+        return self.client.cache_stats()
+
+    async def get_system_info(self) -> Optional[SystemInfo]:
+        """الحصول على معلومات النظام"""
+        return await self._run(self.client.get_system_info)
+
+    async def get_interfaces(self, extra_fields: Sequence[str] = ()) -> List[NetworkInterface]:
+        """الحصول على قائمة الواجهات"""
+        return await self._run(self.client.get_interfaces, extra_fields, default=[])
+
+    def _ready_mirror(self) -> Optional[HotspotActiveMirror]:
+        """النسخة المحلية إن كانت جاهزة (تبدأ المزامنة عند أول طلب)"""
+        if not self.mirror_enabled:
+            return None
+        if self.active_mirror is None:
+            self.active_mirror = HotspotActiveMirror(self.device)
+            self.active_mirror.start()
+        return self.active_mirror if self.active_mirror.ready else None
+
+    def _ready_user_index(self) -> Optional[HotspotUserIndex]:
+        """فهرس المستخدمين إن كان جاهزاً (يبدأ التحميل عند أول بحث)"""
+        if not self.mirror_enabled:
+            return None
+        if self.user_index is None:
+            self.user_index = HotspotUserIndex(self.device)
+            self.user_index.start()
+        return self.user_index if self.user_index.ready else None
+
+    async def stop_mirror(self):
+        """إيقاف النسخ المحلية (الجلسات النشطة وفهرس المستخدمين)"""
+        if self.active_mirror is not None:
+            await self.active_mirror.stop()
+            self.active_mirror = None
+        if self.user_index is not None:
+            await self.user_index.stop()
+            self.user_index = None
+
+    async def get_hotspot_active_users(self, extra_fields: Sequence[str] = ()) -> List[HotspotUser]:
+        """الحصول على المستخدمين النشطين في الهوتسبوت"""
+        mirror = self._ready_mirror()
+        if mirror is not None and not extra_fields:
+            return mirror.users()
+        return await self._run(self.client.get_hotspot_active_users, extra_fields, default=[])
+
+    async def get_hotspot_users(self, extra_fields: Sequence[str] = ()) -> List[HotspotUser]:
+        """الحصول على جميع مستخدمي الهوتسبوت"""
+        index = self._ready_user_index()
+        if index is not None and not extra_fields:
+            return index.users()
+        return await self._run(self.client.get_hotspot_users, extra_fields, default=[])
+
+    async def find_hotspot_active_users(self, users: Sequence[str] = None, extra_fields: Sequence[str] = (),
+                                        strict: bool = False) -> Optional[List[HotspotUser]]:
+        """الجلسات النشطة لمستخدمين محددين (strict: None عند الخطأ أو انتهاء المهلة)"""
+        mirror = self._ready_mirror()
+        if mirror is not None and not extra_fields:
+            if users is None:
+                return mirror.users()
+            return [session for name in dict.fromkeys(users) for session in mirror.find_by_user(name)]
+        return await self._run(self.client.find_hotspot_active_users, users, extra_fields,
+                               strict=strict, default=None if strict else [])
+
+    async def find_hotspot_users(self, name: str = None, name_prefix: str = None, profile: str = None,
+                                 disabled: bool = None, extra_fields: Sequence[str] = (),
+                                 names: Sequence[str] = None, strict: bool = False) -> Optional[List[HotspotUser]]:
+        """البحث عن مستخدمي الهوتسبوت بشروط تُنفذ على الراوتر (strict: None عند الخطأ أو انتهاء المهلة)"""
+        return await self._run(self.client.find_hotspot_users, name=name, name_prefix=name_prefix,
+                               profile=profile, disabled=disabled, extra_fields=extra_fields,
+                               names=names, strict=strict, default=None if strict else [])
+
+    async def search_hotspot_users(self, term: str, offset: int = 0,
+                                   limit: int = 10) -> Tuple[List[HotspotUser], int]:
+        """
+        البحث في مستخدمي الهوتسبوت بالاسم أو التعليق؛ يعيد (الصفحة، إجمالي النتائج)
+        
+        من الفهرس المحلي عند جاهزيته، وإلا بقراءة كاملة من الراوتر وتصفيتها محلياً بنفس الترتيب
+        (API لا يدعم البحث الجزئي، ومطابقة بداية الاسم وحدها تُسقط نتائج التعليق وجزء الاسم).
+        """
+        index = self._ready_user_index()
+        if index is not None:
+            return index.search(term, offset, limit)
+
+        return search_users(await self.get_hotspot_users(), term, offset, limit)
+
+    async def get_hotspot_profiles(self) -> List[str]:
+        """أسماء بروفايلات مستخدمي الهوتسبوت"""
+        return await self._run(self.client.get_hotspot_profiles, default=[])
+
+    async def add_hotspot_user(self, user: HotspotUser) -> bool:
+        """إضافة مستخدم هوتسبوت جديد"""
+        return await self._run(self.client.add_hotspot_user, user, default=False, retry=False)
+
+    async def _run_bulk(self, func, items, keys: List[str],
+                        progress: Callable[[int, int], None] = None) -> BulkAddResult:
+        """تنفيذ عملية جماعية بمهلة تتناسب مع عدد العناصر (progress تُستدعى داخل حلقة الأحداث)"""
+        loop = asyncio.get_running_loop()
+        report = None
+        if progress:
+            def report(done: int, total: int):
+                loop.call_soon_threadsafe(progress, done, total)
+
+        timeout = self.timeout + len(keys) / 1000 * MIKROTIK_BULK_TIMEOUT_PER_1000
+        result = await self._run(func, items, progress=report, default=None, timeout=timeout, retry=False)
+        if result is None:
+            # انتهت المهلة أو انقطع الاتصال: نتيجة كل عنصر غير معروفة
+            result = BulkAddResult(failed={key: 'انتهت المهلة' for key in keys})
+        return result
+
+    async def add_hotspot_users(self, users: List[HotspotUser],
+                                progress: Callable[[int, int], None] = None) -> BulkAddResult:
+        """إضافة مجموعة مستخدمين بأوامر متتالية"""
+        return await self._run_bulk(self.client.add_hotspot_users, users, [user.name for user in users], progress)
+
+    async def update_hotspot_users(self, changes: Dict[str, Dict[str, str]],
+                                   progress: Callable[[int, int], None] = None) -> BulkAddResult:
+        """تعديل عدة مستخدمين بأوامر set متتالية"""
+        return await self._run_bulk(self.client.update_hotspot_users, changes, list(changes), progress)
+
+    async def select_hotspot_users(self, selector: UserSelector) -> List[HotspotUser]:
+        """مستخدمو الهوتسبوت المطابقون لشروط الاختيار"""
+        return await self._run(self.client.select_hotspot_users, selector, default=[])
+
+    async def select_hotspot_sessions(self, selector: UserSelector) -> List[HotspotUser]:
+        """الجلسات النشطة المطابقة لشروط الاختيار"""
+        return await self._run(self.client.select_hotspot_sessions, selector, default=[])
+
+    async def set_hotspot_users_disabled(self, users: List[HotspotUser], disabled: bool,
+                                         progress: Callable[[int, int], None] = None) -> BulkAddResult:
+        """تعطيل أو تفعيل عدة مستخدمين بأوامر set متتالية"""
+        func = functools.partial(self.client.set_hotspot_users_disabled, disabled=disabled)
+        return await self._run_bulk(func, users, [user.name for user in users], progress)
+
+    async def remove_hotspot_users(self, users: List[HotspotUser],
+                                   progress: Callable[[int, int], None] = None) -> BulkAddResult:
+        """حذف عدة مستخدمين بأوامر remove متتالية"""
+        return await self._run_bulk(self.client.remove_hotspot_users, users, [user.name for user in users], progress)
+
+    async def remove_hotspot_sessions(self, sessions: List[HotspotUser],
+                                      progress: Callable[[int, int], None] = None) -> BulkAddResult:
+        """قطع عدة جلسات نشطة بأوامر remove متتالية"""
+        return await self._run_bulk(self.client.remove_hotspot_sessions, sessions,
+                                    [session_key(session) for session in sessions], progress)
+
+    async def remove_hotspot_user(self, username: str) -> bool:
+        """حذف مستخدم هوتسبوت"""
+        return await self._run(self.client.remove_hotspot_user, username, default=False, retry=False)
+
+    async def ping(self, target: str, count: int = 4) -> Optional[PingResult]:
+        """تنفيذ اختبار Ping"""
+        return await self._run(self.client.ping, target, count=count,
+                               timeout=MIKROTIK_DIAGNOSTIC_TIMEOUT)
+
+    async def traceroute(self, target: str, max_hops: int = 30) -> Optional[TracerouteResult]:
+        """تنفيذ تتبع المسار"""
+        return await self._run(self.client.traceroute, target, max_hops=max_hops,
+                               timeout=MIKROTIK_DIAGNOSTIC_TIMEOUT)
+
+    async def discover_devices(self, network: str = "192.168.88.0/24") -> List[NetworkDevice]:
+        """اكتشاف الأجهزة في الشبكة"""
+        return await self._run(self.client.discover_devices, network, default=[],
+                               timeout=MIKROTIK_DIAGNOSTIC_TIMEOUT)
+
+    async def reboot_system(self) -> bool:
+        """إعادة تشغيل النظام"""
+        return await self._run(self.client.reboot_system, default=False, retry=False)
+
+    async def get_system_health(self) -> Optional[SystemHealth]:
+        """فحص صحة النظام"""
+        return await self._run(self.client.get_system_health,
+                               timeout=MIKROTIK_DIAGNOSTIC_TIMEOUT)
@@ -0,0 +1,161 @@
+"""
+تطبيق انتهاء صلاحية الكروت على الراوتر
+
+وقت الانتهاء يُحفظ مع الكرت (expires_at)، فتُقرأ الكروت المنتهية بفهرس جزئي
+على الكروت غير المعالجة فقط، وتُعاد أسماء كروت السلاسل المنتهية من أرقامها
+التسلسلية. تُحذف أو تُعطل على الراوتر على دفعات مع قطع جلساتها النشطة، ثم
+تُسجل حالتها (expired_at) فلا تُفحص مرة أخرى.
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from card_reconciler import device_groups
+from config import CARD_EXPIRY_ACTION, CARD_EXPIRY_INTERVAL, CARD_EXPIRY_BATCH_SIZE
+from connection_pool import RouterConnectionPool
+from database import DatabaseManager
+from models import CardSeries
+
+logger = logging.getLogger(__name__)
+
+
+def _add_counts(totals: Dict[str, int], counts: Dict[str, int]):
+    for state, count in counts.items():
+        if count:
+            totals[state] = totals.get(state, 0) + count
+
+
+class CardExpiryEnforcer:
+    """حذف أو تعطيل الكروت المنتهية دورياً على جميع الراوترات المحفوظة"""
+
+    def __init__(self, db: DatabaseManager, pool: RouterConnectionPool, action: str = CARD_EXPIRY_ACTION,
+                 interval: float = CARD_EXPIRY_INTERVAL, batch_size: int = CARD_EXPIRY_BATCH_SIZE):
+        if action not in ('remove', 'disable'):
+            raise ValueError(f"إجراء انتهاء الصلاحية غير معروف: {action}")
+        self.db = db
+        self.pool = pool
+        self.action = action
+        self.interval = interval
+        self.batch_size = batch_size
+
+    @property
+    def state(self) -> str:
+        """حالة الكرت بعد تطبيق الإجراء"""
+        return 'removed' if self.action == 'remove' else 'disabled'
+
+    async def _expire_names(self, client, names: List[str]) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        حذف أو تعطيل المستخدمين بالأسماء وقطع جلساتهم
+
+        يعيد (الأسماء المعالجة، الأسماء غير الموجودة على الراوتر)، أو None إذا تعذرت قراءة
+        المستخدمين؛ القائمة الفارغة عند الخطأ ستُفسر كأن الكروت غير موجودة على الراوتر.
+        """
+        users = await client.find_hotspot_users(names=names, extra_fields=('.id',), strict=True)
+        if users is None:
+            logger.warning(f"تعذر قراءة مستخدمي {client.device}؛ تأجيل دفعة انتهاء الكروت")
+            return None
+        on_router = {user.name for user in users}
+
+        if self.action == 'remove':
+            result = await client.remove_hotspot_users(users)
+        else:
+            result = await client.set_hotspot_users_disabled(users, disabled=True)
+
+        # الجلسات المفتوحة تبقى بعد الحذف أو التعطيل حتى تُقطع
+        done = list(result.added)
+        sessions = await client.find_hotspot_active_users(done, extra_fields=('.id',))
+        if sessions:
+            await client.remove_hotspot_sessions(sessions)
+
+        if result.failed:
+            logger.warning(f"فشل تطبيق انتهاء {len(result.failed)} كرت على {client.device}")
+        return done, [name for name in names if name not in on_router]
+
+    async def _expire_batch(self, client, cards: List[Dict]) -> Dict[str, int]:
+        """معالجة دفعة واحدة؛ يعيد عدد الكروت لكل حالة"""
+        ids_by_name: Dict[str, List[int]] = {}
+        for card in cards:
+            ids_by_name.setdefault(card['username'], []).append(card['id'])
+
+        outcome = await self._expire_names(client, list(ids_by_name))
+        if outcome is None:
+            # تبقى الدفعة غير معالجة للجولة التالية
+            return {}
+        done, missing = outcome
+
+        processed = {
+            self.state: [card_id for name in done for card_id in ids_by_name[name]],
+            # غير موجود على الراوتر أصلاً: لا شيء لتطبيقه
+            'missing': [card_id for name in missing for card_id in ids_by_name[name]],
+        }
+        for state_name, card_ids in processed.items():
+            await asyncio.to_thread(self.db.mark_cards_expired, card_ids, state_name)
+        return {state_name: len(card_ids) for state_name, card_ids in processed.items()}
+
+    async def _expire_series(self, client, series: CardSeries) -> Dict[str, int]:
+        """
+        معالجة سلسلة منتهية على دفعات
+
+        كروت السلسلة لا تُحفظ صفاً صفاً، فتُعاد أسماؤها من الأرقام التسلسلية. تُسجل السلسلة
+        مرة واحدة بعد نجاح جميع دفعاتها، وإلا تُعاد في الجولة التالية (المعالجة تُحسب غائبة).
+        """
+        counts = {self.state: 0, 'missing': 0}
+        complete = True
+        for start in range(series.start, series.end, self.batch_size):
+            names = [series.username(serial) for serial in range(start, min(start + self.batch_size, series.end))]
+            outcome = await self._expire_names(client, names)
+            if outcome is None:
+                complete = False
+                break
+            done, missing = outcome
+            counts[self.state] += len(done)
+            counts['missing'] += len(missing)
+            complete = complete and len(done) + len(missing) == len(names)
+
+        if complete:
+            await asyncio.to_thread(self.db.mark_series_expired, series.id, self.state)
+        return counts
+
+    async def enforce(self, client, device_ids: Sequence[int]) -> Dict[str, int]:
+        """معالجة جميع الكروت والسلاسل المنتهية لراوتر واحد على دفعات"""
+        totals: Dict[str, int] = {}
+        # القائمة الفارغة عند انقطاع الاتصال ستُفسر كأن الكروت غير موجودة على الراوتر
+        if not await client.check_connection():
+            return totals
+        while True:
+            cards = await asyncio.to_thread(self.db.get_expired_cards, device_ids, self.batch_size)
+            if not cards:
+                break
+            counts = await self._expire_batch(client, cards)
+            _add_counts(totals, counts)
+            # الفاشلة تبقى غير معالجة؛ نتوقف حتى الجولة التالية بدلاً من تكرارها الآن
+            if sum(counts.values()) < len(cards):
+                break
+
+        for series in await asyncio.to_thread(self.db.get_expired_series, device_ids):
+            _add_counts(totals, await self._expire_series(client, series))
+        return totals
+
+    async def enforce_all(self):
+        """جولة واحدة على جميع الراوترات المحفوظة"""
+        for device, device_ids in await asyncio.to_thread(device_groups, self.db):
+            holder_id = ('card_expiry', device_ids[-1])
+            client = await self.pool.acquire(holder_id, device)
+            if not client:
+                logger.warning(f"تعذر الاتصال بـ {device} لتطبيق انتهاء الكروت")
+                continue
+            try:
+                totals = await self.enforce(client, device_ids)
+                if totals:
+                    logger.info(f"انتهاء الكروت على {device}: {totals}")
+            except Exception as e:
+                logger.error(f"خطأ في تطبيق انتهاء الكروت على {device}: {e}")
+            finally:
+                await self.pool.release(holder_id, device)
+
+    async def run(self):
+        """تشغيل التطبيق دورياً في الخلفية"""
+        while True:
+            await self.enforce_all()
+            await asyncio.sleep(self.interval)
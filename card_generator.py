@@ -2,11 +2,18 @@
 مولد كروت الهوتسبوت مع إنشاء ملفات PDF
 """
 
+import hashlib
+import hmac
 import logging
-import random
+import os
+import secrets
 import string
-from typing import List, Dict, Any
+import tempfile
+from functools import lru_cache
+from itertools import groupby
+from typing import AbstractSet, BinaryIO, List, Dict, Any, Tuple
 from datetime import datetime, timedelta
+from urllib.parse import urlencode
 import io
 
 from reportlab.lib.pagesizes import A4
@@ -17,11 +24,129 @@ from reportlab.lib import colors
 from reportlab.lib.enums import TA_CENTER, TA_RIGHT
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.graphics.barcode import qrencoder
+from reportlab.graphics.barcode.qrencoder import QRErrorCorrectLevel
+from reportlab.pdfgen import canvas
 
-from models import HotspotCard, HotspotUser
+from config import CARDS_PER_PAGE, CARDS_PER_ROW, CARD_LOGO_PATH, HOTSPOT_LOGIN_URL, PDF_SPOOL_MAX_SIZE
+from models import CardSeries, HotspotCard, HotspotUser, format_data_quota, format_time_quota
 
 logger = logging.getLogger(__name__)
 
+USERNAME_ALPHABET = string.digits
+PASSWORD_ALPHABET = string.ascii_letters + string.digits
+
+
+@lru_cache(maxsize=None)
+def _byte_mapping(alphabet: str) -> Tuple[bytes, bytes]:
+    """جدول تحويل البايت إلى حرف، والبايتات المرفوضة حتى يكون التوزيع متساوياً"""
+    limit = 256 - 256 % len(alphabet)
+    table = bytes(ord(alphabet[value % len(alphabet)]) if value < limit else 0 for value in range(256))
+    return table, bytes(range(limit, 256))
+
+
+def random_strings(alphabet: str, length: int, count: int) -> List[str]:
+    """
+    نصوص عشوائية آمنة بالجملة
+
+    تُسحب البايتات من secrets على كتل كبيرة وتُحول إلى حروف بـ bytes.translate
+    مع حذف البايتات خارج أكبر مضاعف لطول الأبجدية (بلا انحياز لحروف معينة).
+    """
+    table, rejected = _byte_mapping(alphabet)
+    needed = length * count
+    accepted = 256 - len(rejected)
+    chars = b''
+    while len(chars) < needed:
+        block = secrets.token_bytes((needed - len(chars)) * 256 // accepted + 64)
+        chars += block.translate(table, rejected)
+    text = chars[:needed].decode('ascii')
+    return [text[start:start + length] for start in range(0, needed, length)]
+
+
+def derive_string(secret: bytes, message: bytes, alphabet: str, length: int) -> str:
+    """نص ثابت مشتق من المفتاح والرسالة بـ HMAC-SHA256 (بنفس تحويل random_strings)"""
+    table, rejected = _byte_mapping(alphabet)
+    chars = b''
+    block = 0
+    # الملخص الواحد يكفي غالباً؛ تُضاف ملخصات بعداد إذا رُفض عدد كبير من البايتات
+    while len(chars) < length:
+        digest = hmac.new(secret, message + block.to_bytes(4, 'big'), hashlib.sha256).digest()
+        chars += digest.translate(table, rejected)
+        block += 1
+    return chars[:length].decode('ascii')
+
+
+def qr_version(texts: List[str]) -> int:
+    """أصغر إصدار QR يتسع لأطول نص في الدفعة (تكون جميع رموز الدفعة بنفس الحجم)"""
+    code = qrencoder.QRCode(None, QRErrorCorrectLevel.M)
+    code.addData(max(texts, key=len))
+    return code.calculate_version()
+
+
+def qr_matrices(texts: List[str], version: int) -> List[List[List[bool]]]:
+    """
+    مصفوفات رموز QR لدفعة نصوص بإصدار واحد
+
+    يُستخدم قناع ثابت بدلاً من تجربة الأقنعة الثمانية لكل رمز (أي قناع صالح
+    للقراءة)، فيُبنى كل رمز مرة واحدة بدلاً من تسع.
+    """
+    matrices = []
+    for text in texts:
+        code = qrencoder.QRCode(version, QRErrorCorrectLevel.M)
+        code.addData(text)
+        code.makeImpl(False, 0)
+        matrices.append(code.modules)
+    return matrices
+
+
+def qr_finder_ops(count: int) -> str:
+    """أوامر PDF لأنماط التحديد (ثابتة في جميع الرموز بنفس الإصدار) بوحدات الرمز"""
+    ops = []
+    for row, column in ((0, 0), (0, count - 7), (count - 7, 0)):
+        ops.append(f"{column} {row} 7 7 re {column + 1} {row + 1} 5 5 re f* {column + 2} {row + 2} 3 3 re f")
+    return '\n'.join(ops)
+
+
+def qr_data_ops(modules: List[List[bool]]) -> str:
+    """أوامر PDF لوحدات الرمز خارج أنماط التحديد: مستطيل لكل تتابع أفقي من الوحدات الداكنة"""
+    count = len(modules)
+    ops = []
+    for row, line in enumerate(modules):
+        # أنماط التحديد مع فواصلها تشغل 8 وحدات في ثلاث زوايا
+        if row < 8:
+            column, end = 8, count - 8
+        elif row >= count - 8:
+            column, end = 8, count
+        else:
+            column, end = 0, count
+        for dark, group in groupby(line[column:end]):
+            width = len(list(group))
+            if dark:
+                ops.append(f"{column} {row} {width} 1 re")
+            column += width
+    ops.append('f')
+    return '\n'.join(ops)
+
+
+def card_from_row(row: Dict[str, Any]) -> HotspotCard:
+    """كرت من صف hotspot_cards المحفوظ"""
+    created_at = row.get('created_at')
+    if isinstance(created_at, str):
+        try:
+            created_at = datetime.fromisoformat(created_at)
+        except ValueError:
+            created_at = None
+    return HotspotCard(
+        username=row['username'],
+        password=row['password'],
+        profile=row['profile'],
+        data_quota_bytes=row['data_quota_bytes'] or 0,
+        time_quota_seconds=row['time_quota_seconds'] or 0,
+        validity_days=row['validity_days'],
+        created_at=created_at
+    )
+
+
 class HotspotCardGenerator:
     """مولد كروت الهوتسبوت"""
     
@@ -71,53 +196,115 @@ class HotspotCardGenerator:
     
     def generate_username(self, prefix: str = "user", length: int = 6) -> str:
         """توليد اسم مستخدم عشوائي"""
-        suffix = ''.join(random.choices(string.digits, k=length))
+        suffix = ''.join(secrets.choice(USERNAME_ALPHABET) for _ in range(length))
         return f"{prefix}{suffix}"
     
     def generate_password(self, length: int = 8) -> str:
         """توليد كلمة مرور عشوائية"""
-        characters = string.ascii_letters + string.digits
-        return ''.join(random.choices(characters, k=length))
+        return ''.join(secrets.choice(PASSWORD_ALPHABET) for _ in range(length))
+    
+    def generate_credentials(self, count: int, prefix: str = "user", length: int = 6,
+                             password_length: int = 8,
+                             existing: AbstractSet[str] = frozenset()) -> List[Tuple[str, str]]:
+        """
+        توليد أسماء مستخدمين وكلمات مرور بالجملة
+
+        الأسماء فريدة داخل الدفعة ولا تتكرر مع الأسماء الموجودة (existing)،
+        وهي عادةً الكروت المحفوظة ومستخدمو الراوتر.
+        """
+        space = len(USERNAME_ALPHABET) ** length
+        taken = sum(1 for name in existing if name.startswith(prefix) and len(name) == len(prefix) + length)
+        # نُبقي نصف المساحة فارغاً على الأقل حتى تبقى إعادة السحب نادرة
+        if count + taken > space // 2:
+            raise ValueError(f"لا يمكن توليد {count} اسم فريد بالبادئة '{prefix}' و {length} أرقام")
+
+        names: List[str] = []
+        seen = set()
+        while len(names) < count:
+            # سحب إضافي بسيط يغطي التكرارات المتوقعة فلا تتكرر الحلقة غالباً
+            remaining = count - len(names)
+            for suffix in random_strings(USERNAME_ALPHABET, length, remaining + remaining // 8 + 16):
+                name = prefix + suffix
+                if name in seen or name in existing:
+                    continue
+                seen.add(name)
+                names.append(name)
+                if len(names) == count:
+                    break
+
+        passwords = random_strings(PASSWORD_ALPHABET, password_length, count)
+        return list(zip(names, passwords))
     
     def format_data_quota(self, quota_mb: int) -> str:
         """تنسيق حصة البيانات"""
-        if quota_mb == 0:
-            return "غير محدود"
-        elif quota_mb < 1024:
-            return f"{quota_mb} MB"
-        else:
-            return f"{quota_mb / 1024:.1f} GB"
+        return format_data_quota(quota_mb * 1024 ** 2)
     
     def format_time_quota(self, quota_hours: int) -> str:
         """تنسيق حصة الوقت"""
-        if quota_hours == 0:
-            return "غير محدود"
-        elif quota_hours < 24:
-            return f"{quota_hours} ساعة"
-        else:
-            days = quota_hours // 24
-            hours = quota_hours % 24
-            if hours == 0:
-                return f"{days} يوم"
-            else:
-                return f"{days} يوم و {hours} ساعة"
+        return format_time_quota(quota_hours * 3600)
+    
+    def create_card_series(self, count: int, prefix: str = "user", profile: str = "default",
+                           data_quota_mb: int = 1024, time_quota_hours: int = 24,
+                           validity_days: int = 30, start: int = 0, serial_width: int = 6) -> CardSeries:
+        """إنشاء سلسلة كروت جديدة بمفتاح سري عشوائي"""
+        if start < 0 or count <= 0 or start + count > 10 ** serial_width:
+            raise ValueError(f"نطاق السلسلة {start}-{start + count} لا يتسع في {serial_width} أرقام")
+        return CardSeries(
+            secret=secrets.token_bytes(32),
+            prefix=prefix,
+            start=start,
+            count=count,
+            profile=profile,
+            data_quota_bytes=data_quota_mb * 1024 ** 2,
+            time_quota_seconds=time_quota_hours * 3600,
+            validity_days=validity_days,
+            serial_width=serial_width
+        )
+    
+    def series_password(self, series: CardSeries, serial: int, length: int = 8) -> str:
+        """كلمة مرور الكرت ذي الرقم التسلسلي المعطى"""
+        return derive_string(series.secret, serial.to_bytes(8, 'big'), PASSWORD_ALPHABET, length)
+    
+    def generate_series_cards(self, series: CardSeries, start: int = None, count: int = None) -> List[HotspotCard]:
+        """إعادة توليد كروت السلسلة كلها أو جزء منها"""
+        start = series.start if start is None else max(start, series.start)
+        end = series.end if count is None else min(start + count, series.end)
+        return [
+            HotspotCard(
+                username=series.username(serial),
+                password=self.series_password(series, serial),
+                profile=series.profile,
+                data_quota_bytes=series.data_quota_bytes,
+                time_quota_seconds=series.time_quota_seconds,
+                validity_days=series.validity_days,
+                created_at=series.created_at
+            )
+            for serial in range(start, end)
+        ]
+    
+    def verify_series_card(self, series: CardSeries, username: str, password: str) -> bool:
+        """التحقق من أن اسم المستخدم وكلمة المرور لكرت من السلسلة"""
+        serial = series.serial_of(username)
+        if serial is None:
+            return False
+        return hmac.compare_digest(self.series_password(series, serial), password)
     
     def generate_cards(self, count: int, prefix: str = "user", profile: str = "default",
                       data_quota_mb: int = 1024, time_quota_hours: int = 24,
-                      validity_days: int = 30) -> List[HotspotCard]:
-        """توليد مجموعة من كروت الهوتسبوت"""
+                      validity_days: int = 30,
+                      existing: AbstractSet[str] = frozenset()) -> List[HotspotCard]:
+        """توليد مجموعة من كروت الهوتسبوت (بأسماء لا تتكرر مع existing)"""
         cards = []
+        data_quota_bytes = data_quota_mb * 1024 ** 2
+        time_quota_seconds = time_quota_hours * 3600
         
-        for i in range(count):
-            username = self.generate_username(prefix)
-            password = self.generate_password()
-            
+        for username, password in self.generate_credentials(count, prefix, existing=existing):
             card = HotspotCard(
                 username=username,
                 password=password,
                 profile=profile,
-                data_quota=self.format_data_quota(data_quota_mb),
-                time_quota=self.format_time_quota(time_quota_hours),
+                data_quota_bytes=data_quota_bytes,
+                time_quota_seconds=time_quota_seconds,
                 validity_days=validity_days
             )
             
@@ -187,95 +374,142 @@ class HotspotCardGenerator:
         buffer.seek(0)
         return buffer.getvalue()
     
-    def create_multiple_cards_pdf(self, cards: List[HotspotCard], cards_per_page: int = 4) -> bytes:
-        """إنشاء PDF لعدة كروت"""
-        buffer = io.BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=10*mm, leftMargin=10*mm,
-                               topMargin=15*mm, bottomMargin=15*mm)
-        
-        story = []
-        
-        # عنوان الصفحة
-        title = Paragraph(f"كروت الهوتسبوت - {len(cards)} كرت", self.card_title_style)
-        story.append(title)
-        story.append(Spacer(1, 5*mm))
+    def cards_per_page(self) -> int:
+        """عدد الكروت في كل صفحة من ملف PDF"""
+        return CARDS_PER_PAGE
+    
+    def card_login_url(self, card: HotspotCard) -> str:
+        """رابط الدخول المباشر للكرت (يُوضع في رمز QR)"""
+        return f"{HOTSPOT_LOGIN_URL}?{urlencode({'username': card.username, 'password': card.password})}"
+    
+    def batch_qr_version(self, cards: List[HotspotCard]) -> int:
+        """إصدار رموز QR لدفعة كروت (0 إذا لم يُحدد رابط الدخول)"""
+        if not HOTSPOT_LOGIN_URL or not cards:
+            return 0
+        return qr_version([self.card_login_url(card) for card in cards])
+    
+    def render_cards_pdf(self, cards: List[HotspotCard], output: BinaryIO = None,
+                         first_index: int = 0, total_cards: int = None, version: int = None) -> BinaryIO:
+        """
+        رسم الكروت في PDF كشبكة جاهزة للقص (CARDS_PER_PAGE و CARDS_PER_ROW)
+
+        يُرسم مباشرةً على canvas: خطوط القص وإطار الكرت وخلفيته والشعار والعناوين
+        وأنماط التحديد الثابتة في رمز QR تُرسم مرة واحدة كـ Form XObject، ثم تُكتب
+        بيانات كل كرت ووحدات رمزه فقط. يُكتب الملف إلى ملف مؤقت يبقى في الذاكرة
+        حتى PDF_SPOOL_MAX_SIZE ثم ينتقل إلى القرص، ويُعاد مؤشره إلى البداية.
+
+        عند رسم جزء من دفعة أكبر (first_index و total_cards) تُرقم الكروت والصفحات
+        حسب موقعها في الدفعة كاملة؛ يجب أن يبدأ الجزء في أول صفحة، ويُمرر version
+        (batch_qr_version للدفعة كاملة) لتكون رموز جميع الأجزاء بنفس الإصدار.
+        """
+        if output is None:
+            output = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+        total_cards = len(cards) if total_cards is None else total_cards
+        per_page = self.cards_per_page()
+        columns = CARDS_PER_ROW
+        rows = -(-per_page // columns)
+        page_width, page_height = A4
+        margin = 10 * mm
+        pad = 4 * mm
+        cell_width = (page_width - 2 * margin) / columns
+        cell_height = (page_height - 2 * margin) / rows
+        title_height = 9 * mm
         
-        # تاريخ الإنشاء
-        date_text = f"تاريخ الإنشاء: {datetime.now().strftime('%Y-%m-%d %H:%M')}"
-        date_para = Paragraph(date_text, self.card_content_style)
-        story.append(date_para)
-        story.append(Spacer(1, 10*mm))
+        # رموز QR بإصدار واحد للدفعة، فتتطابق أنماط التحديد وتُرسم مرة واحدة مع الإطار
+        urls = [self.card_login_url(card) for card in cards] if HOTSPOT_LOGIN_URL and cards else []
+        if version is None:
+            version = qr_version(urls) if urls else 0
+        module_count = version * 4 + 17
+        qr_size = min(cell_height - title_height - 2 * pad, cell_width * 0.4) if urls else 0
+        module = qr_size / module_count if urls else 0
+        qr_x = pad
+        qr_y = (cell_height - title_height - qr_size) / 2
+        text_right = cell_width - pad
         
-        # إنشاء جدول للكروت
-        for i in range(0, len(cards), cards_per_page):
-            page_cards = cards[i:i + cards_per_page]
-            
-            # إنشاء بيانات الجدول للصفحة الحالية
-            table_data = []
-            headers = ["#", "اسم المستخدم", "كلمة المرور", "البروفايل", "حصة البيانات", "حصة الوقت"]
-            table_data.append(headers)
-            
-            for j, card in enumerate(page_cards, i + 1):
-                row = [
-                    str(j),
-                    card.username,
-                    card.password,
-                    card.profile,
-                    card.data_quota,
-                    card.time_quota
-                ]
-                table_data.append(row)
-            
-            # إنشاء الجدول
-            table = Table(table_data, colWidths=[10*mm, 30*mm, 25*mm, 25*mm, 25*mm, 25*mm])
-            table.setStyle(TableStyle([
-                # تنسيق الرأس
-                ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                
-                # تنسيق البيانات
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                
-                # تنسيق عام
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
-                ('TOPPADDING', (0, 0), (-1, -1), 4),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                
-                # تلوين الصفوف بالتناوب
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
-            ]))
-            
-            story.append(table)
-            
-            # إضافة فاصل بين الصفحات
-            if i + cards_per_page < len(cards):
-                story.append(Spacer(1, 15*mm))
+        pdf = canvas.Canvas(output, pagesize=A4, pageCompression=1)
+        pdf.setTitle(f"كروت الهوتسبوت - {total_cards} كرت")
         
-        # معلومات إضافية في نهاية المستند
-        footer_text = f"""
-        إجمالي الكروت: {len(cards)}
-        تاريخ الإنشاء: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
+        pdf.beginForm('card_cell')
+        pdf.setFillColor(colors.aliceblue)
+        pdf.setStrokeColor(colors.darkblue)
+        pdf.roundRect(1 * mm, 1 * mm, cell_width - 2 * mm, cell_height - 2 * mm, 3 * mm, stroke=1, fill=1)
+        pdf.setFillColor(colors.darkblue)
+        pdf.rect(1 * mm, cell_height - title_height - 1 * mm, cell_width - 2 * mm, title_height, stroke=0, fill=1)
+        logo_width = 0
+        if CARD_LOGO_PATH and os.path.exists(CARD_LOGO_PATH):
+            logo_width = title_height - 2 * mm
+            pdf.drawImage(CARD_LOGO_PATH, pad, cell_height - title_height, logo_width, logo_width,
+                          preserveAspectRatio=True, mask='auto')
+        pdf.setFillColor(colors.whitesmoke)
+        pdf.setFont('Helvetica-Bold', 12)
+        pdf.drawCentredString(cell_width / 2, cell_height - title_height + 1.5 * mm, "كرت هوتسبوت")
+        labels = ["اسم المستخدم", "كلمة المرور", "حصة البيانات", "حصة الوقت", "صالح لمدة"]
+        line_top = cell_height - title_height - pad - 3 * mm
+        line_step = (cell_height - title_height - 2 * pad) / len(labels)
+        pdf.setFillColor(colors.grey)
+        pdf.setFont('Helvetica', 7)
+        for line, label in enumerate(labels):
+            pdf.drawRightString(text_right, line_top - line * line_step, label)
+        if urls:
+            pdf.setFillColor(colors.white)
+            pdf.rect(qr_x - module, qr_y - module, qr_size + 2 * module, qr_size + 2 * module, stroke=0, fill=1)
+            pdf.saveState()
+            pdf.translate(qr_x, qr_y + qr_size)
+            pdf.scale(module, -module)
+            pdf.setFillColor(colors.black)
+            pdf.addLiteral(qr_finder_ops(module_count))
+            pdf.restoreState()
+        pdf.endForm()
         
-        تعليمات الاستخدام:
-        • كل كرت صالح للاستخدام لمرة واحدة فقط
-        • يجب استخدام الكرت خلال فترة الصلاحية المحددة
-        • حصة البيانات والوقت محددة لكل كرت
-        """
+        pdf.beginForm('card_page')
+        pdf.setStrokeColor(colors.grey)
+        pdf.setDash(3, 3)
+        pdf.setLineWidth(0.3)
+        pdf.grid([margin + column * cell_width for column in range(columns + 1)],
+                 [margin + row * cell_height for row in range(rows + 1)])
+        pdf.endForm()
         
-        story.append(Spacer(1, 10*mm))
-        footer_para = Paragraph(footer_text, self.card_content_style)
-        story.append(footer_para)
+        total_pages = max(1, -(-total_cards // per_page))
+        first_page = first_index // per_page
+        for page in range(max(1, -(-len(cards) // per_page))):
+            pdf.doForm('card_page')
+            pdf.setFillColor(colors.grey)
+            pdf.setFont('Helvetica', 7)
+            pdf.drawCentredString(page_width / 2, margin / 2, f"{first_page + page + 1} / {total_pages}")
+            first = page * per_page
+            # رموز الصفحة فقط في الذاكرة
+            matrices = qr_matrices(urls[first:first + per_page], version) if urls else []
+            for slot, card in enumerate(cards[first:first + per_page]):
+                index = first + slot
+                pdf.saveState()
+                pdf.translate(margin + (slot % columns) * cell_width,
+                              page_height - margin - (slot // columns + 1) * cell_height)
+                pdf.doForm('card_cell')
+                pdf.setFillColor(colors.black)
+                pdf.setFont('Helvetica-Bold', 11)
+                values = (card.username, card.password, card.data_quota, card.time_quota,
+                          f"{card.validity_days} يوم")
+                for line, value in enumerate(values):
+                    pdf.drawRightString(text_right, line_top - line * line_step - 4.5 * mm, value)
+                pdf.setFillColor(colors.grey)
+                pdf.setFont('Helvetica', 6)
+                pdf.drawString(pad, 2.5 * mm, f"#{first_index + index + 1}")
+                if matrices:
+                    pdf.translate(qr_x, qr_y + qr_size)
+                    pdf.scale(module, -module)
+                    pdf.setFillColor(colors.black)
+                    pdf.addLiteral(qr_data_ops(matrices[slot]))
+                pdf.restoreState()
+            pdf.showPage()
         
-        doc.build(story)
-        buffer.seek(0)
-        return buffer.getvalue()
+        pdf.save()
+        output.seek(0)
+        return output
+    
+    def create_multiple_cards_pdf(self, cards: List[HotspotCard]) -> bytes:
+        """إنشاء PDF لعدة كروت"""
+        with self.render_cards_pdf(cards) as output:
+            return output.read()
     
     def create_card_summary_text(self, cards: List[HotspotCard]) -> str:
         """إنشاء ملخص نصي للكروت"""
@@ -297,47 +531,19 @@ class HotspotCardGenerator:
         return summary
     
     def convert_cards_to_hotspot_users(self, cards: List[HotspotCard]) -> List[HotspotUser]:
-        """تحويل الكروت إلى مستخدمي هوتسبوت"""
+        """تحويل الكروت إلى مستخدمي هوتسبوت (الحصص تُمرر للراوتر بالبايت والثانية مباشرة)"""
         users = []
         
         for card in cards:
-            # تحويل حصة البيانات إلى تنسيق الميكروتك
-            data_limit = ""
-            if "MB" in card.data_quota and card.data_quota != "غير محدود":
-                mb_value = int(card.data_quota.split()[0])
-                data_limit = f"{mb_value}M"
-            elif "GB" in card.data_quota:
-                gb_value = float(card.data_quota.split()[0])
-                data_limit = f"{int(gb_value * 1024)}M"
-            
-            # تحويل حصة الوقت إلى تنسيق الميكروتك
-            time_limit = ""
-            if "ساعة" in card.time_quota and card.time_quota != "غير محدود":
-                if "يوم" in card.time_quota:
-                    # تحليل "X يوم و Y ساعة"
-                    parts = card.time_quota.split()
-                    days = int(parts[0])
-                    hours = int(parts[3]) if len(parts) > 3 else 0
-                    total_hours = days * 24 + hours
-                else:
-                    # تحليل "X ساعة"
-                    total_hours = int(card.time_quota.split()[0])
-                
-                time_limit = f"{total_hours}h"
-            elif "يوم" in card.time_quota and "ساعة" not in card.time_quota:
-                days = int(card.time_quota.split()[0])
-                time_limit = f"{days * 24}h"
-            
             user = HotspotUser(
                 name=card.username,
                 password=card.password,
                 profile=card.profile,
-                limit_bytes_total=data_limit,
-                limit_uptime=time_limit,
+                limit_bytes_total=str(card.data_quota_bytes) if card.data_quota_bytes else "",
+                limit_uptime=f"{card.time_quota_seconds}s" if card.time_quota_seconds else "",
                 comment=f"Generated on {card.created_at.strftime('%Y-%m-%d')}"
             )
             
             users.append(user)
         
         return users
-
@@ -0,0 +1,218 @@
+"""
+توليد الكروت كمهام في الخلفية
+
+يُسجل طلب التوليد كمهمة في جدول card_jobs ويعود المعالج فوراً برقم المهمة،
+ثم ينفذ العامل المراحل بالترتيب: توليد وحفظ ← رسم PDF وإرساله ← إضافة للراوتر،
+مع تحديث رسالة التقدم وحفظ المرحلة بعد كل منها. عند إعادة تشغيل البوت تُستأنف
+المهام غير المكتملة من آخر مرحلة محفوظة: الكروت المحفوظة (أو السلسلة) تُقرأ
+من قاعدة البيانات ولا يُعاد توليدها، والموجودة على الراوتر لا تُضاف مرة أخرى.
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
+from card_generator import HotspotCardGenerator, card_from_row
+from config import BULK_PROGRESS_INTERVAL, CARD_JOB_BATCH_SIZE
+from connection_pool import RouterConnectionPool
+from database import DatabaseManager
+from models import HotspotCard
+from pdf_renderer import PdfRenderService
+
+logger = logging.getLogger(__name__)
+
+# مراحل المهمة بالترتيب (failed حالة نهائية خارج الترتيب)
+JOB_STAGES = ('pending', 'rendering', 'provisioning', 'done')
+
+
+class CardJobQueue:
+    """طابور مهام توليد الكروت مع عمال في الخلفية"""
+
+    def __init__(self, db: DatabaseManager, pool: RouterConnectionPool, generator: HotspotCardGenerator,
+                 renderer: PdfRenderService, batch_size: int = CARD_JOB_BATCH_SIZE):
+        self.db = db
+        self.pool = pool
+        self.generator = generator
+        self.renderer = renderer
+        self.batch_size = batch_size
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._last_report: Dict[int, float] = {}
+
+    async def submit(self, telegram_user_id: int, chat_id: int, message_id: int,
+                     device_id: Optional[int], params: Dict[str, Any]) -> Optional[int]:
+        """تسجيل مهمة جديدة وإضافتها للطابور؛ يعيد رقم المهمة فوراً"""
+        job_id = await asyncio.to_thread(self.db.create_card_job, telegram_user_id, chat_id,
+                                         message_id, device_id, params)
+        if job_id is not None:
+            self._queue.put_nowait(job_id)
+        return job_id
+
+    async def resume(self) -> int:
+        """إعادة المهام غير المكتملة إلى الطابور (عند بدء البوت)"""
+        job_ids = await asyncio.to_thread(self.db.get_unfinished_card_jobs)
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        if job_ids:
+            logger.info(f"استئناف {len(job_ids)} مهمة توليد كروت")
+        return len(job_ids)
+
+    async def _report(self, bot, job: Dict[str, Any], text: str, force: bool = False):
+        """تحديث رسالة تقدم المهمة (مرة كل BULK_PROGRESS_INTERVAL على الأكثر)"""
+        now = time.monotonic()
+        if not force and now - self._last_report.get(job['id'], 0) < BULK_PROGRESS_INTERVAL:
+            return
+        self._last_report[job['id']] = now
+        try:
+            await bot.edit_message_text(f"🎫 مهمة التوليد #{job['id']}\n\n{text}",
+                                        chat_id=job['chat_id'], message_id=job['message_id'])
+        except Exception as e:
+            logger.warning(f"تعذر تحديث رسالة تقدم المهمة {job['id']}: {e}")
+
+    async def _set_status(self, job: Dict[str, Any], status: str, **fields):
+        await asyncio.to_thread(self.db.update_card_job, job['id'], status, **fields)
+        job['status'] = status
+
+    @staticmethod
+    async def _router_usernames(client) -> Set[str]:
+        """أسماء مستخدمي الراوتر؛ تفشل المهمة إذا تعذرت القراءة بدلاً من اعتبار الراوتر فارغاً"""
+        users = await client.find_hotspot_users(strict=True)
+        if users is None:
+            raise RuntimeError(f"تعذرت قراءة مستخدمي الهوتسبوت من {client.device}")
+        return {user.name for user in users}
+
+    async def _cards(self, bot, job: Dict[str, Any], client) -> List[HotspotCard]:
+        """كروت المهمة: من السلسلة أو الكروت المحفوظة إن وُجدت، وإلا تُولد وتُحفظ"""
+        params = job['params']
+        if job['series_id']:
+            series = await asyncio.to_thread(self.db.get_card_series, job['series_id'])
+            return await asyncio.to_thread(self.generator.generate_series_cards, series)
+
+        rows = await asyncio.to_thread(self.db.get_job_cards, job['id'])
+        if rows:
+            return [card_from_row(row) for row in rows]
+
+        await self._report(bot, job, f"⏳ جاري توليد {params['count']} كرت...", force=True)
+        # أسماء لا تتكرر مع الكروت المحفوظة ومستخدمي الراوتر
+        existing = await asyncio.to_thread(self.db.get_card_usernames)
+        if client:
+            existing.update(await self._router_usernames(client))
+
+        quotas = dict(profile=params['profile'], data_quota_mb=params['data_quota_mb'],
+                      time_quota_hours=params['time_quota_hours'], validity_days=params['validity_days'])
+        if params.get('series'):
+            # السلسلة تكمل من آخر رقم تسلسلي مستخدم للبادئة نفسها
+            start = await asyncio.to_thread(self.db.next_series_serial, params['prefix'], 6)
+            series = self.generator.create_card_series(params['count'], params['prefix'], start=start, **quotas)
+            cards = await asyncio.to_thread(self.generator.generate_series_cards, series)
+            taken = [card.username for card in cards if card.username in existing]
+            if taken:
+                raise ValueError(f"الاسم {taken[0]} مستخدم مسبقاً. يرجى اختيار بادئة أخرى للسلسلة")
+            series_id = await asyncio.to_thread(self.db.save_card_series, job['telegram_user_id'],
+                                                series, job['device_id'])
+            if series_id is None:
+                raise RuntimeError("تعذر حفظ سلسلة الكروت")
+            await self._set_status(job, 'pending', series_id=series_id)
+            job['series_id'] = series_id
+            return cards
+
+        cards = await asyncio.to_thread(self.generator.generate_cards, params['count'], params['prefix'],
+                                        existing=existing, **quotas)
+        cards_data = [{
+            'username': card.username,
+            'password': card.password,
+            'profile': card.profile,
+            'data_quota_bytes': card.data_quota_bytes,
+            'time_quota_seconds': card.time_quota_seconds,
+            'validity_days': card.validity_days
+        } for card in cards]
+        saved = await asyncio.to_thread(self.db.save_hotspot_cards, job['telegram_user_id'], cards_data,
+                                        job['device_id'], job['id'])
+        if not saved:
+            raise RuntimeError("تعذر حفظ الكروت في قاعدة البيانات")
+        return cards
+
+    async def _provision(self, bot, job: Dict[str, Any], client, cards: List[HotspotCard]) -> Dict[str, int]:
+        """إضافة الكروت غير الموجودة على الراوتر على دفعات"""
+        on_router = await self._router_usernames(client)
+        pending = [card for card in cards if card.username not in on_router]
+        counts = {'added': 0, 'failed': 0, 'existing': len(cards) - len(pending)}
+
+        for start in range(0, len(pending), self.batch_size):
+            batch = pending[start:start + self.batch_size]
+            result = await client.add_hotspot_users(self.generator.convert_cards_to_hotspot_users(batch))
+            counts['added'] += result.success_count
+            counts['failed'] += result.failed_count
+            await asyncio.to_thread(self.db.mark_cards_provisioned, [job['device_id']], result.added)
+            await self._report(bot, job, f"⏳ جاري إضافة الكروت إلى الميكروتك... "
+                                         f"{start + len(batch)}/{len(pending)}")
+
+        if counts['existing']:
+            await asyncio.to_thread(self.db.mark_cards_provisioned, [job['device_id']],
+                                    [card.username for card in cards if card.username in on_router])
+        return counts
+
+    async def process(self, bot, job_id: int):
+        """تنفيذ مهمة واحدة من آخر مرحلة محفوظة لها"""
+        job = await asyncio.to_thread(self.db.get_card_job, job_id)
+        if not job or job['status'] not in JOB_STAGES or job['status'] == 'done':
+            return
+
+        device = None
+        if job['device_id']:
+            device = await asyncio.to_thread(self.db.get_mikrotik_device, job['device_id'])
+        holder_id = ('card_job', job_id)
+        client = await self.pool.acquire(holder_id, device) if device else None
+
+        try:
+            cards = await self._cards(bot, job, client)
+            stage = JOB_STAGES.index(job['status'])
+
+            if stage <= JOB_STAGES.index('rendering'):
+                await self._set_status(job, 'rendering')
+                await self._report(bot, job, f"⏳ جاري إنشاء ملف PDF لـ {len(cards)} كرت...", force=True)
+                with await self.renderer.render(cards) as pdf_file:
+                    await bot.send_document(
+                        chat_id=job['chat_id'],
+                        document=pdf_file,
+                        filename=f"hotspot_cards_{job_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                        caption=f"📄 ملف PDF يحتوي على {len(cards)} كرت هوتسبوت (المهمة #{job_id})"
+                    )
+                # تُحفظ المرحلة فور الإرسال حتى لا يُعاد إرسال الملف عند الاستئناف
+                await self._set_status(job, 'provisioning')
+
+            counts = None
+            if client:
+                counts = await self._provision(bot, job, client, cards)
+
+            await self._set_status(job, 'done')
+            summary = self.generator.create_card_summary_text(cards)
+            if counts is None:
+                summary += "\n\n⚠️ لم تُضف الكروت إلى الميكروتك (غير متصل بجهاز)"
+            else:
+                summary += (f"\n\n📤 الإضافة إلى الميكروتك: {counts['added']} تمت، "
+                            f"{counts['existing']} موجودة مسبقاً، {counts['failed']} فشلت")
+            await self._report(bot, job, summary, force=True)
+            await asyncio.to_thread(self.db.log_operation, job['telegram_user_id'], "generate_cards",
+                                    f"توليد {len(cards)} كرت (المهمة #{job_id})", True)
+
+        except Exception as e:
+            logger.error(f"خطأ في مهمة توليد الكروت {job_id}: {e}")
+            await self._set_status(job, 'failed', error_message=str(e))
+            await self._report(bot, job, f"❌ فشلت المهمة: {e}", force=True)
+            await asyncio.to_thread(self.db.log_operation, job['telegram_user_id'], "generate_cards",
+                                    f"فشل في توليد الكروت (المهمة #{job_id}): {e}", False)
+        finally:
+            self._last_report.pop(job_id, None)
+            if client:
+                await self.pool.release(holder_id, device)
+
+    async def run(self, bot):
+        """عامل ينفذ المهام من الطابور بالترتيب"""
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.process(bot, job_id)
+            finally:
+                self._queue.task_done()
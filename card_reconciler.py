@@ -0,0 +1,180 @@
+"""
+مطابقة كروت الهوتسبوت المحفوظة مع مستخدمي الراوتر
+
+يُبنى قاموس بالاسم لكل جانب (الكروت في قاعدة البيانات ومستخدمو
+/ip/hotspot/user) ثم تُستخرج الفروقات بعمليات مجموعات:
+- كروت غير موجودة على الراوتر: تُضاف
+- قيم مختلفة (كلمة المرور، البروفايل، الحصص): تُصحح بأوامر set
+- مستخدمون مولدون من البوت بلا كرت محفوظ أو سلسلة: يُبلغ عنهم فقط، فقد تكون
+  أُضيفت من جهاز آخر أو حُذفت كروتها عمداً
+"""
+
+import asyncio
+import logging
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from card_generator import HotspotCardGenerator, card_from_row
+from config import CARD_RECONCILE_INTERVAL, CARD_RECONCILE_BATCH_SIZE
+from connection_pool import RouterConnectionPool
+from database import DatabaseManager
+from mikrotik_api_client import parse_duration, parse_size
+from models import CardSeries, HotspotUser, MikroTikDevice, ReconcileReport
+
+logger = logging.getLogger(__name__)
+
+# تعليق المستخدمين الذي يضعه مولد الكروت (convert_cards_to_hotspot_users)
+GENERATED_COMMENT_PREFIX = 'Generated on'
+
+
+def expected_users(cards: List[Dict]) -> Dict[str, HotspotUser]:
+    """مستخدمو الهوتسبوت كما يجب أن يكونوا على الراوتر حسب الكروت المحفوظة"""
+    users = HotspotCardGenerator().convert_cards_to_hotspot_users([card_from_row(card) for card in cards])
+    return {user.name: user for user in users}
+
+
+def series_users(series: CardSeries) -> Dict[str, HotspotUser]:
+    """مستخدمو سلسلة كروت كما يجب أن يكونوا على الراوتر"""
+    generator = HotspotCardGenerator()
+    users = generator.convert_cards_to_hotspot_users(generator.generate_series_cards(series))
+    return {user.name: user for user in users}
+
+
+def _differences(expected: HotspotUser, actual: HotspotUser) -> Dict[str, str]:
+    """وسائط set اللازمة لتصحيح المستخدم (0 يعني بلا حد في RouterOS)"""
+    changes = {}
+    if expected.password != actual.password:
+        changes['password'] = expected.password
+    if expected.profile != actual.profile:
+        changes['profile'] = expected.profile
+    if parse_size(expected.limit_bytes_total) != parse_size(actual.limit_bytes_total):
+        changes['limit-bytes-total'] = expected.limit_bytes_total or '0'
+    if parse_duration(expected.limit_uptime) != parse_duration(actual.limit_uptime):
+        changes['limit-uptime'] = expected.limit_uptime or '0s'
+    return changes
+
+
+def diff_cards(expected: Dict[str, HotspotUser], actual: Dict[str, HotspotUser]) -> ReconcileReport:
+    """الفروقات بين الجانبين (كل جانب قاموس بالاسم)"""
+    report = ReconcileReport()
+    report.missing = [expected[name] for name in expected.keys() - actual.keys()]
+    report.orphaned = [actual[name] for name in actual.keys() - expected.keys()
+                       if actual[name].comment.startswith(GENERATED_COMMENT_PREFIX)]
+
+    for name in expected.keys() & actual.keys():
+        changes = _differences(expected[name], actual[name])
+        if changes:
+            changes['id'] = actual[name].extra.get('id', '')
+            report.mismatched[name] = changes
+        else:
+            report.in_sync.append(name)
+
+    report.missing.sort(key=lambda user: user.name)
+    report.orphaned.sort(key=lambda user: user.name)
+    return report
+
+
+def device_groups(db: DatabaseManager) -> List[Tuple[MikroTikDevice, List[int]]]:
+    """
+    الأجهزة المحفوظة مجمعة حسب الراوتر
+
+    كل تسجيل دخول يحفظ صفاً جديداً للجهاز، فتُجمع معرفات الصفوف التي
+    تشير إلى نفس الراوتر وتُعالج كروتها معاً.
+    """
+    groups: Dict[Tuple[str, int], List[int]] = {}
+    for row in db.get_all_devices():
+        groups.setdefault((row['ip_address'], row['port']), []).append(row['id'])
+
+    result = []
+    for device_ids in groups.values():
+        # أحدث بيانات دخول للراوتر
+        device = db.get_mikrotik_device(device_ids[-1])
+        if device:
+            result.append((device, device_ids))
+    return result
+
+
+def _batches(items: List, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class CardReconciler:
+    """مطابقة الكروت مع الراوتر عند الطلب ودورياً لجميع الأجهزة المحفوظة"""
+
+    def __init__(self, db: DatabaseManager, pool: RouterConnectionPool,
+                 interval: float = CARD_RECONCILE_INTERVAL, batch_size: int = CARD_RECONCILE_BATCH_SIZE):
+        self.db = db
+        self.pool = pool
+        self.interval = interval
+        self.batch_size = batch_size
+
+    def device_groups(self) -> List[Tuple[MikroTikDevice, List[int]]]:
+        """الأجهزة المحفوظة مجمعة حسب الراوتر"""
+        return device_groups(self.db)
+
+    def device_ids_for(self, device: MikroTikDevice) -> List[int]:
+        """معرفات جميع الصفوف المحفوظة لنفس الراوتر"""
+        for saved, device_ids in self.device_groups():
+            if (saved.ip, saved.port) == (device.ip, device.port):
+                return device_ids
+        return []
+
+    async def reconcile(self, client, device_ids: Sequence[int], apply: bool = True) -> Optional[ReconcileReport]:
+        """حساب الفروقات لراوتر واحد، وإصلاحها على دفعات إذا كان apply (None إذا تعذرت قراءة الراوتر)"""
+        # معرف الصف مطلوب لأوامر set، فتُقرأ القائمة من الراوتر مباشرة؛ القائمة الفارغة عند
+        # الخطأ ستُفسر كأن جميع الكروت غير موجودة على الراوتر
+        users = await client.find_hotspot_users(extra_fields=('.id',), strict=True)
+        if users is None:
+            logger.warning(f"تعذر قراءة مستخدمي {client.device}؛ تأجيل مطابقة الكروت")
+            return None
+        actual = {user.name: user for user in users}
+
+        cards = await asyncio.to_thread(self.db.get_device_cards, device_ids)
+        expected = expected_users(cards)
+        # كروت السلاسل لا تُحفظ صفاً صفاً، فتُعاد توليدها من المفتاح
+        for series in await asyncio.to_thread(self.db.get_device_series, device_ids):
+            expected.update(series_users(series))
+        report = diff_cards(expected, actual)
+
+        if apply:
+            for batch in _batches(report.missing, self.batch_size):
+                result = await client.add_hotspot_users(batch)
+                report.added.added.extend(result.added)
+                report.added.failed.update(result.failed)
+
+            for batch in _batches(list(report.mismatched.items()), self.batch_size):
+                result = await client.update_hotspot_users(dict(batch))
+                report.updated.added.extend(result.added)
+                report.updated.failed.update(result.failed)
+
+        provisioned = report.in_sync + report.added.added
+        await asyncio.to_thread(self.db.mark_cards_provisioned, device_ids, provisioned)
+        return report
+
+    async def reconcile_all(self):
+        """جولة مطابقة لجميع الراوترات المحفوظة"""
+        for device, device_ids in self.device_groups():
+            holder_id = ('card_reconcile', device_ids[-1])
+            client = await self.pool.acquire(holder_id, device)
+            if not client:
+                logger.warning(f"تعذر الاتصال بـ {device} لمطابقة الكروت")
+                continue
+            try:
+                report = await self.reconcile(client, device_ids)
+                if report is not None and not report.is_clean:
+                    logger.info(
+                        f"مطابقة الكروت على {device}: {len(report.missing)} ناقص، "
+                        f"{len(report.mismatched)} مختلف، {len(report.orphaned)} بلا كرت، "
+                        f"تمت إضافة {report.added.success_count} وتصحيح {report.updated.success_count} "
+                        f"وفشل {report.failed_count}"
+                    )
+            except Exception as e:
+                logger.error(f"خطأ في مطابقة الكروت على {device}: {e}")
+            finally:
+                await self.pool.release(holder_id, device)
+
+    async def run(self):
+        """تشغيل المطابقة دورياً في الخلفية"""
+        while True:
+            await self.reconcile_all()
+            await asyncio.sleep(self.interval)
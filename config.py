@@ -21,9 +21,101 @@ ALLOWED_USERS: List[int] = []
 DEFAULT_MIKROTIK_PORT = 8728
 DEFAULT_MIKROTIK_SSL_PORT = 8729
 
+# إعدادات تنفيذ أوامر الميكروتك
+# خلفية بروتوكول API: 'routeros_api' (مكتبة RouterOS-api) أو 'native' (تنفيذ asyncio مدمج)
+MIKROTIK_API_BACKEND = os.getenv('MIKROTIK_API_BACKEND', 'routeros_api')
+# عدد الخيوط لكل راوتر (مكتبة RouterOS-api لا تسمح بأكثر من أمر متزامن على نفس الاتصال،
+# أما الخلفية 'native' فتسمح بعدة أوامر متزامنة على مقبس واحد)
+MIKROTIK_EXECUTOR_WORKERS = 1 if MIKROTIK_API_BACKEND != 'native' else 4
+# المهلة القصوى بالثواني لأوامر القراءة والكتابة العادية
+MIKROTIK_CALL_TIMEOUT = 20
+# المهلة القصوى بالثواني لأوامر التشخيص الطويلة (Ping، تتبع المسار، فحص الصحة)
+MIKROTIK_DIAGNOSTIC_TIMEOUT = 90
+# الفاصل بالثواني بين فحوصات الاتصالات المشتركة (keepalive)
+MIKROTIK_KEEPALIVE_INTERVAL = 60
+# إغلاق مقبس الاتصال بعد هذه المدة من عدم الاستخدام (يُعاد فتحه عند الطلب)
+MIKROTIK_IDLE_TIMEOUT = 600
+# مدة صلاحية القراءات المخزنة بالثواني لكل مسار (المسارات غير المذكورة لا تُخزن)
+# البوت لا يكتب على هذه المسارات، وإعادة تشغيل الراوتر تفرغ الذاكرة؛ عند تخزين مسار يُكتب عليه
+# يجب إبطاله بعد الكتابة (cache.invalidate)
+MIKROTIK_CACHE_TTL = {
+    '/system/resource': 5,
+    '/system/routerboard': 3600,
+    '/interface': 10,
+    '/ip/hotspot/user/profile': 300,
+}
+# الحد الأقصى لعدد القراءات المخزنة لكل راوتر
+MIKROTIK_CACHE_MAX_ENTRIES = 64
+# الإضافة الجماعية: عدد أوامر add المعلقة على الاتصال في نفس الوقت
+MIKROTIK_BULK_WINDOW = 50
+# عدد مرات إعادة محاولة المستخدمين الذين فشلت إضافتهم
+MIKROTIK_BULK_RETRIES = 1
+# المهلة الإضافية بالثواني لكل 1000 مستخدم في الإضافة الجماعية
+MIKROTIK_BULK_TIMEOUT_PER_1000 = 30
+# نسخة محلية من الجلسات النشطة (/ip/hotspot/active) تُحدّث عبر listen
+HOTSPOT_MIRROR_ENABLED = os.getenv('HOTSPOT_MIRROR_ENABLED', 'true').lower() == 'true'
+# إعادة تحميل الجدول كاملاً دورياً لتحديث العدادات (البيانات ومدة الاتصال)
+HOTSPOT_MIRROR_RESYNC_INTERVAL = 300
+# فهرس البحث في مستخدمي الهوتسبوت يتحدث عبر listen، والتحميل الكامل للاحتياط فقط
+HOTSPOT_INDEX_RESYNC_INTERVAL = 3600
+# الانتظار قبل إعادة محاولة المزامنة بعد انقطاعها
+HOTSPOT_MIRROR_RETRY_DELAY = 30
+
+# تسجيل استهلاك الهوتسبوت: الفاصل بين العينات بالثواني
+USAGE_SAMPLE_INTERVAL = 60
+# مستويات التجميع (دقيقة، ساعة، يوم) ومدة الاحتفاظ بكل منها بالثواني
+USAGE_RESOLUTIONS = (60, 3600, 86400)
+USAGE_RETENTION = {60: 2 * 86400, 3600: 90 * 86400, 86400: 730 * 86400}
+# إعادة تحميل بروفايلات المستخدمين للتجميع حسب البروفايل
+USAGE_PROFILE_REFRESH = 3600
+# فترات عرض الاستهلاك المسجل بالأيام
+USAGE_HISTORY_DAYS = (1, 7, 30)
+
+# الأكثر استهلاكاً: مدة صلاحية الترتيب بالثواني (وهي أيضاً فترة حساب المعدل) وعدد المستخدمين المعروضين
+TOP_TALKERS_REFRESH = 30
+TOP_TALKERS_COUNT = 10
+
+# مطابقة الكروت المحفوظة مع مستخدمي الراوتر: الفاصل بين الجولات بالثواني وحجم دفعة الإصلاح
+CARD_RECONCILE_INTERVAL = 6 * 3600
+CARD_RECONCILE_BATCH_SIZE = 500
+
+# انتهاء صلاحية الكروت (validity_days): الإجراء على الراوتر (remove أو disable) والفاصل بالثواني وحجم الدفعة
+CARD_EXPIRY_ACTION = os.getenv('CARD_EXPIRY_ACTION', 'remove')
+CARD_EXPIRY_INTERVAL = 3600
+CARD_EXPIRY_BATCH_SIZE = 200
+
 # إعدادات طباعة الكروت
 CARDS_PER_PAGE = 8
 CARDS_PER_ROW = 2
+# رابط صفحة دخول الهوتسبوت في رمز QR على الكرت (فارغ = بلا رمز) وشعار اختياري يُطبع على كل كرت
+HOTSPOT_LOGIN_URL = os.getenv('HOTSPOT_LOGIN_URL', 'http://login.wifi/login')
+CARD_LOGO_PATH = os.getenv('CARD_LOGO_PATH', '')
+# حجم ملف PDF الذي يبقى في الذاكرة قبل نقله إلى ملف مؤقت على القرص
+PDF_SPOOL_MAX_SIZE = 8 * 1024 * 1024
+# رسم ملفات PDF في مجمع عمليات: عدد العمليات (0 = جميع الأنوية) وعدد ملفات الرسم المتزامنة
+# وعدد الصفحات في كل جزء يُرسم في عملية مستقلة (يتطلب pypdf لدمج الأجزاء)
+PDF_RENDER_WORKERS = 0
+PDF_RENDER_MAX_PENDING = 2
+PDF_RENDER_PAGES_PER_PART = 50
+
+# مهام توليد الكروت في الخلفية: الحد الأقصى للكروت في المهمة وعدد العمال وحجم دفعة الإضافة للراوتر
+CARD_JOB_MAX_CARDS = 50000
+CARD_JOB_WORKERS = 1
+CARD_JOB_BATCH_SIZE = 1000
+
+# الفاصل بالثواني بين تحديثات رسالة التقدم في العمليات الطويلة (حد تعديل الرسائل في تليجرام)
+BULK_PROGRESS_INTERVAL = 2
+
+# عدد النتائج في كل صفحة بحث
+SEARCH_PAGE_SIZE = 10
+
+# تصفح القوائم: عدد العناصر في الصفحة ومدة صلاحية اللقطة بالثواني
+LISTING_PAGE_SIZE = 10
+LISTING_SNAPSHOT_TTL = 300
+
+# استيراد المستخدمين من ملف CSV: عدد الصفوف في كل دفعة إضافة والحجم الأقصى للملف (حد التحميل في تليجرام)
+CSV_IMPORT_BATCH_SIZE = 1000
+CSV_IMPORT_MAX_BYTES = 20 * 1024 * 1024
 
 # إعدادات التشخيص
 PING_COUNT = 4
@@ -0,0 +1,177 @@
+"""
+مجمع اتصالات الميكروتك المشتركة
+
+اتصال واحد لكل راوتر (ip, port, username, ssl) يتشاركه جميع المشغلين،
+مع فحص دوري (keepalive) وإعادة اتصال تلقائية وإغلاق الاتصالات الخاملة.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+
+from config import MIKROTIK_KEEPALIVE_INTERVAL, MIKROTIK_IDLE_TIMEOUT, HOTSPOT_MIRROR_ENABLED
+from mikrotik_api_client import MikroTikAPIClient
+from async_mikrotik_client import AsyncMikroTikClient
+from models import MikroTikDevice
+
+logger = logging.getLogger(__name__)
+
+DeviceKey = Tuple[str, int, str, bool]
+
+
+@dataclass
+class PooledConnection:
+    """اتصال مشترك داخل المجمع"""
+    key: DeviceKey
+    client: AsyncMikroTikClient
+    # معرفات مستخدمي تليجرام، أو (اسم المهمة، معرف الجهاز) للمهام الخلفية
+    holders: Set[Hashable] = field(default_factory=set)
+    last_used: float = field(default_factory=time.monotonic)
+    last_checked: float = field(default_factory=time.monotonic)
+
+    def touch(self):
+        self.last_used = time.monotonic()
+
+
+class RouterConnectionPool:
+    """مجمع اتصالات مشتركة بين المستخدمين لكل راوتر"""
+
+    def __init__(self, keepalive_interval: float = MIKROTIK_KEEPALIVE_INTERVAL,
+                 idle_timeout: float = MIKROTIK_IDLE_TIMEOUT,
+                 mirror_active_sessions: bool = HOTSPOT_MIRROR_ENABLED):
+        self.keepalive_interval = keepalive_interval
+        self.idle_timeout = idle_timeout
+        self.mirror_active_sessions = mirror_active_sessions
+        self._entries: Dict[DeviceKey, PooledConnection] = {}
+        self._lock = asyncio.Lock()
+
+    @staticmethod
+    def device_key(device: MikroTikDevice) -> DeviceKey:
+        """مفتاح الاتصال المشترك"""
+        return (device.ip, device.port, device.username, bool(device.use_ssl))
+
+    async def acquire(self, holder_id: Hashable, device: MikroTikDevice) -> Optional[AsyncMikroTikClient]:
+        """الحصول على اتصال مشترك بالراوتر (يُنشأ عند الحاجة)"""
+        key = self.device_key(device)
+
+        async with self._lock:
+            entry = self._entries.get(key)
+
+            # كلمة مرور مختلفة تتطلب التحقق بتسجيل دخول جديد
+            if entry and entry.client.device.password != device.password:
+                candidate = AsyncMikroTikClient(MikroTikAPIClient(device))
+                if not await candidate.connect():
+                    return None
+                await entry.client.stop_mirror()
+                await entry.client.disconnect()
+                entry.client.auto_reconnect = False
+                candidate.auto_reconnect = True
+                candidate.mirror_enabled = self.mirror_active_sessions
+                entry.client = candidate
+            elif entry is None:
+                client = AsyncMikroTikClient(MikroTikAPIClient(device))
+                if not await client.connect():
+                    return None
+                client.auto_reconnect = True
+                client.mirror_enabled = self.mirror_active_sessions
+                entry = PooledConnection(key=key, client=client)
+                self._entries[key] = entry
+                logger.info(f"اتصال جديد في المجمع: {device}")
+
+            entry.holders.add(holder_id)
+            entry.touch()
+            return entry.client
+
+    def get(self, device: MikroTikDevice) -> Optional[AsyncMikroTikClient]:
+        """الحصول على الاتصال المشترك الحالي دون إنشاء اتصال جديد"""
+        entry = self._entries.get(self.device_key(device))
+        if entry is None:
+            return None
+        entry.touch()
+        return entry.client
+
+    def clients(self) -> List[AsyncMikroTikClient]:
+        """الاتصالات المشتركة التي يستخدمها أحد حالياً (المهام الدورية تُبقيها نشطة)"""
+        entries = [entry for entry in self._entries.values() if entry.holders]
+        for entry in entries:
+            entry.touch()
+        return [entry.client for entry in entries]
+
+    async def release(self, holder_id: Hashable, device: MikroTikDevice):
+        """تحرير الاتصال؛ يُغلق عند عدم وجود مستخدمين له"""
+        key = self.device_key(device)
+
+        async with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+
+            entry.holders.discard(holder_id)
+            if not entry.holders:
+                await self._close_entry(entry)
+
+    async def _close_entry(self, entry: PooledConnection):
+        """إزالة الاتصال من المجمع وإغلاقه"""
+        self._entries.pop(entry.key, None)
+        entry.client.auto_reconnect = False
+        await entry.client.stop_mirror()
+        await entry.client.disconnect()
+        logger.info(f"تم إغلاق الاتصال المشترك بـ {entry.client.device}")
+
+    async def maintain(self):
+        """
+        دورة صيانة واحدة: إغلاق الخامل وفحص الاتصالات وإعادة الميت منها
+
+        فحص الاتصال يتم دون القفل، أما الإغلاق وإعادة الاتصال فتحت القفل مع التأكد من أن
+        acquire لم يستبدل العميل (تغيير كلمة المرور) أو يُغلق الاتصال أثناء الفحص.
+        """
+        now = time.monotonic()
+
+        for entry in list(self._entries.values()):
+            client = entry.client
+
+            if not entry.holders:
+                async with self._lock:
+                    if self._entries.get(entry.key) is entry and not entry.holders:
+                        await self._close_entry(entry)
+                continue
+
+            last_used = max(entry.last_used, client.last_used)
+            if now - last_used >= self.idle_timeout:
+                # نغلق المقبس فقط؛ يُعاد فتحه تلقائياً عند أول استخدام
+                if client.client.is_connected():
+                    async with self._lock:
+                        if self._entries.get(entry.key) is entry and entry.client is client:
+                            logger.info(f"إغلاق اتصال خامل بـ {client.device}")
+                            client.idle_closed = True
+                            await client.disconnect()
+                continue
+
+            # الاتصال المستخدم مؤخراً لا يحتاج إلى فحص
+            if now - max(last_used, entry.last_checked) >= self.keepalive_interval:
+                entry.last_checked = now
+                if not await client.check_connection():
+                    async with self._lock:
+                        if self._entries.get(entry.key) is entry and entry.client is client:
+                            logger.warning(f"اتصال ميت بـ {client.device}، جاري إعادة الاتصال")
+                            await client.connect()
+
+    async def run_maintenance(self):
+        """تشغيل الصيانة الدورية في الخلفية"""
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                logger.error(f"خطأ في صيانة مجمع الاتصالات: {e}")
+            await asyncio.sleep(self.keepalive_interval)
+
+    async def close_all(self):
+        """إغلاق جميع الاتصالات"""
+        async with self._lock:
+            for entry in list(self._entries.values()):
+                await self._close_entry(entry)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,138 @@
+"""
+استيراد مستخدمي الهوتسبوت من ملف CSV
+
+يُقرأ الملف سطراً بسطر دون تحميله كاملاً في الذاكرة، ويُتحقق من كل صف على
+حدة فتُرفض الصفوف الخاطئة مع سببها دون إيقاف الاستيراد.
+
+الأعمدة بنفس ترتيب الإضافة اليدوية:
+username,password,profile,data_mb,hours,comment
+(سطر العناوين اختياري، والفاصل قد يكون , أو ; أو Tab)
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+
+from models import HotspotUser
+
+CSV_COLUMNS = ('username', 'password', 'profile', 'data_mb', 'hours', 'comment')
+
+# أسماء بديلة شائعة في ملفات التصدير من الأنظمة الأخرى
+_COLUMN_ALIASES = {
+    'name': 'username', 'user': 'username', 'pass': 'password',
+    'mb': 'data_mb', 'data': 'data_mb', 'time': 'hours', 'uptime': 'hours',
+}
+
+_MAX_NAME_LENGTH = 64
+
+# (رقم السطر، اسم المستخدم، المستخدم أو None، سبب الرفض)
+CsvRow = Tuple[int, str, Optional[HotspotUser], str]
+
+
+def _strip(text: str) -> str:
+    """إزالة المسافات وعلامة BOM (قد تبقى إذا لم يُفك الترميز بـ utf-8-sig)"""
+    return text.strip().strip('\ufeff').strip()
+
+
+def _column_name(cell: str) -> str:
+    name = _strip(cell).lower().replace('-', '_').replace(' ', '_')
+    return _COLUMN_ALIASES.get(name, name)
+
+
+def _quota(value: str, label: str) -> int:
+    value = value.strip()
+    if not value:
+        return 0
+    try:
+        number = int(value)
+    except ValueError:
+        raise ValueError(f"{label} ليس رقماً صحيحاً: {value}")
+    if number < 0:
+        raise ValueError(f"{label} يجب أن يكون أكبر من أو يساوي 0")
+    return number
+
+
+def parse_csv_row(values: dict, comment_default: str) -> HotspotUser:
+    """تحويل صف إلى HotspotUser مع التحقق من القيم (ValueError عند الخطأ)"""
+    username = (values.get('username') or '').strip()
+    password = (values.get('password') or '').strip()
+    if not username or not password:
+        raise ValueError("اسم المستخدم وكلمة المرور مطلوبان")
+    if len(username) > _MAX_NAME_LENGTH:
+        raise ValueError(f"اسم المستخدم أطول من {_MAX_NAME_LENGTH} حرفاً")
+    if any(not char.isprintable() for char in username + password):
+        raise ValueError("اسم المستخدم أو كلمة المرور يحتوي على رموز غير مسموحة")
+
+    data_mb = _quota(values.get('data_mb') or '', "حصة البيانات")
+    hours = _quota(values.get('hours') or '', "حصة الوقت")
+
+    return HotspotUser(
+        name=username,
+        password=password,
+        profile=(values.get('profile') or '').strip() or 'default',
+        limit_bytes_total=f"{data_mb}M" if data_mb > 0 else "",
+        limit_uptime=f"{hours}h" if hours > 0 else "",
+        comment=(values.get('comment') or '').strip() or comment_default
+    )
+
+
+def iter_csv_users(lines: Iterable[str]) -> Iterator[CsvRow]:
+    """قراءة الصفوف بالتتابع مع التحقق من كل صف ورفض الأسماء المكررة داخل الملف"""
+    lines = iter(lines)
+    # الأسطر الفارغة في بداية الملف تُتجاوز، ويُحدد الفاصل من أول سطر فيه بيانات
+    skipped: List[str] = []
+    for first in lines:
+        if _strip(first):
+            break
+        skipped.append(first)
+    else:
+        return
+
+    delimiter = max(',;\t', key=first.count)
+    reader = csv.reader(_chain_first(skipped + [first], lines), delimiter=delimiter)
+    comment_default = f"Imported on {datetime.now().strftime('%Y-%m-%d')}"
+    columns: List[str] = list(CSV_COLUMNS)
+    seen: Set[str] = set()
+    header_checked = False
+
+    for cells in reader:
+        if not any(_strip(cell) for cell in cells):
+            continue
+
+        # سطر العناوين هو أول صف غير فارغ فقط
+        if not header_checked:
+            header_checked = True
+            names = [_column_name(cell) for cell in cells]
+            if 'username' in names:
+                columns = names
+                continue
+
+        values = dict(zip(columns, cells))
+        username = (values.get('username') or '').strip()
+        if username in seen:
+            yield reader.line_num, username, None, "اسم المستخدم مكرر في الملف"
+            continue
+
+        try:
+            user = parse_csv_row(values, comment_default)
+        except ValueError as e:
+            yield reader.line_num, username, None, str(e)
+            continue
+
+        seen.add(username)
+        yield reader.line_num, username, user, ''
+
+
+def _chain_first(first: List[str], rest: Iterator[str]) -> Iterator[str]:
+    yield from first
+    yield from rest
+
+
+def error_report_csv(errors: Iterable[Tuple[int, str, str]]) -> bytes:
+    """ملف CSV بالصفوف المرفوضة (السطر، اسم المستخدم، السبب) بترميز يفتحه Excel"""
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(('line', 'username', 'error'))
+    writer.writerows(errors)
+    return output.getvalue().encode('utf-8-sig')
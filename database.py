@@ -5,15 +5,32 @@
 import sqlite3
 import json
 import logging
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence, Set, Tuple
 from datetime import datetime
 from cryptography.fernet import Fernet
 import base64
 
-from models import MikroTikDevice, UserSession
+from config import USAGE_RESOLUTIONS
+from models import CardSeries, MikroTikDevice, UserSession
 
 logger = logging.getLogger(__name__)
 
+def _legacy_quotas(data_quota: Optional[str], time_quota: Optional[str]) -> Tuple[int, int]:
+    """تحويل الحصص المنسقة في الصفوف القديمة (مثل "1.5 GB" و"2 يوم و 3 ساعة") إلى بايتات وثوانٍ"""
+    data_bytes = 0
+    parts = (data_quota or '').split()
+    if len(parts) == 2 and parts[1] in ('MB', 'GB'):
+        data_bytes = int(float(parts[0]) * 1024 ** (2 if parts[1] == 'MB' else 3))
+    
+    seconds = 0
+    parts = (time_quota or '').split()
+    for value, unit in zip(parts[::3], parts[1::3]):
+        if unit == 'يوم':
+            seconds += int(value) * 86400
+        elif unit == 'ساعة':
+            seconds += int(value) * 3600
+    return data_bytes, seconds
+
 class DatabaseManager:
     """مدير قاعدة البيانات"""
     
@@ -86,14 +103,107 @@ class DatabaseManager:
                         username TEXT,
                         password TEXT,
                         profile TEXT,
-                        data_quota TEXT,
-                        time_quota TEXT,
+                        data_quota_bytes INTEGER,
+                        time_quota_seconds INTEGER,
                         validity_days INTEGER,
                         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                        FOREIGN KEY (telegram_user_id) REFERENCES users (telegram_user_id)
+                        device_id INTEGER,
+                        provisioned_at TIMESTAMP,
+                        expires_at TIMESTAMP,
+                        expired_at TIMESTAMP,
+                        expiry_state TEXT,
+                        job_id INTEGER,
+                        FOREIGN KEY (telegram_user_id) REFERENCES users (telegram_user_id),
+                        FOREIGN KEY (device_id) REFERENCES mikrotik_devices (id)
+                    )
+                ''')
+                # قواعد البيانات القديمة: إضافة الأعمدة الجديدة للجداول الموجودة
+                self._add_missing_columns(cursor, 'hotspot_cards', {
+                    'device_id': 'INTEGER',
+                    'provisioned_at': 'TIMESTAMP',
+                    'expires_at': 'TIMESTAMP',
+                    'expired_at': 'TIMESTAMP',
+                    'expiry_state': 'TEXT',
+                    'job_id': 'INTEGER',
+                    'data_quota_bytes': 'INTEGER',
+                    'time_quota_seconds': 'INTEGER'
+                })
+                self._migrate_quotas(cursor, 'hotspot_cards')
+                # الكروت القديمة: وقت الانتهاء من وقت الإنشاء ومدة الصلاحية (بتوقيت UTC مثل created_at)
+                cursor.execute('''
+                    UPDATE hotspot_cards
+                    SET expires_at = datetime(created_at, '+' || validity_days || ' days')
+                    WHERE expires_at IS NULL AND expired_at IS NULL AND validity_days > 0
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_hotspot_cards_device
+                    ON hotspot_cards (device_id, username)
+                ''')
+                # فهرس جزئي للكروت التي لم تُعالج بعد فقط: المعالجة لا تُفحص مرة أخرى
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_hotspot_cards_pending_expiry
+                    ON hotspot_cards (device_id, expires_at) WHERE expired_at IS NULL
+                ''')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_hotspot_cards_job
+                    ON hotspot_cards (job_id) WHERE job_id IS NOT NULL
+                ''')
+                
+                # جدول مهام توليد الكروت في الخلفية (تُستأنف بعد إعادة تشغيل البوت)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS card_jobs (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        telegram_user_id INTEGER,
+                        chat_id INTEGER,
+                        message_id INTEGER,
+                        device_id INTEGER,
+                        params TEXT NOT NULL,
+                        status TEXT NOT NULL DEFAULT 'pending',
+                        series_id INTEGER,
+                        error_message TEXT,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        FOREIGN KEY (telegram_user_id) REFERENCES users (telegram_user_id),
+                        FOREIGN KEY (device_id) REFERENCES mikrotik_devices (id),
+                        FOREIGN KEY (series_id) REFERENCES card_series (id)
                     )
                 ''')
                 
+                # جدول سلاسل الكروت: سجل واحد للسلسلة بدلاً من صف لكل كرت
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS card_series (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        telegram_user_id INTEGER,
+                        device_id INTEGER,
+                        prefix TEXT NOT NULL,
+                        serial_width INTEGER NOT NULL,
+                        start_serial INTEGER NOT NULL,
+                        card_count INTEGER NOT NULL,
+                        secret_encrypted TEXT NOT NULL,
+                        profile TEXT,
+                        data_quota_bytes INTEGER,
+                        time_quota_seconds INTEGER,
+                        validity_days INTEGER,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        expires_at TIMESTAMP,
+                        expired_at TIMESTAMP,
+                        expiry_state TEXT,
+                        FOREIGN KEY (telegram_user_id) REFERENCES users (telegram_user_id),
+                        FOREIGN KEY (device_id) REFERENCES mikrotik_devices (id)
+                    )
+                ''')
+                self._add_missing_columns(cursor, 'card_series', {
+                    'data_quota_bytes': 'INTEGER',
+                    'time_quota_seconds': 'INTEGER',
+                    'expired_at': 'TIMESTAMP',
+                    'expiry_state': 'TEXT'
+                })
+                self._migrate_quotas(cursor, 'card_series')
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_card_series_prefix
+                    ON card_series (prefix, serial_width, start_serial)
+                ''')
+                
                 # جدول سجل العمليات
                 cursor.execute('''
                     CREATE TABLE IF NOT EXISTS operation_logs (
@@ -108,6 +218,20 @@ class DatabaseManager:
                     )
                 ''')
                 
+                # جدول استهلاك الهوتسبوت المجمّع (لكل مستخدم ولكل بروفايل، بدقة دقيقة/ساعة/يوم)
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS usage_rollups (
+                        router TEXT NOT NULL,
+                        scope TEXT NOT NULL,
+                        name TEXT NOT NULL,
+                        resolution INTEGER NOT NULL,
+                        bucket INTEGER NOT NULL,
+                        bytes_in INTEGER DEFAULT 0,
+                        bytes_out INTEGER DEFAULT 0,
+                        PRIMARY KEY (router, scope, resolution, bucket, name)
+                    ) WITHOUT ROWID
+                ''')
+                
                 conn.commit()
                 logger.info("تم تهيئة قاعدة البيانات بنجاح")
                 
@@ -115,6 +239,31 @@ class DatabaseManager:
             logger.error(f"خطأ في تهيئة قاعدة البيانات: {e}")
             raise
     
+    @staticmethod
+    def _add_missing_columns(cursor, table: str, columns: Dict[str, str]):
+        """إضافة الأعمدة غير الموجودة إلى جدول قائم"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        existing = {row[1] for row in cursor.fetchall()}
+        for name, declaration in columns.items():
+            if name not in existing:
+                cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {declaration}')
+    
+    @staticmethod
+    def _migrate_quotas(cursor, table: str):
+        """الصفوف القديمة: تحويل الحصص المنسقة إلى أرقام مرة واحدة"""
+        cursor.execute(f'PRAGMA table_info({table})')
+        if 'data_quota' not in {row[1] for row in cursor.fetchall()}:
+            return
+        cursor.execute(f'''
+            SELECT id, data_quota, time_quota FROM {table}
+            WHERE data_quota_bytes IS NULL OR time_quota_seconds IS NULL
+        ''')
+        cursor.executemany(
+            f'UPDATE {table} SET data_quota_bytes = ?, time_quota_seconds = ? WHERE id = ?',
+            [(*_legacy_quotas(data_quota, time_quota), row_id)
+             for row_id, data_quota, time_quota in cursor.fetchall()]
+        )
+    
     def encrypt_password(self, password: str) -> str:
         """تشفير كلمة المرور"""
         return self.cipher.encrypt(password.encode()).decode()
@@ -280,20 +429,23 @@ class DatabaseManager:
             logger.error(f"خطأ في تحديث نشاط المستخدم {telegram_user_id}: {e}")
             return False
     
-    def save_hotspot_cards(self, telegram_user_id: int, cards: List[Dict[str, Any]]) -> bool:
-        """حفظ كروت الهوتسبوت المولدة"""
+    def save_hotspot_cards(self, telegram_user_id: int, cards: List[Dict[str, Any]],
+                           device_id: int = None, job_id: int = None) -> bool:
+        """حفظ كروت الهوتسبوت المولدة (مع الجهاز الذي ولدت له ومهمة التوليد)"""
         try:
             with sqlite3.connect(self.db_path) as conn:
                 cursor = conn.cursor()
                 for card in cards:
                     cursor.execute('''
                         INSERT INTO hotspot_cards 
-                        (telegram_user_id, username, password, profile, data_quota, 
-                         time_quota, validity_days)
-                        VALUES (?, ?, ?, ?, ?, ?, ?)
+                        (telegram_user_id, username, password, profile, data_quota_bytes, 
+                         time_quota_seconds, validity_days, device_id, job_id, expires_at)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?,
+                                CASE WHEN ? > 0 THEN datetime('now', '+' || ? || ' days') END)
                     ''', (telegram_user_id, card['username'], card['password'], 
-                          card['profile'], card['data_quota'], card['time_quota'], 
-                          card['validity_days']))
+                          card['profile'], card['data_quota_bytes'], card['time_quota_seconds'], 
+                          card['validity_days'], device_id, job_id,
+                          card['validity_days'], card['validity_days']))
                 conn.commit()
                 return True
         except Exception as e:
@@ -317,6 +469,301 @@ class DatabaseManager:
             logger.error(f"خطأ في الحصول على كروت الهوتسبوت: {e}")
             return []
     
+    def get_card_usernames(self) -> Set[str]:
+        """أسماء جميع الكروت المحفوظة (لتجنب تكرارها عند توليد كروت جديدة)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('SELECT username FROM hotspot_cards')
+                return {row[0] for row in cursor}
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على أسماء الكروت: {e}")
+            return set()
+
+    def get_job_cards(self, job_id: int) -> List[Dict[str, Any]]:
+        """الكروت المحفوظة لمهمة توليد (بترتيب توليدها)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM hotspot_cards WHERE job_id = ? ORDER BY id', (job_id,))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على كروت المهمة {job_id}: {e}")
+            return []
+    
+    def get_device_cards(self, device_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """الكروت السارية المولدة لأجهزة معينة (لمطابقتها مع الراوتر)"""
+        if not device_ids:
+            return []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                placeholders = ','.join('?' * len(device_ids))
+                cursor.execute(f'''
+                    SELECT * FROM hotspot_cards
+                    WHERE device_id IN ({placeholders}) AND expired_at IS NULL
+                      AND (expires_at IS NULL OR expires_at > datetime('now'))
+                ''', tuple(device_ids))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على كروت الأجهزة {list(device_ids)}: {e}")
+            return []
+    
+    def mark_cards_provisioned(self, device_ids: Sequence[int], usernames: Sequence[str]) -> bool:
+        """تسجيل وقت إضافة الكروت إلى الراوتر (للكروت التي لم تُسجل بعد)"""
+        if not device_ids or not usernames:
+            return True
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                placeholders = ','.join('?' * len(device_ids))
+                now = datetime.now()
+                conn.executemany(f'''
+                    UPDATE hotspot_cards SET provisioned_at = ?
+                    WHERE username = ? AND device_id IN ({placeholders}) AND provisioned_at IS NULL
+                ''', [(now, username, *device_ids) for username in usernames])
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"خطأ في تحديث حالة إضافة الكروت: {e}")
+            return False
+    
+    def get_expired_cards(self, device_ids: Sequence[int], limit: int = 200) -> List[Dict[str, Any]]:
+        """الكروت المنتهية التي لم تُعالج بعد على الراوتر (الأقدم أولاً)"""
+        if not device_ids:
+            return []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                placeholders = ','.join('?' * len(device_ids))
+                cursor.execute(f'''
+                    SELECT id, username, device_id, expires_at FROM hotspot_cards
+                    WHERE expired_at IS NULL AND expires_at <= datetime('now')
+                      AND device_id IN ({placeholders})
+                    ORDER BY expires_at
+                    LIMIT ?
+                ''', (*device_ids, limit))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على الكروت المنتهية: {e}")
+            return []
+    
+    def mark_cards_expired(self, card_ids: Sequence[int], state: str) -> bool:
+        """تسجيل معالجة الكروت المنتهية (removed أو disabled أو missing) فلا تُفحص مرة أخرى"""
+        if not card_ids:
+            return True
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany(
+                    'UPDATE hotspot_cards SET expired_at = ?, expiry_state = ? WHERE id = ?',
+                    [(datetime.now(), state, card_id) for card_id in card_ids]
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"خطأ في تحديث حالة الكروت المنتهية: {e}")
+            return False
+    
+    def save_card_series(self, telegram_user_id: int, series: CardSeries,
+                         device_id: int = None) -> Optional[int]:
+        """حفظ سلسلة كروت (المفتاح السري مشفر مثل كلمات مرور الأجهزة)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO card_series
+                    (telegram_user_id, device_id, prefix, serial_width, start_serial, card_count,
+                     secret_encrypted, profile, data_quota_bytes, time_quota_seconds, validity_days, expires_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?,
+                            CASE WHEN ? > 0 THEN datetime('now', '+' || ? || ' days') END)
+                ''', (telegram_user_id, device_id, series.prefix, series.serial_width, series.start,
+                      series.count, self.encrypt_password(series.secret.hex()), series.profile,
+                      series.data_quota_bytes, series.time_quota_seconds, series.validity_days,
+                      series.validity_days, series.validity_days))
+                conn.commit()
+                series.id = cursor.lastrowid
+                return series.id
+        except Exception as e:
+            logger.error(f"خطأ في حفظ سلسلة الكروت: {e}")
+            return None
+    
+    def _row_to_series(self, row) -> CardSeries:
+        created_at = row['created_at']
+        return CardSeries(
+            secret=bytes.fromhex(self.decrypt_password(row['secret_encrypted'])),
+            prefix=row['prefix'],
+            start=row['start_serial'],
+            count=row['card_count'],
+            profile=row['profile'],
+            data_quota_bytes=row['data_quota_bytes'] or 0,
+            time_quota_seconds=row['time_quota_seconds'] or 0,
+            validity_days=row['validity_days'],
+            serial_width=row['serial_width'],
+            id=row['id'],
+            created_at=datetime.fromisoformat(created_at) if created_at else None
+        )
+    
+    def get_card_series(self, series_id: int) -> Optional[CardSeries]:
+        """الحصول على سلسلة كروت"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM card_series WHERE id = ?', (series_id,))
+                row = cursor.fetchone()
+                return self._row_to_series(row) if row else None
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على سلسلة الكروت {series_id}: {e}")
+            return None
+    
+    def get_device_series(self, device_ids: Sequence[int]) -> List[CardSeries]:
+        """السلاسل السارية المولدة لأجهزة معينة"""
+        if not device_ids:
+            return []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                placeholders = ','.join('?' * len(device_ids))
+                cursor.execute(f'''
+                    SELECT * FROM card_series
+                    WHERE device_id IN ({placeholders})
+                      AND (expires_at IS NULL OR expires_at > datetime('now'))
+                ''', tuple(device_ids))
+                return [self._row_to_series(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على سلاسل الأجهزة {list(device_ids)}: {e}")
+            return []
+    
+    def get_expired_series(self, device_ids: Sequence[int]) -> List[CardSeries]:
+        """السلاسل المنتهية التي لم تُعالج بعد على الراوتر (الأقدم أولاً)"""
+        if not device_ids:
+            return []
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                placeholders = ','.join('?' * len(device_ids))
+                cursor.execute(f'''
+                    SELECT * FROM card_series
+                    WHERE expired_at IS NULL AND expires_at <= datetime('now')
+                      AND device_id IN ({placeholders})
+                    ORDER BY expires_at
+                ''', tuple(device_ids))
+                return [self._row_to_series(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على السلاسل المنتهية: {e}")
+            return []
+    
+    def mark_series_expired(self, series_id: int, state: str) -> bool:
+        """تسجيل معالجة سلسلة منتهية فلا تُفحص مرة أخرى"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.execute('UPDATE card_series SET expired_at = ?, expiry_state = ? WHERE id = ?',
+                             (datetime.now(), state, series_id))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"خطأ في تحديث حالة السلسلة المنتهية {series_id}: {e}")
+            return False
+    
+    def next_series_serial(self, prefix: str, serial_width: int) -> int:
+        """أول رقم تسلسلي غير مستخدم في السلاسل ذات البادئة نفسها"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT MAX(start_serial + card_count) FROM card_series
+                    WHERE prefix = ? AND serial_width = ?
+                ''', (prefix, serial_width))
+                return cursor.fetchone()[0] or 0
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على الرقم التسلسلي التالي: {e}")
+            return 0
+    
+    def create_card_job(self, telegram_user_id: int, chat_id: int, message_id: int,
+                        device_id: Optional[int], params: Dict[str, Any]) -> Optional[int]:
+        """تسجيل مهمة توليد كروت جديدة"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO card_jobs (telegram_user_id, chat_id, message_id, device_id, params)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (telegram_user_id, chat_id, message_id, device_id, json.dumps(params)))
+                conn.commit()
+                return cursor.lastrowid
+        except Exception as e:
+            logger.error(f"خطأ في تسجيل مهمة توليد الكروت: {e}")
+            return None
+    
+    def update_card_job(self, job_id: int, status: str, series_id: int = None,
+                        error_message: str = None) -> bool:
+        """تحديث مرحلة مهمة توليد الكروت"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE card_jobs
+                    SET status = ?, series_id = COALESCE(?, series_id),
+                        error_message = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ?
+                ''', (status, series_id, error_message, job_id))
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"خطأ في تحديث مهمة توليد الكروت {job_id}: {e}")
+            return False
+    
+    def get_card_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """الحصول على مهمة توليد كروت"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('SELECT * FROM card_jobs WHERE id = ?', (job_id,))
+                row = cursor.fetchone()
+                if not row:
+                    return None
+                job = dict(row)
+                job['params'] = json.loads(job['params'])
+                return job
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على مهمة توليد الكروت {job_id}: {e}")
+            return None
+    
+    def get_unfinished_card_jobs(self) -> List[int]:
+        """معرفات مهام التوليد غير المكتملة (لاستئنافها بعد إعادة التشغيل)"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id FROM card_jobs WHERE status NOT IN ('done', 'failed') ORDER BY id
+                ''')
+                return [row[0] for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على مهام التوليد غير المكتملة: {e}")
+            return []
+    
+    def get_all_devices(self) -> List[Dict[str, Any]]:
+        """جميع الأجهزة المحفوظة النشطة لجميع المستخدمين"""
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT id, telegram_user_id, device_name, ip_address, port, username, use_ssl
+                    FROM mikrotik_devices
+                    WHERE is_active = TRUE
+                    ORDER BY id
+                ''')
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على الأجهزة المحفوظة: {e}")
+            return []
+    
     def log_operation(self, telegram_user_id: int, operation_type: str, 
                      operation_details: str, success: bool, error_message: str = None) -> bool:
         """تسجيل العملية في السجل"""
@@ -369,4 +816,70 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"خطأ في تنظيف الجلسات القديمة: {e}")
             return False
-
+    
+    def record_usage(self, router: str, deltas: List[Tuple[str, str, int, int]], timestamp: int,
+                     resolutions: Sequence[int] = USAGE_RESOLUTIONS) -> bool:
+        """
+        إضافة فروقات الاستهلاك إلى جميع مستويات التجميع
+        
+        deltas: قائمة (النطاق 'user' أو 'profile'، الاسم، البايتات الواردة، البايتات الصادرة)
+        """
+        rows = [
+            (router, scope, name, resolution, timestamp - timestamp % resolution, bytes_in, bytes_out)
+            for scope, name, bytes_in, bytes_out in deltas
+            for resolution in resolutions
+        ]
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany('''
+                    INSERT INTO usage_rollups (router, scope, name, resolution, bucket, bytes_in, bytes_out)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (router, scope, resolution, bucket, name) DO UPDATE SET
+                        bytes_in = bytes_in + excluded.bytes_in,
+                        bytes_out = bytes_out + excluded.bytes_out
+                ''', rows)
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"خطأ في تسجيل الاستهلاك للراوتر {router}: {e}")
+            return False
+    
+    def get_top_usage(self, router: str, scope: str, since: int, limit: int = 10,
+                      resolution: int = None) -> List[Dict[str, Any]]:
+        """الأكثر استهلاكاً منذ وقت معين من جدول التجميع (دون المرور على العينات الخام)"""
+        if resolution is None:
+            # أخشن دقة تغطي الفترة بخطأ مقبول (ساعة للأسبوع، يوم للفترات الطويلة)
+            span = max(0, int(datetime.now().timestamp()) - since)
+            resolution = 60 if span <= 6 * 3600 else (3600 if span <= 31 * 86400 else 86400)
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.row_factory = sqlite3.Row
+                cursor = conn.cursor()
+                cursor.execute('''
+                    SELECT name, SUM(bytes_in) AS bytes_in, SUM(bytes_out) AS bytes_out,
+                           SUM(bytes_in + bytes_out) AS total_bytes
+                    FROM usage_rollups
+                    WHERE router = ? AND scope = ? AND resolution = ? AND bucket >= ?
+                    GROUP BY name
+                    ORDER BY total_bytes DESC
+                    LIMIT ?
+                ''', (router, scope, resolution, since - since % resolution, limit))
+                return [dict(row) for row in cursor.fetchall()]
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على الأكثر استهلاكاً للراوتر {router}: {e}")
+            return []
+    
+    def prune_usage(self, retention: Dict[int, int], now: int = None) -> bool:
+        """حذف مستويات التجميع الأقدم من مدة الاحتفاظ الخاصة بكل دقة (بالثواني)"""
+        now = now or int(datetime.now().timestamp())
+        try:
+            with sqlite3.connect(self.db_path) as conn:
+                conn.executemany(
+                    'DELETE FROM usage_rollups WHERE resolution = ? AND bucket < ?',
+                    [(resolution, now - keep) for resolution, keep in retention.items()]
+                )
+                conn.commit()
+                return True
+        except Exception as e:
+            logger.error(f"خطأ في تنظيف بيانات الاستهلاك القديمة: {e}")
+            return False
@@ -6,23 +6,80 @@ import logging
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime
 import asyncio
+import dataclasses
+import io
+import tempfile
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from mikrotik_api_client import MikroTikAPIClient
+from async_mikrotik_client import AsyncMikroTikClient
 from card_generator import HotspotCardGenerator
+from config import (
+    BULK_PROGRESS_INTERVAL, SEARCH_PAGE_SIZE, CSV_IMPORT_BATCH_SIZE, CSV_IMPORT_MAX_BYTES, CARD_JOB_MAX_CARDS
+)
+from csv_importer import iter_csv_users, error_report_csv
 from database import DatabaseManager
-from models import HotspotUser, HotspotCard
+from models import HotspotUser, HotspotCard, UserSelector, format_data_quota, format_time_quota
+from pdf_renderer import PdfRenderService
 
 logger = logging.getLogger(__name__)
 
+# أسماء شروط الاختيار في العمليات الجماعية
+_SELECTOR_KEYS = {'profile', 'comment', 'name', 'min_mb', 'disabled'}
+
+def parse_user_selector(text: str) -> UserSelector:
+    """
+    تحليل شروط الاختيار بصيغة key=value مفصولة بمسافات، مثل:
+    profile=basic comment=Generated name=card* min_mb=500 disabled=no
+    """
+    values = {}
+    for token in text.split():
+        key, separator, value = token.partition('=')
+        key = key.strip().lower()
+        if not separator or key not in _SELECTOR_KEYS or not value:
+            raise ValueError(f"شرط غير معروف: {token}")
+        values[key] = value
+    if not values:
+        raise ValueError("يجب تحديد شرط واحد على الأقل")
+    
+    disabled = values.get('disabled')
+    if disabled is not None and disabled.lower() not in ('yes', 'no'):
+        raise ValueError("قيمة disabled يجب أن تكون yes أو no")
+    
+    min_mb = values.get('min_mb')
+    if min_mb is not None and not min_mb.isdigit():
+        raise ValueError("قيمة min_mb يجب أن تكون رقماً صحيحاً")
+    return UserSelector(
+        profile=values.get('profile'),
+        comment_prefix=values.get('comment'),
+        name_pattern=values.get('name'),
+        min_bytes=int(min_mb) * 1024 * 1024 if min_mb is not None else None,
+        disabled=disabled.lower() == 'yes' if disabled is not None else None
+    )
+
 class HotspotManager:
     """مدير الهوتسبوت المتقدم"""
     
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
         self.card_generator = HotspotCardGenerator()
+        self.pdf_renderer = PdfRenderService()
+    
+    def _current_device_id(self, user_id: int) -> Optional[int]:
+        """معرف الجهاز المحفوظ الذي سجل المستخدم الدخول إليه"""
+        session = self.db.get_user_session(user_id)
+        return session['current_device_id'] if session else None
+    
+    async def _unknown_profile_message(self, client: Optional[AsyncMikroTikClient], profile: str) -> Optional[str]:
+        """رسالة خطأ إذا لم يكن البروفايل موجوداً على الراوتر (القائمة مخزنة مؤقتاً في العميل)"""
+        if not client or not client.is_connected():
+            return None
+        profiles = await client.get_hotspot_profiles()
+        # القائمة الفارغة تعني تعذر القراءة، فلا يُرفض الطلب بسببها
+        if not profiles or profile in profiles:
+            return None
+        return f"❌ البروفايل '{profile}' غير موجود على الراوتر.\nالبروفايلات المتاحة: {', '.join(profiles)}"
     
     async def handle_generate_cards_callback(self, query, context: ContextTypes.DEFAULT_TYPE):
         """معالج توليد الكروت"""
@@ -32,7 +89,9 @@ class HotspotManager:
             "العدد:البادئة:البروفايل:البيانات_MB:الوقت_ساعة:الأيام\n\n"
             "مثال:\n"
             "10:user:default:1024:24:30\n\n"
-            "هذا سينشئ 10 كروت بادئة 'user' مع 1GB بيانات و 24 ساعة لمدة 30 يوم"
+            "هذا سينشئ 10 كروت بادئة 'user' مع 1GB بيانات و 24 ساعة لمدة 30 يوم\n\n"
+            "أضف :series في النهاية لتوليد سلسلة كروت تُحفظ كسجل واحد\n"
+            "(تُعاد توليد كروتها عند الحاجة من مفتاح سري)"
         )
         
         context.user_data['waiting_for_card_params'] = True
@@ -45,7 +104,8 @@ class HotspotManager:
         try:
             # تحليل المعايير
             parts = text.split(':')
-            if len(parts) != 6:
+            as_series = len(parts) == 7 and parts[6].strip().lower() == 'series'
+            if len(parts) != 6 and not as_series:
                 await update.message.reply_text(
                     "❌ تنسيق خاطئ. يرجى استخدام:\n"
                     "العدد:البادئة:البروفايل:البيانات_MB:الوقت_ساعة:الأيام"
@@ -60,8 +120,8 @@ class HotspotManager:
             validity_days = int(parts[5])
             
             # التحقق من القيود
-            if count <= 0 or count > 100:
-                await update.message.reply_text("❌ عدد الكروت يجب أن يكون بين 1 و 100")
+            if count <= 0 or count > CARD_JOB_MAX_CARDS:
+                await update.message.reply_text(f"❌ عدد الكروت يجب أن يكون بين 1 و {CARD_JOB_MAX_CARDS}")
                 return
             
             if data_quota_mb < 0:
@@ -76,66 +136,34 @@ class HotspotManager:
                 await update.message.reply_text("❌ مدة الصلاحية يجب أن تكون أكبر من 0")
                 return
             
-            # عرض رسالة المعالجة
-            processing_msg = await update.message.reply_text("⏳ جاري توليد الكروت...")
-            
-            # توليد الكروت
-            cards = self.card_generator.generate_cards(
-                count=count,
-                prefix=prefix,
-                profile=profile,
-                data_quota_mb=data_quota_mb,
-                time_quota_hours=time_quota_hours,
-                validity_days=validity_days
-            )
-            
-            # حفظ الكروت في قاعدة البيانات
-            cards_data = []
-            for card in cards:
-                cards_data.append({
-                    'username': card.username,
-                    'password': card.password,
-                    'profile': card.profile,
-                    'data_quota': card.data_quota,
-                    'time_quota': card.time_quota,
-                    'validity_days': card.validity_days
-                })
-            
-            self.db.save_hotspot_cards(user_id, cards_data)
-            
-            # إنشاء ملف PDF
-            pdf_data = self.card_generator.create_multiple_cards_pdf(cards)
-            
-            # إنشاء ملخص نصي
-            summary = self.card_generator.create_card_summary_text(cards)
-            
-            # إرسال الملخص
-            keyboard = [
-                [
-                    InlineKeyboardButton("📤 إضافة للميكروتك", callback_data=f"add_cards_to_mikrotik:{len(cards)}"),
-                    InlineKeyboardButton("📋 عرض التفاصيل", callback_data="show_card_details")
-                ],
-                [
-                    InlineKeyboardButton("🔙 العودة", callback_data="hotspot_cards")
-                ]
-            ]
+            handlers = context.bot_data.get('handlers')
+            if not handlers:
+                await update.message.reply_text("❌ خطأ في النظام")
+                return
             
-            await processing_msg.edit_text(
-                summary,
-                reply_markup=InlineKeyboardMarkup(keyboard)
-            )
+            error = await self._unknown_profile_message(handlers.get_user_connection(user_id), profile)
+            if error:
+                await update.message.reply_text(error)
+                return
             
-            # إرسال ملف PDF
-            await update.message.reply_document(
-                document=pdf_data,
-                filename=f"hotspot_cards_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                caption=f"📄 ملف PDF يحتوي على {count} كرت هوتسبوت"
+            # التوليد والحفظ والرسم والإضافة للراوتر تتم في مهمة خلفية تحدّث هذه الرسالة
+            processing_msg = await update.message.reply_text(
+                f"⏳ تمت إضافة طلب توليد {count} كرت إلى الطابور.\n"
+                "سيتم تحديث هذه الرسالة بالتقدم وإرسال ملف PDF عند الانتهاء."
             )
-            
-            # حفظ الكروت في سياق المستخدم للاستخدام اللاحق
-            context.user_data['generated_cards'] = cards
-            
-            self.db.log_operation(user_id, "generate_cards", f"توليد {count} كرت", True)
+            params = {
+                'count': count,
+                'prefix': prefix,
+                'profile': profile,
+                'data_quota_mb': data_quota_mb,
+                'time_quota_hours': time_quota_hours,
+                'validity_days': validity_days,
+                'series': as_series
+            }
+            job_id = await handlers.card_jobs.submit(user_id, processing_msg.chat_id, processing_msg.message_id,
+                                                     self._current_device_id(user_id), params)
+            if job_id is None:
+                raise RuntimeError("تعذر تسجيل مهمة التوليد")
             
         except ValueError as e:
             await update.message.reply_text(f"❌ خطأ في القيم المدخلة: {e}")
@@ -147,66 +175,6 @@ class HotspotManager:
         # إزالة حالة انتظار معايير الكروت
         context.user_data.pop('waiting_for_card_params', None)
     
-    async def handle_add_cards_to_mikrotik(self, query, context: ContextTypes.DEFAULT_TYPE):
-        """إضافة الكروت المولدة إلى الميكروتك"""
-        user_id = query.from_user.id
-        
-        # الحصول على الكروت المولدة
-        cards = context.user_data.get('generated_cards', [])
-        if not cards:
-            await query.edit_message_text("❌ لا توجد كروت مولدة للإضافة")
-            return
-        
-        # الحصول على اتصال الميكروتك
-        from telegram_handlers import TelegramHandlers
-        handlers = context.bot_data.get('handlers')
-        if not handlers:
-            await query.edit_message_text("❌ خطأ في النظام")
-            return
-        
-        client = handlers.get_user_connection(user_id)
-        if not client or not client.is_connected():
-            await query.edit_message_text("❌ غير متصل بالميكروتك. يرجى تسجيل الدخول أولاً.")
-            return
-        
-        # عرض رسالة المعالجة
-        await query.edit_message_text(f"⏳ جاري إضافة {len(cards)} كرت إلى الميكروتك...")
-        
-        # تحويل الكروت إلى مستخدمي هوتسبوت
-        users = self.card_generator.convert_cards_to_hotspot_users(cards)
-        
-        # إضافة المستخدمين
-        success_count = 0
-        failed_users = []
-        
-        for user in users:
-            if client.add_hotspot_user(user):
-                success_count += 1
-            else:
-                failed_users.append(user.name)
-        
-        # إنشاء رسالة النتيجة
-        if success_count == len(users):
-            message = f"✅ تم إضافة جميع الكروت بنجاح ({success_count}/{len(users)})"
-            self.db.log_operation(user_id, "add_cards", f"إضافة {success_count} كرت بنجاح", True)
-        else:
-            message = f"⚠️ تم إضافة {success_count} من {len(users)} كرت\n\n"
-            if failed_users:
-                message += f"فشل في إضافة: {', '.join(failed_users[:5])}"
-                if len(failed_users) > 5:
-                    message += f" و {len(failed_users) - 5} آخرين"
-            
-            self.db.log_operation(user_id, "add_cards", 
-                                f"إضافة {success_count}/{len(users)} كرت", 
-                                success_count > 0)
-        
-        keyboard = [[InlineKeyboardButton("🔙 العودة", callback_data="hotspot_cards")]]
-        
-        await query.edit_message_text(
-            message,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-    
     async def handle_saved_cards_callback(self, query):
         """عرض الكروت المحفوظة"""
         user_id = query.from_user.id
@@ -220,7 +188,8 @@ class HotspotManager:
             for i, card in enumerate(saved_cards[:10], 1):
                 created_date = card['created_at'][:10]  # تاريخ الإنشاء فقط
                 message += f"{i}. 👤 {card['username']} | 🔑 {card['password']}\n"
-                message += f"   📊 {card['data_quota']} | ⏰ {card['time_quota']}\n"
+                message += (f"   📊 {format_data_quota(card['data_quota_bytes'])} | "
+                            f"⏰ {format_time_quota(card['time_quota_seconds'])}\n")
                 message += f"   📅 {created_date}\n\n"
             
             if len(saved_cards) > 10:
@@ -241,6 +210,57 @@ class HotspotManager:
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
     
+    async def handle_reconcile_cards(self, query, context: ContextTypes.DEFAULT_TYPE, apply: bool = False):
+        """مقارنة الكروت المحفوظة بمستخدمي الراوتر الحالي، وإصلاح الفروقات عند الطلب"""
+        user_id = query.from_user.id
+        handlers = context.bot_data.get('handlers')
+        if not handlers:
+            await query.edit_message_text("❌ خطأ في النظام")
+            return
+        
+        client = handlers.get_user_connection(user_id)
+        if not client or not client.is_connected():
+            await query.edit_message_text("❌ غير متصل بالميكروتك. يرجى تسجيل الدخول أولاً.")
+            return
+        
+        await query.edit_message_text("⏳ جاري إصلاح الفروقات..." if apply else "⏳ جاري مقارنة الكروت مع الراوتر...")
+        
+        device_ids = handlers.reconciler.device_ids_for(client.device)
+        report = await handlers.reconciler.reconcile(client, device_ids, apply=apply)
+        if report is None:
+            keyboard = [[InlineKeyboardButton("🔙 العودة", callback_data="hotspot_cards")]]
+            await query.edit_message_text("❌ تعذرت قراءة مستخدمي الراوتر. يرجى المحاولة لاحقاً.",
+                                          reply_markup=InlineKeyboardMarkup(keyboard))
+            return
+        
+        message = "🔄 مطابقة الكروت مع الراوتر\n\n"
+        message += f"✅ متطابقة: {len(report.in_sync)}\n"
+        message += f"➕ غير موجودة على الراوتر: {len(report.missing)}\n"
+        message += f"✏️ قيم مختلفة: {len(report.mismatched)}\n"
+        message += f"❔ مستخدمون مولدون بلا كرت محفوظ: {len(report.orphaned)}\n"
+        
+        for title, names in (("غير موجودة", [user.name for user in report.missing]),
+                             ("مختلفة", sorted(report.mismatched)),
+                             ("بلا كرت", [user.name for user in report.orphaned])):
+            if names:
+                message += f"\n{title}: {', '.join(names[:5])}"
+                if len(names) > 5:
+                    message += f" و {len(names) - 5} آخرين"
+        
+        keyboard = []
+        if apply:
+            message += (f"\n\n🛠️ تمت إضافة {report.added.success_count}، وتصحيح {report.updated.success_count}، "
+                        f"وفشل {report.failed_count}")
+            self.db.log_operation(user_id, "reconcile_cards",
+                                  f"إضافة {report.added.success_count} كرت، تصحيح {report.updated.success_count}، "
+                                  f"فشل {report.failed_count}",
+                                  not report.failed_count)
+        elif report.missing or report.mismatched:
+            keyboard.append([InlineKeyboardButton("🛠️ إصلاح الفروقات", callback_data="reconcile_cards_apply")])
+        keyboard.append([InlineKeyboardButton("🔙 العودة", callback_data="hotspot_cards")])
+        
+        await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+    
     async def handle_hotspot_add_user(self, query, context: ContextTypes.DEFAULT_TYPE):
         """إضافة مستخدم هوتسبوت يدوياً"""
         await query.edit_message_text(
@@ -296,6 +316,11 @@ class HotspotManager:
                 await update.message.reply_text("❌ غير متصل بالميكروتك. يرجى تسجيل الدخول أولاً.")
                 return
             
+            error = await self._unknown_profile_message(client, profile)
+            if error:
+                await update.message.reply_text(error)
+                return
+            
             # إنشاء مستخدم الهوتسبوت
             data_limit = f"{data_quota_mb}M" if data_quota_mb > 0 else ""
             time_limit = f"{time_quota_hours}h" if time_quota_hours > 0 else ""
@@ -312,7 +337,7 @@ class HotspotManager:
             # إضافة المستخدم
             processing_msg = await update.message.reply_text("⏳ جاري إضافة المستخدم...")
             
-            if client.add_hotspot_user(hotspot_user):
+            if await client.add_hotspot_user(hotspot_user):
                 await processing_msg.edit_text(
                     f"✅ تم إضافة المستخدم بنجاح\n\n"
                     f"👤 اسم المستخدم: {username}\n"
@@ -337,11 +362,249 @@ class HotspotManager:
         # إزالة حالة انتظار بيانات المستخدم
         context.user_data.pop('waiting_for_user_data', None)
     
+    async def handle_import_prompt(self, query, context: ContextTypes.DEFAULT_TYPE):
+        """طلب ملف CSV لاستيراد المستخدمين"""
+        await query.edit_message_text(
+            "📥 استيراد مستخدمين من ملف CSV\n\n"
+            "أرسل الملف كمستند، كل سطر بالتنسيق التالي:\n"
+            "username,password,profile,data_mb,hours,comment\n\n"
+            "مثال:\n"
+            "ahmed123,pass123,default,2048,48,غرفة 12\n\n"
+            "سطر العناوين اختياري، والأعمدة بعد كلمة المرور اختيارية.\n"
+            "الصفوف الخاطئة تُتجاوز وتُرسل في تقرير أخطاء بعد انتهاء الاستيراد."
+        )
+        
+        context.user_data['waiting_for_import_file'] = True
+    
+    async def handle_import_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """استيراد المستخدمين من ملف CSV مرسل على دفعات مع رسالة تقدم وتقرير أخطاء"""
+        user_id = update.effective_user.id
+        document = update.message.document
+        context.user_data.pop('waiting_for_import_file', None)
+        
+        if document.file_size and document.file_size > CSV_IMPORT_MAX_BYTES:
+            await update.message.reply_text(
+                f"❌ حجم الملف أكبر من الحد المسموح ({CSV_IMPORT_MAX_BYTES // (1024 * 1024)} MB)"
+            )
+            return
+        
+        handlers = context.bot_data.get('handlers')
+        if not handlers:
+            await update.message.reply_text("❌ خطأ في النظام")
+            return
+        
+        client = handlers.get_user_connection(user_id)
+        if not client or not client.is_connected():
+            await update.message.reply_text("❌ غير متصل بالميكروتك. يرجى تسجيل الدخول أولاً.")
+            return
+        
+        processing_msg = await update.message.reply_text(f"⏳ جاري استيراد {document.file_name}...")
+        
+        errors: List[Tuple[int, str, str]] = []
+        progress = {'done': 0, 'added': 0}
+        
+        async def report_progress():
+            shown = 0
+            while True:
+                await asyncio.sleep(BULK_PROGRESS_INTERVAL)
+                if progress['done'] != shown:
+                    shown = progress['done']
+                    try:
+                        await processing_msg.edit_text(
+                            f"⏳ جاري الاستيراد... تمت معالجة {shown} صف\n"
+                            f"✅ تمت الإضافة: {progress['added']} | ❌ مرفوض: {len(errors)}"
+                        )
+                    except Exception as e:
+                        logger.warning(f"تعذر تحديث رسالة التقدم: {e}")
+        
+        async def flush(batch: List[Tuple[int, HotspotUser]]):
+            base = progress['done']
+            
+            def on_progress(done: int, total: int):
+                progress['done'] = base + done
+            
+            result = await client.add_hotspot_users([user for _, user in batch], progress=on_progress)
+            # الاسم قد يتكرر في الدفعة، فيُسجل الخطأ لكل صف يحمله
+            lines: Dict[str, List[int]] = {}
+            for line, user in batch:
+                lines.setdefault(user.name, []).append(line)
+            errors.extend((line, name, reason) for name, reason in result.failed.items()
+                          for line in lines.get(name, [0]))
+            progress['added'] += result.success_count
+            progress['done'] = base + len(batch)
+        
+        reporter = asyncio.create_task(report_progress())
+        aborted = None
+        try:
+            # الملف يُحفظ مؤقتاً على القرص ويُقرأ سطراً بسطر، وكل دفعة تُرسل فور اكتمالها
+            with tempfile.TemporaryFile() as raw:
+                telegram_file = await document.get_file()
+                await telegram_file.download_to_memory(out=raw)
+                raw.seek(0)
+                
+                batch: List[Tuple[int, HotspotUser]] = []
+                with io.TextIOWrapper(raw, encoding='utf-8-sig', newline='') as text:
+                    for line, username, user, error in iter_csv_users(text):
+                        if user is None:
+                            errors.append((line, username, error))
+                            continue
+                        batch.append((line, user))
+                        if len(batch) >= CSV_IMPORT_BATCH_SIZE:
+                            await flush(batch)
+                            batch = []
+                    if batch:
+                        await flush(batch)
+        except UnicodeDecodeError:
+            aborted = "الملف ليس بترميز UTF-8"
+        except Exception as e:
+            logger.error(f"خطأ في استيراد ملف المستخدمين: {e}")
+            aborted = str(e)
+        finally:
+            reporter.cancel()
+        
+        added = progress['added']
+        if aborted:
+            message = f"❌ توقف الاستيراد: {aborted}\n\nتمت إضافة {added} مستخدم قبل التوقف"
+        elif not errors:
+            message = f"✅ تم استيراد جميع المستخدمين بنجاح ({added})"
+        else:
+            message = f"⚠️ تم استيراد {added} مستخدم، ورُفض {len(errors)} صف (التفاصيل في تقرير الأخطاء)"
+        
+        keyboard = [[InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")]]
+        await processing_msg.edit_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+        
+        if errors:
+            errors.sort()
+            await update.message.reply_document(
+                document=error_report_csv(errors),
+                filename=f"import_errors_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+                caption=f"❌ الصفوف المرفوضة ({len(errors)})"
+            )
+        
+        self.db.log_operation(user_id, "import_users",
+                              f"استيراد {added} مستخدم من {document.file_name}، رفض {len(errors)}",
+                              added > 0 and not aborted)
+    
+    async def handle_bulk_prompt(self, query, context: ContextTypes.DEFAULT_TYPE):
+        """طلب شروط اختيار المستخدمين للعمليات الجماعية"""
+        await query.edit_message_text(
+            "⚙️ عمليات جماعية على المستخدمين\n\n"
+            "أرسل شروط الاختيار بصيغة key=value مفصولة بمسافات:\n"
+            "• profile=اسم البروفايل\n"
+            "• comment=بداية التعليق\n"
+            "• name=نمط الاسم (مثل card* أو user-??)\n"
+            "• min_mb=الحد الأدنى للاستهلاك بالميجابايت\n"
+            "• disabled=yes أو no\n\n"
+            "مثال:\n"
+            "profile=monthly comment=Generated name=card*\n\n"
+            "ستظهر أعداد المستخدمين والجلسات المطابقة قبل التنفيذ."
+        )
+        
+        context.user_data['waiting_for_bulk_selector'] = True
+    
+    async def handle_bulk_selector(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """معاينة المستخدمين والجلسات المطابقة للشروط مع أزرار العمليات"""
+        user_id = update.effective_user.id
+        text = update.message.text.strip()
+        
+        try:
+            selector = parse_user_selector(text)
+        except ValueError as e:
+            await update.message.reply_text(f"❌ {e}")
+            return
+        
+        handlers = context.bot_data.get('handlers')
+        client = handlers.get_user_connection(user_id) if handlers else None
+        if not client or not client.is_connected():
+            await update.message.reply_text("❌ غير متصل بالميكروتك. يرجى تسجيل الدخول أولاً.")
+            return
+        
+        context.user_data.pop('waiting_for_bulk_selector', None)
+        context.user_data['bulk_selector'] = selector
+        processing_msg = await update.message.reply_text("🔍 جاري تحديد المستخدمين المطابقين...")
+        
+        users = await client.select_hotspot_users(selector)
+        sessions = await client.select_hotspot_sessions(selector)
+        disabled_count = sum(1 for user in users if user.disabled)
+        
+        message = f"⚙️ الشروط: {text}\n\n"
+        message += f"👥 مستخدمون مطابقون: {len(users)} (منهم {disabled_count} معطل)\n"
+        message += f"🟢 جلسات نشطة مطابقة: {len(sessions)}\n"
+        if users:
+            message += f"\nأمثلة: {', '.join(user.name for user in users[:5])}"
+            if len(users) > 5:
+                message += f" و {len(users) - 5} آخرين"
+        
+        keyboard = []
+        if sessions:
+            keyboard.append([InlineKeyboardButton(f"⛔ قطع الجلسات ({len(sessions)})", callback_data="bulk_action:kick")])
+        if len(users) > disabled_count:
+            keyboard.append([InlineKeyboardButton(f"🚫 تعطيل وقطع ({len(users) - disabled_count})",
+                                                  callback_data="bulk_action:disable")])
+        if disabled_count:
+            keyboard.append([InlineKeyboardButton(f"✅ تفعيل ({disabled_count})", callback_data="bulk_action:enable")])
+        keyboard.append([InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")])
+        
+        await processing_msg.edit_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+    
+    async def handle_bulk_action(self, query, context: ContextTypes.DEFAULT_TYPE, action: str):
+        """تنفيذ العملية الجماعية على المطابقين وقت التنفيذ مع تقرير واحد"""
+        user_id = query.from_user.id
+        selector = context.user_data.get('bulk_selector')
+        if selector is None or action not in ('kick', 'disable', 'enable'):
+            await query.edit_message_text("❌ انتهت جلسة العملية الجماعية. يرجى تحديد الشروط مرة أخرى.")
+            return
+        
+        handlers = context.bot_data.get('handlers')
+        client = handlers.get_user_connection(user_id) if handlers else None
+        if not client or not client.is_connected():
+            await query.edit_message_text("❌ غير متصل بالميكروتك. يرجى تسجيل الدخول أولاً.")
+            return
+        
+        await query.edit_message_text("⏳ جاري تنفيذ العملية الجماعية...")
+        
+        # الاختيار يُعاد وقت التنفيذ فلا تُستخدم معرفات قديمة من المعاينة
+        toggled = None
+        if action != 'kick':
+            users = await client.select_hotspot_users(dataclasses.replace(selector, disabled=action == 'enable'))
+            toggled = await client.set_hotspot_users_disabled(users, disabled=action == 'disable')
+        
+        kicked = None
+        if action == 'kick':
+            kicked = await client.remove_hotspot_sessions(await client.select_hotspot_sessions(selector))
+        elif action == 'disable':
+            # جلسات من عُطلوا فعلاً: الشروط بعد التعطيل لم تعد تطابقهم (مثل disabled=no)
+            sessions = await client.find_hotspot_active_users(toggled.added, extra_fields=('.id',))
+            kicked = await client.remove_hotspot_sessions(sessions)
+        
+        titles = {'kick': "قطع الجلسات", 'disable': "تعطيل المستخدمين", 'enable': "تفعيل المستخدمين"}
+        message = f"📋 تقرير {titles[action]}\n\n"
+        failures = {}
+        if toggled is not None:
+            message += f"{'🚫 تم تعطيل' if action == 'disable' else '✅ تم تفعيل'}: {toggled.success_count}\n"
+            failures.update(toggled.failed)
+        if kicked is not None:
+            message += f"⛔ جلسات تم قطعها: {kicked.success_count}\n"
+            failures.update(kicked.failed)
+        if failures:
+            message += f"❌ فشل: {len(failures)}\n"
+            for name, reason in list(failures.items())[:5]:
+                message += f"• {name}: {reason}\n"
+            if len(failures) > 5:
+                message += f"و {len(failures) - 5} آخرين\n"
+        
+        done = (toggled.success_count if toggled else 0) + (kicked.success_count if kicked else 0)
+        self.db.log_operation(user_id, f"bulk_{action}", f"{titles[action]}: {done} نجح، {len(failures)} فشل",
+                              not failures)
+        
+        keyboard = [[InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")]]
+        await query.edit_message_text(message, reply_markup=InlineKeyboardMarkup(keyboard))
+    
     async def handle_hotspot_search(self, query, context: ContextTypes.DEFAULT_TYPE):
         """البحث عن مستخدم هوتسبوت"""
         await query.edit_message_text(
             "🔍 البحث عن مستخدم هوتسبوت\n\n"
-            "يرجى إدخال اسم المستخدم للبحث عنه:"
+            "يرجى إدخال اسم المستخدم أو جزء منه أو من التعليق للبحث عنه:"
         )
         
         context.user_data['waiting_for_search_query'] = True
@@ -370,41 +633,72 @@ class HotspotManager:
         # البحث في المستخدمين
         processing_msg = await update.message.reply_text("🔍 جاري البحث...")
         
-        all_users = client.get_hotspot_users()
-        active_users = client.get_hotspot_active_users()
+        context.user_data['search_term'] = search_term
+        message, keyboard, total = await self._render_search_page(client, search_term, 0)
+        await processing_msg.edit_text(message, reply_markup=keyboard)
+        
+        self.db.log_operation(user_id, "search_user", f"البحث عن '{search_term}' - {total} نتيجة", True)
         
-        # البحث عن المستخدمين المطابقين
-        matching_users = [user for user in all_users if search_term.lower() in user.name.lower()]
+        # إزالة حالة انتظار استعلام البحث
+        context.user_data.pop('waiting_for_search_query', None)
+    
+    async def handle_search_page(self, query, context: ContextTypes.DEFAULT_TYPE, page: int):
+        """عرض صفحة أخرى من نتائج البحث"""
+        search_term = context.user_data.get('search_term')
+        if not search_term:
+            await query.edit_message_text("❌ انتهت جلسة البحث. يرجى البحث مرة أخرى.")
+            return
+        
+        handlers = context.bot_data.get('handlers')
+        client = handlers.get_user_connection(query.from_user.id) if handlers else None
+        if not client or not client.is_connected():
+            await query.edit_message_text("❌ غير متصل بالميكروتك. يرجى تسجيل الدخول أولاً.")
+            return
+        
+        message, keyboard, _ = await self._render_search_page(client, search_term, page)
+        await query.edit_message_text(message, reply_markup=keyboard)
+    
+    async def _render_search_page(self, client: AsyncMikroTikClient, search_term: str,
+                                  page: int) -> Tuple[str, InlineKeyboardMarkup, int]:
+        """نص صفحة من نتائج البحث مع أزرار التنقل"""
+        offset = page * SEARCH_PAGE_SIZE
+        matching_users, total = await client.search_hotspot_users(search_term, offset, SEARCH_PAGE_SIZE)
+        
+        # الجلسات النشطة لمستخدمي الصفحة فقط، مع فحص العضوية عبر مجموعة
+        active_names = {active.name for active in
+                        await client.find_hotspot_active_users([user.name for user in matching_users])}
+        
+        back = [InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")]
         
         if not matching_users:
-            await processing_msg.edit_text(f"❌ لم يتم العثور على مستخدمين يحتوون على '{search_term}'")
-        else:
-            message = f"🔍 نتائج البحث عن '{search_term}' ({len(matching_users)} نتيجة)\n\n"
-            
-            for i, user in enumerate(matching_users[:10], 1):
-                # فحص إذا كان المستخدم نشطاً
-                is_active = any(active.name == user.name for active in active_users)
-                status = "🟢 نشط" if is_active else ("🔴 معطل" if user.disabled else "⚪ غير متصل")
-                
-                message += f"{i}. 👤 {user.name}\n"
-                message += f"   🔑 كلمة المرور: {user.password}\n"
-                message += f"   📊 البروفايل: {user.profile}\n"
-                message += f"   🔘 الحالة: {status}\n"
-                
-                if user.limit_bytes_total:
-                    message += f"   💾 حصة البيانات: {user.limit_bytes_total}\n"
-                if user.limit_uptime:
-                    message += f"   ⏰ حصة الوقت: {user.limit_uptime}\n"
-                
-                message += "\n"
-            
-            if len(matching_users) > 10:
-                message += f"... و {len(matching_users) - 10} نتيجة إضافية"
-            
-            await processing_msg.edit_text(message)
+            message = f"❌ لم يتم العثور على مستخدمين مطابقين لـ '{search_term}'"
+            return message, InlineKeyboardMarkup([back]), total
         
-        self.db.log_operation(user_id, "search_user", f"البحث عن '{search_term}' - {len(matching_users)} نتيجة", True)
+        pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+        message = f"🔍 نتائج البحث عن '{search_term}' ({total} نتيجة) - صفحة {page + 1}/{pages}\n\n"
         
-        # إزالة حالة انتظار استعلام البحث
-        context.user_data.pop('waiting_for_search_query', None)
-
+        for i, user in enumerate(matching_users, offset + 1):
+            status = "🟢 نشط" if user.name in active_names else ("🔴 معطل" if user.disabled else "⚪ غير متصل")
+            
+            message += f"{i}. 👤 {user.name}\n"
+            message += f"   🔑 كلمة المرور: {user.password}\n"
+            message += f"   📊 البروفايل: {user.profile}\n"
+            message += f"   🔘 الحالة: {status}\n"
+            
+            if user.comment:
+                message += f"   📝 التعليق: {user.comment}\n"
+            if user.limit_bytes_total:
+                message += f"   💾 حصة البيانات: {user.limit_bytes_total}\n"
+            if user.limit_uptime:
+                message += f"   ⏰ حصة الوقت: {user.limit_uptime}\n"
+            
+            message += "\n"
+        
+        navigation = []
+        if page > 0:
+            navigation.append(InlineKeyboardButton("⬅️ السابق", callback_data=f"hotspot_search_page:{page - 1}"))
+        if page + 1 < pages:
+            navigation.append(InlineKeyboardButton("التالي ➡️", callback_data=f"hotspot_search_page:{page + 1}"))
+        
+        keyboard = [navigation, back] if navigation else [back]
+        return message, InlineKeyboardMarkup(keyboard), total
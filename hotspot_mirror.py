@@ -0,0 +1,354 @@
+"""
+نسخ محلية من جداول الهوتسبوت
+
+يُحمَّل الجدول مرة واحدة ثم تُطبَّق عليه أحداث الإضافة والتعديل والحذف
+من أمر listen على اتصال مخصص، فتُخدم القوائم والبحث من الذاكرة:
+- HotspotActiveMirror: الجلسات النشطة مع بحث فوري بالمستخدم وعنوان IP وعنوان MAC
+- HotspotUserIndex: مستخدمو الهوتسبوت مع فهرس بحث بالاسم والتعليق
+"""
+
+import asyncio
+import logging
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+from config import (
+    HOTSPOT_MIRROR_RESYNC_INTERVAL, HOTSPOT_MIRROR_RETRY_DELAY, HOTSPOT_INDEX_RESYNC_INTERVAL
+)
+from mikrotik_api_client import (
+    HOTSPOT_ACTIVE_FIELDS, HOTSPOT_USER_FIELDS, parse_active_user, parse_hotspot_user
+)
+from models import MikroTikDevice, HotspotUser
+from routeros_protocol import AsyncRouterOsConnection
+
+logger = logging.getLogger(__name__)
+
+
+class RouterTableMirror(ABC):
+    """نسخة محلية من جدول RouterOS تُحدّث عبر listen (الفئات الفرعية تبني الفهارس)"""
+
+    path = ''
+    fields: Sequence[str] = ()
+
+    def __init__(self, device: MikroTikDevice, resync_interval: float, retry_delay: float):
+        self.device = device
+        self.resync_interval = resync_interval
+        self.retry_delay = retry_delay
+        self.ready = False
+        self._task: Optional[asyncio.Task] = None
+        self._rows: Dict[str, Dict[str, str]] = {}
+        self._buffered: Optional[List[Dict[str, str]]] = None
+
+    def start(self):
+        """بدء المزامنة في الخلفية"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """إيقاف المزامنة وتفريغ النسخة"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        self._reset()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @abstractmethod
+    def _index(self, row_id: str, row: Dict[str, str]):
+        """إضافة صف إلى الفهارس"""
+
+    @abstractmethod
+    def _unindex(self, row_id: str):
+        """إزالة صف من الفهارس"""
+
+    @abstractmethod
+    def _clear_indexes(self):
+        """تفريغ الفهارس"""
+
+    def _reset(self):
+        self.ready = False
+        self._rows.clear()
+        self._clear_indexes()
+
+    def load(self, rows: List[Dict[str, str]]):
+        """استبدال النسخة بلقطة كاملة من الجدول"""
+        self._reset()
+        for row in rows:
+            row_id = row.get('.id')
+            if row_id:
+                self._rows[row_id] = dict(row)
+                self._index(row_id, self._rows[row_id])
+        self.ready = True
+
+    def apply(self, event: Dict[str, str]):
+        """تطبيق حدث من listen (إضافة أو تعديل أو حذف بـ .dead)"""
+        row_id = event.get('.id')
+        if not row_id:
+            return
+
+        if row_id in self._rows:
+            self._unindex(row_id)
+        if event.get('.dead') in ('true', 'yes'):
+            self._rows.pop(row_id, None)
+            return
+
+        row = self._rows.setdefault(row_id, {})
+        row.update(event)
+        self._index(row_id, row)
+
+    def _on_event(self, event: Dict[str, str]):
+        # الأحداث التي تصل أثناء تحميل اللقطة تُطبَّق بعدها بالترتيب
+        if self._buffered is not None:
+            self._buffered.append(event)
+        else:
+            self.apply(event)
+
+    async def _resync(self, connection: AsyncRouterOsConnection):
+        """تحميل لقطة كاملة مع الاحتفاظ بترتيب الأحداث الواصلة أثناءها"""
+        self._buffered = []
+        try:
+            rows = await connection.execute(
+                self.path + '/print',
+                {'.proplist': ','.join(('.id', *self.fields))},
+                timeout=connection.timeout
+            )
+            buffered = self._buffered
+            self._buffered = None
+            self.load(rows)
+            for event in buffered:
+                self.apply(event)
+        finally:
+            self._buffered = None
+
+    async def _listen(self, connection: AsyncRouterOsConnection):
+        async for event in connection.stream(self.path + '/listen'):
+            self._on_event(event)
+        raise ConnectionError("توقف أمر listen")
+
+    async def _sync(self):
+        """جلسة مزامنة واحدة على اتصال مخصص حتى ينقطع"""
+        connection = AsyncRouterOsConnection(self.device.ip, self.device.port, self.device.use_ssl)
+        listener = None
+        try:
+            await connection.connect()
+            await connection.login(self.device.username, self.device.password)
+
+            # نبدأ listen قبل اللقطة حتى لا يضيع أي تغيير بينهما
+            listener = asyncio.create_task(self._listen(connection))
+            await asyncio.sleep(0)
+            await self._resync(connection)
+            logger.info(f"تم تحميل {len(self)} صف من {self.path} على {self.device}")
+
+            while True:
+                done, _ = await asyncio.wait({listener}, timeout=self.resync_interval)
+                if done:
+                    listener.result()
+                # إعادة تحميل دورية لما لا يصل عبر listen (مثل العدادات)
+                await self._resync(connection)
+        finally:
+            self.ready = False
+            if listener is not None:
+                listener.cancel()
+                await asyncio.gather(listener, return_exceptions=True)
+            await connection.close()
+
+    async def _run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                await self._sync()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"انقطعت مزامنة {self.path} مع {self.device}: {e}")
+            # تجنب إعادة المحاولة المتكررة عند فشل الاتصال مباشرة
+            await asyncio.sleep(max(0.0, self.retry_delay - (time.monotonic() - started)))
+
+
+class HotspotActiveMirror(RouterTableMirror):
+    """نسخة محلية من الجلسات النشطة لراوتر واحد"""
+
+    path = '/ip/hotspot/active'
+    fields = HOTSPOT_ACTIVE_FIELDS
+
+    def __init__(self, device: MikroTikDevice,
+                 resync_interval: float = HOTSPOT_MIRROR_RESYNC_INTERVAL,
+                 retry_delay: float = HOTSPOT_MIRROR_RETRY_DELAY):
+        super().__init__(device, resync_interval, retry_delay)
+        self._sessions: Dict[str, HotspotUser] = {}
+        self._by_user: Dict[str, Set[str]] = {}
+        self._by_ip: Dict[str, str] = {}
+        self._by_mac: Dict[str, str] = {}
+
+    def users(self) -> List[HotspotUser]:
+        """جميع الجلسات النشطة"""
+        return list(self._sessions.values())
+
+    def is_active(self, name: str) -> bool:
+        """هل للمستخدم جلسة نشطة"""
+        return name in self._by_user
+
+    def find_by_user(self, name: str) -> List[HotspotUser]:
+        """جلسات مستخدم معين"""
+        return [self._sessions[session_id] for session_id in self._by_user.get(name, ())]
+
+    def find_by_ip(self, address: str) -> Optional[HotspotUser]:
+        """الجلسة التي تستخدم عنوان IP معين"""
+        session_id = self._by_ip.get(address)
+        return self._sessions.get(session_id) if session_id else None
+
+    def find_by_mac(self, mac_address: str) -> Optional[HotspotUser]:
+        """الجلسة التي تستخدم عنوان MAC معين"""
+        session_id = self._by_mac.get(mac_address.upper())
+        return self._sessions.get(session_id) if session_id else None
+
+    def _clear_indexes(self):
+        self._sessions.clear()
+        self._by_user.clear()
+        self._by_ip.clear()
+        self._by_mac.clear()
+
+    def _unindex(self, session_id: str):
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return
+        sessions = self._by_user.get(session.name)
+        if sessions is not None:
+            sessions.discard(session_id)
+            if not sessions:
+                del self._by_user[session.name]
+        if self._by_ip.get(session.ip_address) == session_id:
+            del self._by_ip[session.ip_address]
+        if self._by_mac.get((session.mac_address or '').upper()) == session_id:
+            del self._by_mac[session.mac_address.upper()]
+
+    def _index(self, session_id: str, row: Dict[str, str]):
+        session = parse_active_user(row)
+        self._sessions[session_id] = session
+        self._by_user.setdefault(session.name, set()).add(session_id)
+        if session.ip_address:
+            self._by_ip[session.ip_address] = session_id
+        if session.mac_address:
+            self._by_mac[session.mac_address.upper()] = session_id
+
+
+def _trigrams(text: str) -> Set[str]:
+    """المقاطع الثلاثية في النص (للبحث الجزئي)"""
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _match_rank(term: str, name: str, comment: str) -> Optional[int]:
+    """ترتيب نتيجة البحث (الاسم المطابق ثم بداية الاسم ثم جزء منه ثم التعليق)، أو None إذا لم تطابق"""
+    if name == term:
+        return 0
+    if name.startswith(term):
+        return 1
+    if term in name:
+        return 2
+    if term in comment:
+        return 3
+    return None
+
+
+def search_users(users: Sequence[HotspotUser], term: str, offset: int = 0,
+                 limit: int = 10) -> Tuple[List[HotspotUser], int]:
+    """البحث في قائمة مستخدمين بترتيب الفهرس نفسه (عندما لا يكون الفهرس جاهزاً)"""
+    term = term.strip().lower()
+    if not term:
+        return [], 0
+
+    ranked = []
+    for position, user in enumerate(users):
+        name = user.name.lower()
+        rank = _match_rank(term, name, user.comment.lower())
+        if rank is not None:
+            ranked.append((rank, name, position))
+
+    ranked.sort()
+    page = ranked[offset:offset + limit]
+    return [users[position] for _, _, position in page], len(ranked)
+
+
+class HotspotUserIndex(RouterTableMirror):
+    """
+    فهرس بحث محلي لمستخدمي الهوتسبوت
+
+    المقاطع الثلاثية للاسم والتعليق تحصر المرشحين للبحث الجزئي، ثم تُرتب
+    النتائج: تطابق تام، ثم بداية الاسم، ثم جزء من الاسم، ثم جزء من التعليق.
+    """
+
+    path = '/ip/hotspot/user'
+    fields = HOTSPOT_USER_FIELDS
+
+    def __init__(self, device: MikroTikDevice,
+                 resync_interval: float = HOTSPOT_INDEX_RESYNC_INTERVAL,
+                 retry_delay: float = HOTSPOT_MIRROR_RETRY_DELAY):
+        super().__init__(device, resync_interval, retry_delay)
+        self._users: Dict[str, HotspotUser] = {}
+        self._keys: Dict[str, Tuple[str, str]] = {}
+        self._by_name: Dict[str, str] = {}
+        self._grams: Dict[str, Set[str]] = {}
+
+    def get(self, name: str) -> Optional[HotspotUser]:
+        """مستخدم بالاسم"""
+        user_id = self._by_name.get(name)
+        return self._users.get(user_id) if user_id else None
+
+    def users(self) -> List[HotspotUser]:
+        """جميع المستخدمين"""
+        return list(self._users.values())
+
+    def search(self, term: str, offset: int = 0, limit: int = 10) -> Tuple[List[HotspotUser], int]:
+        """البحث بالاسم أو التعليق؛ يعيد (صفحة النتائج، إجمالي النتائج)"""
+        term = term.strip().lower()
+        if not term:
+            return [], 0
+
+        if len(term) >= 3:
+            sets = sorted((self._grams.get(gram, set()) for gram in _trigrams(term)), key=len)
+            candidates = set.intersection(*sets) if sets else set()
+        else:
+            candidates = self._users.keys()
+
+        ranked = []
+        for user_id in candidates:
+            name, comment = self._keys[user_id]
+            rank = _match_rank(term, name, comment)
+            if rank is not None:
+                ranked.append((rank, name, user_id))
+
+        ranked.sort()
+        page = ranked[offset:offset + limit]
+        return [self._users[user_id] for _, _, user_id in page], len(ranked)
+
+    def _clear_indexes(self):
+        self._users.clear()
+        self._keys.clear()
+        self._by_name.clear()
+        self._grams.clear()
+
+    def _unindex(self, user_id: str):
+        user = self._users.pop(user_id, None)
+        if user is None:
+            return
+        name, comment = self._keys.pop(user_id)
+        if self._by_name.get(user.name) == user_id:
+            del self._by_name[user.name]
+        for gram in _trigrams(name) | _trigrams(comment):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(user_id)
+                if not ids:
+                    del self._grams[gram]
+
+    def _index(self, user_id: str, row: Dict[str, str]):
+        user = parse_hotspot_user(row)
+        name, comment = user.name.lower(), user.comment.lower()
+        self._users[user_id] = user
+        self._keys[user_id] = (name, comment)
+        self._by_name[user.name] = user_id
+        for gram in _trigrams(name) | _trigrams(comment):
+            self._grams.setdefault(gram, set()).add(user_id)
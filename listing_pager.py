@@ -0,0 +1,95 @@
+"""
+تصفح القوائم الطويلة على صفحات
+
+تُحفظ لقطة من القائمة لكل مستخدم تليجرام لمدة محددة، وتُعرض الصفحات
+(التالي، السابق، القفز) من اللقطة دون الرجوع إلى الراوتر في كل صفحة.
+"""
+
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from telegram import InlineKeyboardButton
+
+from config import LISTING_PAGE_SIZE, LISTING_SNAPSHOT_TTL
+
+
+@dataclass
+class ListingSnapshot:
+    """لقطة من قائمة (مستخدمون أو جلسات) مع أسماء المستخدمين النشطين وقتها"""
+    items: List[Any]
+    active_names: Set[str] = field(default_factory=set)
+    created_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def age(self) -> float:
+        return time.monotonic() - self.created_at
+
+
+class ListingPager:
+    """لقطات القوائم لكل (مستخدم، قائمة) مع مدة صلاحية"""
+
+    def __init__(self, ttl: float = LISTING_SNAPSHOT_TTL, page_size: int = LISTING_PAGE_SIZE):
+        self.ttl = ttl
+        self.page_size = page_size
+        self._snapshots: Dict[Tuple[int, str], ListingSnapshot] = {}
+
+    def get(self, user_id: int, listing: str) -> Optional[ListingSnapshot]:
+        """اللقطة الحالية إن كانت صالحة"""
+        snapshot = self._snapshots.get((user_id, listing))
+        if snapshot is None or snapshot.age >= self.ttl:
+            self._snapshots.pop((user_id, listing), None)
+            return None
+        return snapshot
+
+    def put(self, user_id: int, listing: str, items: List[Any],
+            active_names: Set[str] = None) -> ListingSnapshot:
+        """حفظ لقطة جديدة (وحذف اللقطات المنتهية)"""
+        self._purge()
+        snapshot = ListingSnapshot(items=items, active_names=active_names or set())
+        self._snapshots[(user_id, listing)] = snapshot
+        return snapshot
+
+    def discard(self, user_id: int):
+        """حذف جميع لقطات المستخدم (مثلاً عند تغيير الجهاز)"""
+        for key in [key for key in self._snapshots if key[0] == user_id]:
+            del self._snapshots[key]
+
+    def _purge(self):
+        for key in [key for key, snapshot in self._snapshots.items() if snapshot.age >= self.ttl]:
+            del self._snapshots[key]
+
+    def page_count(self, snapshot: ListingSnapshot) -> int:
+        return max(1, (len(snapshot.items) + self.page_size - 1) // self.page_size)
+
+    def page(self, snapshot: ListingSnapshot, page: int) -> Tuple[List[Any], int, int]:
+        """عناصر الصفحة مع (رقم الصفحة بعد التصحيح، رقم أول عنصر)"""
+        page = min(max(page, 0), self.page_count(snapshot) - 1)
+        offset = page * self.page_size
+        return snapshot.items[offset:offset + self.page_size], page, offset
+
+    def keyboard(self, snapshot: ListingSnapshot, page: int, prefix: str) -> List[List[InlineKeyboardButton]]:
+        """أزرار التنقل: الأولى، السابقة، الحالية، التالية، الأخيرة، والقفز 10 صفحات"""
+        pages = self.page_count(snapshot)
+        if pages <= 1:
+            return []
+
+        def button(text: str, target: int) -> InlineKeyboardButton:
+            return InlineKeyboardButton(text, callback_data=f"{prefix}:{target}")
+
+        row = []
+        if page > 0:
+            row += [button("⏮", 0), button("⬅️", page - 1)]
+        row.append(button(f"{page + 1}/{pages}", page))
+        if page + 1 < pages:
+            row += [button("➡️", page + 1), button("⏭", pages - 1)]
+
+        rows = [row]
+        jumps = []
+        if page >= 10:
+            jumps.append(button("-10", page - 10))
+        if page + 10 < pages:
+            jumps.append(button("+10", page + 10))
+        if jumps:
+            rows.append(jumps)
+        return rows
@@ -2,15 +2,19 @@
 البوت الرئيسي لإدارة الميكروتك عبر تليجرام
 """
 
+import asyncio
 import logging
 import os
 from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, filters
 
-from config import TELEGRAM_BOT_TOKEN, ENCRYPTION_KEY
+from config import TELEGRAM_BOT_TOKEN, ENCRYPTION_KEY, CARD_JOB_WORKERS
 from database import DatabaseManager
 from telegram_handlers import TelegramHandlers
 from hotspot_manager import HotspotManager
 from network_tools import NetworkTools
+from async_mikrotik_client import shutdown_router_executors
+from usage_sampler import UsageSampler
+from card_expiry import CardExpiryEnforcer
 
 # إعداد نظام السجلات
 logging.basicConfig(
@@ -34,8 +38,17 @@ class MikroTikTelegramBot:
         # تهيئة المعالجات
         self.handlers = TelegramHandlers(self.db)
 
+        # المهام الخلفية (صيانة الاتصالات وغيرها)
+        self.background_tasks = []
+
         # إنشاء التطبيق
-        self.application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
+        self.application = (
+            Application.builder()
+            .token(TELEGRAM_BOT_TOKEN)
+            .post_init(self.post_init)
+            .post_shutdown(self.post_shutdown)
+            .build()
+        )
 
         # تسجيل المعالجات
         self.register_handlers()
@@ -46,10 +59,34 @@ class MikroTikTelegramBot:
         self.application.add_handler(CommandHandler("login", self.handlers.login_command))
         self.application.add_handler(CallbackQueryHandler(self.handlers.handle_callback_query))
         self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.handlers.handle_message))
+        self.application.add_handler(MessageHandler(filters.Document.ALL, self.handlers.handle_document))
 
         # حفظ مرجع للمعالجات
         self.application.bot_data["handlers"] = self.handlers
 
+    async def post_init(self, application: Application):
+        """تشغيل المهام الخلفية بعد تهيئة التطبيق"""
+        self.background_tasks.append(asyncio.create_task(self.handlers.pool.run_maintenance()))
+        self.background_tasks.append(asyncio.create_task(UsageSampler(self.db, self.handlers.pool).run()))
+        self.background_tasks.append(asyncio.create_task(self.handlers.reconciler.run()))
+        self.background_tasks.append(asyncio.create_task(CardExpiryEnforcer(self.db, self.handlers.pool).run()))
+
+        # استئناف مهام توليد الكروت التي لم تكتمل قبل إعادة التشغيل
+        await self.handlers.card_jobs.resume()
+        for _ in range(CARD_JOB_WORKERS):
+            self.background_tasks.append(asyncio.create_task(self.handlers.card_jobs.run(application.bot)))
+
+    async def post_shutdown(self, application: Application):
+        """إيقاف المهام الخلفية وإغلاق اتصالات الميكروتك عند إيقاف البوت"""
+        for task in self.background_tasks:
+            task.cancel()
+        await asyncio.gather(*self.background_tasks, return_exceptions=True)
+        self.background_tasks.clear()
+
+        await self.handlers.pool.close_all()
+        shutdown_router_executors()
+        self.handlers.hotspot_manager.pdf_renderer.shutdown()
+
     async def error_handler(self, update, context):
         """معالج الأخطاء"""
         logger.error(f"خطأ في البوت: {context.error}")
@@ -3,35 +3,150 @@
 """
 
 import logging
-from typing import List, Optional, Dict, Any
+from collections import deque
+from typing import List, Optional, Dict, Any, Sequence, Callable
 from datetime import datetime
+from fnmatch import fnmatchcase
 import re
 
 try:
     import routeros_api
+    from routeros_api.query import AndQuery, IsEqualQuery, IsGreaterQuery, IsLessQuery, OrQuery
 except ImportError:
     print("يرجى تثبيت مكتبة RouterOS-api: pip install RouterOS-api")
     raise
 
+from config import (
+    MIKROTIK_API_BACKEND, MIKROTIK_CACHE_TTL, MIKROTIK_CACHE_MAX_ENTRIES,
+    MIKROTIK_BULK_WINDOW, MIKROTIK_BULK_RETRIES
+)
+from router_cache import RouterCache, make_key
+from routeros_protocol import NativeRouterOsApiPool
 from models import (
-    MikroTikDevice, SystemInfo, NetworkInterface, HotspotUser,
+    MikroTikDevice, SystemInfo, NetworkInterface, HotspotUser, BulkAddResult, UserSelector,
     NetworkDevice, PingResult, TracerouteResult, DiagnosticResult, SystemHealth
 )
 
 logger = logging.getLogger(__name__)
 
+# الأعمدة التي تحتاجها النماذج من كل قائمة (.proplist) بدلاً من جلب جميع الخصائص
+INTERFACE_FIELDS = (
+    'name', 'type', 'running', 'disabled', 'rx-byte', 'tx-byte',
+    'rx-packet', 'tx-packet', 'rx-error', 'tx-error'
+)
+INTERFACE_RATE_FIELDS = ('name', 'rx-bits-per-second', 'tx-bits-per-second')
+HOTSPOT_ACTIVE_FIELDS = (
+    'user', 'server', 'address', 'mac-address', 'uptime',
+    'bytes-in', 'bytes-out', 'packets-in', 'packets-out'
+)
+HOTSPOT_USER_FIELDS = (
+    'name', 'password', 'profile', 'server', 'disabled', 'comment',
+    'limit-uptime', 'limit-bytes-in', 'limit-bytes-out', 'limit-bytes-total'
+)
+
+def _proplist(fields: Sequence[str], extra_fields: Sequence[str] = ()) -> Dict[str, str]:
+    """وسيط .proplist لطلب أعمدة محددة فقط من الراوتر"""
+    return {'proplist': ','.join(dict.fromkeys([*fields, *extra_fields]))}
+
+def _extra_values(row: Dict[str, Any], extra_fields: Sequence[str]) -> Dict[str, Any]:
+    """قيم الأعمدة الإضافية التي طلبها المستدعي"""
+    keys = [field[1:] if field.startswith('.') else field for field in extra_fields]
+    return {key: row[key] for key in keys if key in row}
+
+def _prefix_query(key: str, prefix: str):
+    """مطابقة البادئة كنطاق: prefix <= key < البادئة التالية (لا يدعم API البحث الجزئي)"""
+    at_least = OrQuery(IsEqualQuery(key, prefix), IsGreaterQuery(key, prefix))
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return AndQuery(at_least, IsLessQuery(key, upper))
+
+def _any_of_query(key: str, values: Sequence[str]):
+    """مطابقة أي قيمة من القائمة"""
+    queries = [IsEqualQuery(key, str(value)) for value in values]
+    return queries[0] if len(queries) == 1 else OrQuery(*queries)
+
+def parse_active_user(user: Dict[str, Any], extra_fields: Sequence[str] = ()) -> HotspotUser:
+    """تحويل صف /ip/hotspot/active إلى HotspotUser"""
+    return HotspotUser(
+        name=user.get('user', ''),
+        password='',  # لا يتم عرض كلمة المرور في الجلسات النشطة
+        profile='',  # الجلسة لا تحمل البروفايل، يُؤخذ من /ip/hotspot/user عند الحاجة
+        server=user.get('server', ''),
+        ip_address=user.get('address', ''),
+        mac_address=user.get('mac-address', ''),
+        uptime=user.get('uptime', ''),
+        bytes_in=int(user.get('bytes-in', 0)),
+        bytes_out=int(user.get('bytes-out', 0)),
+        packets_in=int(user.get('packets-in', 0)),
+        packets_out=int(user.get('packets-out', 0)),
+        extra=_extra_values(user, extra_fields)
+    )
+
+def session_key(session: HotspotUser) -> str:
+    """مفتاح الجلسة في نتائج العمليات الجماعية (قد يكون للمستخدم أكثر من جلسة)"""
+    return f"{session.name}@{session.ip_address}"
+
+def parse_hotspot_user(user: Dict[str, Any], extra_fields: Sequence[str] = ()) -> HotspotUser:
+    """تحويل صف /ip/hotspot/user إلى HotspotUser"""
+    return HotspotUser(
+        name=user.get('name', ''),
+        password=user.get('password', ''),
+        profile=user.get('profile', 'default'),
+        server=user.get('server', 'all'),
+        disabled=user.get('disabled') == 'true',
+        comment=user.get('comment', ''),
+        limit_uptime=user.get('limit-uptime', ''),
+        limit_bytes_in=user.get('limit-bytes-in', ''),
+        limit_bytes_out=user.get('limit-bytes-out', ''),
+        limit_bytes_total=user.get('limit-bytes-total', ''),
+        extra=_extra_values(user, extra_fields)
+    )
+
+_DURATION_UNITS = {'w': 604800, 'd': 86400, 'h': 3600, 'm': 60, 's': 1}
+
+def parse_duration(text: str) -> int:
+    """تحويل مدة RouterOS (مثل 1w2d3h4m5s أو 01:02:03) إلى ثوانٍ"""
+    if not text:
+        return 0
+    if ':' in text:
+        seconds = 0
+        for part in text.split(':'):
+            seconds = seconds * 60 + _to_int(part)
+        return seconds
+    return sum(int(value) * _DURATION_UNITS[unit] for value, unit in re.findall(r'(\d+)([wdhms])', text))
+
+_SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3, 't': 1024 ** 4}
+
+def parse_size(text: str) -> int:
+    """تحويل حجم RouterOS (مثل 2048M أو 2G أو 1073741824) إلى بايتات"""
+    match = re.fullmatch(r'\s*(\d+)\s*([kmgt]?)i?b?\s*', (text or '').lower())
+    if not match:
+        return 0
+    return int(match.group(1)) * _SIZE_UNITS[match.group(2)]
+
+def _to_int(value, default: int = 0) -> int:
+    """تحويل قيمة نصية من الراوتر إلى رقم صحيح"""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
 class MikroTikAPIClient:
     """عميل API للتفاعل مع الميكروتك"""
     
-    def __init__(self, device: MikroTikDevice):
+    def __init__(self, device: MikroTikDevice, backend: str = None):
         self.device = device
+        # 'routeros_api' (المكتبة الخارجية) أو 'native' (routeros_protocol)
+        self.backend = backend or MIKROTIK_API_BACKEND
         self.connection = None
         self.api = None
+        # قراءات المسارات قليلة التغير تُخزن لمدة محددة لكل مسار
+        self.cache = RouterCache(MIKROTIK_CACHE_TTL, MIKROTIK_CACHE_MAX_ENTRIES)
         
     def connect(self) -> bool:
         """الاتصال بجهاز الميكروتك"""
         try:
-            self.connection = routeros_api.RouterOsApiPool(
+            pool_class = NativeRouterOsApiPool if self.backend == 'native' else routeros_api.RouterOsApiPool
+            self.connection = pool_class(
                 host=self.device.ip,
                 username=self.device.username,
                 password=self.device.password,
@@ -54,13 +169,118 @@ class MikroTikAPIClient:
     def disconnect(self):
         """قطع الاتصال"""
         if self.connection:
-            self.connection.disconnect()
-            self.connection = None
-            self.api = None
+            try:
+                self.connection.disconnect()
+            except Exception as e:
+                logger.warning(f"خطأ أثناء قطع الاتصال بـ {self.device}: {e}")
+        self.connection = None
+        self.api = None
+    
+    def reconnect(self) -> bool:
+        """إعادة الاتصال بعد انقطاعه"""
+        self.disconnect()
+        return self.connect()
     
     def is_connected(self) -> bool:
         """فحص حالة الاتصال"""
-        return self.api is not None
+        # المكتبة تضع connected=False عند أخطاء المقبس
+        return self.api is not None and getattr(self.connection, 'connected', True)
+    
+    def check_connection(self) -> bool:
+        """فحص فعلي للاتصال بإرسال أمر خفيف (keepalive)"""
+        if not self.is_connected():
+            return False
+        
+        try:
+            self.api.get_resource('/system/identity').get()
+            return True
+        except Exception as e:
+            logger.warning(f"انقطع الاتصال بـ {self.device}: {e}")
+            self.disconnect()
+            return False
+    
+    def fetch_many(self, *paths: str, arguments: Dict[str, Dict[str, str]] = None) -> List[List[Dict[str, Any]]]:
+        """إرسال عدة أوامر print موسومة دفعة واحدة وجمع الردود معاً
+        
+        تُرسل جميع الأوامر قبل انتظار أي رد، فتكلف الدفعة زمن رحلة واحد
+        بدلاً من رحلة لكل مسار. النتائج بنفس ترتيب المسارات.
+        المسارات المخزنة في الذاكرة المؤقتة لا تُطلب من الراوتر.
+        """
+        arguments = arguments or {}
+        results: List[Any] = [None] * len(paths)
+        waiting = []
+        loading = []
+        
+        for index, path in enumerate(paths):
+            if not self.cache.cacheable(path):
+                loading.append((index, path, None, None))
+                continue
+            key = make_key(path, arguments.get(path))
+            future, leader = self.cache.claim(key)
+            if leader:
+                loading.append((index, path, key, future))
+            else:
+                waiting.append((index, future))
+        
+        # إرسال جميع الأوامر أولاً (كل أمر بوسم .tag خاص به)
+        promises = [
+            self.api.get_resource(path).call_async('print', arguments.get(path, {}))
+            for _, path, _, _ in loading
+        ]
+        
+        # جمع جميع الردود حتى عند فشل أحدها حتى لا تبقى ردود معلقة في المقبس
+        first_error = None
+        for (index, path, key, future), promise in zip(loading, promises):
+            try:
+                results[index] = list(promise.get())
+                if key is not None:
+                    self.cache.fill(key, future, results[index])
+            except Exception as e:
+                logger.warning(f"فشل الأمر {path} ضمن الدفعة: {e}")
+                results[index] = []
+                first_error = first_error or e
+                if key is not None:
+                    self.cache.fail(key, future, e)
+        
+        # مسارات يحمّلها طلب آخر في نفس اللحظة
+        for index, future in waiting:
+            try:
+                results[index] = future.result()
+            except Exception as e:
+                results[index] = []
+                first_error = first_error or e
+        
+        if first_error:
+            raise first_error
+        return results
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """عدادات الذاكرة المؤقتة (الإصابة والإخفاق)"""
+        return self.cache.stats()
+    
+    def _parse_system_info(self, resource: Dict[str, Any]) -> SystemInfo:
+        """تحويل بيانات /system/resource إلى SystemInfo"""
+        cpu_load = float(resource.get('cpu-load', '0').replace('%', ''))
+        voltage = float(resource.get('voltage', '0').replace('V', ''))
+        temperature = int(resource.get('cpu-temperature', '0').replace('C', ''))
+        
+        # تحويل الذاكرة من bytes إلى MB
+        total_memory = int(resource.get('total-memory', '0'))
+        free_memory = int(resource.get('free-memory', '0'))
+        
+        return SystemInfo(
+            cpu_load=cpu_load,
+            voltage=voltage,
+            temperature=temperature,
+            uptime=resource.get('uptime', ''),
+            memory_usage=((total_memory - free_memory) / total_memory * 100) if total_memory > 0 else 0,
+            memory_total=total_memory,
+            memory_free=free_memory,
+            board_name=resource.get('board-name', ''),
+            version=resource.get('version', ''),
+            architecture=resource.get('architecture-name', ''),
+            build_time=resource.get('build-time', '')
+        )
     
     def get_system_info(self) -> Optional[SystemInfo]:
         """الحصول على معلومات النظام"""
@@ -68,164 +288,204 @@ class MikroTikAPIClient:
             return None
         
         try:
-            # معلومات الموارد
-            resource = self.api.get_resource('/system/resource').get()[0]
-            
-            # معلومات الهوية
-            identity = self.api.get_resource('/system/identity').get()[0]
-            
-            # معلومات الإصدار
-            version_info = self.api.get_resource('/system/routerboard').get()[0]
-            
-            # تحويل البيانات
-            cpu_load = float(resource.get('cpu-load', '0').replace('%', ''))
-            voltage = float(resource.get('voltage', '0').replace('V', ''))
-            temperature = int(resource.get('cpu-temperature', '0').replace('C', ''))
-            
-            # تحويل الذاكرة من bytes إلى MB
-            total_memory = int(resource.get('total-memory', '0'))
-            free_memory = int(resource.get('free-memory', '0'))
-            
-            return SystemInfo(
-                cpu_load=cpu_load,
-                voltage=voltage,
-                temperature=temperature,
-                uptime=resource.get('uptime', ''),
-                memory_usage=((total_memory - free_memory) / total_memory * 100) if total_memory > 0 else 0,
-                memory_total=total_memory,
-                memory_free=free_memory,
-                board_name=resource.get('board-name', ''),
-                version=resource.get('version', ''),
-                architecture=resource.get('architecture-name', ''),
-                build_time=resource.get('build-time', '')
+            # الموارد والهوية والإصدار في دفعة واحدة
+            resource, identity, version_info = self.fetch_many(
+                '/system/resource', '/system/identity', '/system/routerboard'
             )
             
+            return self._parse_system_info(resource[0])
+            
         except Exception as e:
             logger.error(f"خطأ في الحصول على معلومات النظام: {e}")
             return None
     
-    def get_interfaces(self) -> List[NetworkInterface]:
-        """الحصول على قائمة الواجهات"""
+    def _parse_interfaces(self, interfaces: List[Dict[str, Any]],
+                          rates: Dict[str, Dict[str, Any]] = None,
+                          extra_fields: Sequence[str] = ()) -> List[NetworkInterface]:
+        """تحويل بيانات /interface print stats إلى NetworkInterface"""
+        rates = rates or {}
+        result = []
+        
+        for iface in interfaces:
+            rate = rates.get(iface.get('name'), {})
+            
+            result.append(NetworkInterface(
+                name=iface.get('name', ''),
+                type=iface.get('type', ''),
+                running=iface.get('running') == 'true',
+                disabled=iface.get('disabled') == 'true',
+                rx_bytes=_to_int(iface.get('rx-byte')),
+                tx_bytes=_to_int(iface.get('tx-byte')),
+                rx_packets=_to_int(iface.get('rx-packet')),
+                tx_packets=_to_int(iface.get('tx-packet')),
+                rx_errors=_to_int(iface.get('rx-error')),
+                tx_errors=_to_int(iface.get('tx-error')),
+                rx_bits_per_second=_to_int(rate.get('rx-bits-per-second')),
+                tx_bits_per_second=_to_int(rate.get('tx-bits-per-second')),
+                extra=_extra_values(iface, extra_fields)
+            ))
+        
+        return result
+    
+    def get_interfaces(self, extra_fields: Sequence[str] = ()) -> List[NetworkInterface]:
+        """الحصول على قائمة الواجهات (extra_fields: أعمدة إضافية تُحفظ في extra)"""
         if not self.is_connected():
             return []
         
         try:
-            interfaces = self.api.get_resource('/interface').get()
-            result = []
+            resource = self.api.get_resource('/interface')
             
-            for iface in interfaces:
-                # الحصول على إحصائيات الواجهة
+            # عدادات جميع الواجهات في طلب واحد
+            arguments = {'stats': '', **_proplist(INTERFACE_FIELDS, extra_fields)}
+            interfaces = self.cache.get_or_load(
+                make_key('/interface', arguments), lambda: list(resource.call('print', arguments))
+            )
+            
+            # عينة معدل واحدة لجميع الواجهات العاملة بدلاً من طلب لكل واجهة
+            running = [iface['name'] for iface in interfaces if iface.get('running') == 'true']
+            rates = {}
+            if running:
                 try:
-                    stats = self.api.get_resource('/interface').call('monitor-traffic', {
-                        'interface': iface['name'],
-                        'duration': '1'
-                    })[0]
-                except:
-                    stats = {}
-                
-                result.append(NetworkInterface(
-                    name=iface.get('name', ''),
-                    type=iface.get('type', ''),
-                    running=iface.get('running') == 'true',
-                    disabled=iface.get('disabled') == 'true',
-                    rx_bytes=int(stats.get('rx-bytes', 0)),
-                    tx_bytes=int(stats.get('tx-bytes', 0)),
-                    rx_packets=int(stats.get('rx-packets', 0)),
-                    tx_packets=int(stats.get('tx-packets', 0)),
-                    rx_errors=int(stats.get('rx-errors', 0)),
-                    tx_errors=int(stats.get('tx-errors', 0))
-                ))
+                    samples = resource.call('monitor-traffic', {
+                        'interface': ','.join(running),
+                        'once': '',
+                        **_proplist(INTERFACE_RATE_FIELDS)
+                    })
+                    rates = {sample.get('name'): sample for sample in samples}
+                except Exception as e:
+                    logger.warning(f"تعذر قياس معدل الواجهات: {e}")
             
-            return result
+            return self._parse_interfaces(interfaces, rates, extra_fields)
             
         except Exception as e:
             logger.error(f"خطأ في الحصول على الواجهات: {e}")
             return []
     
-    def get_hotspot_active_users(self) -> List[HotspotUser]:
-        """الحصول على المستخدمين النشطين في الهوتسبوت"""
+    def query(self, path: str, fields: Sequence[str] = (), where: Dict[str, Any] = None,
+              prefixes: Dict[str, str] = None, any_of: Dict[str, Sequence[str]] = None) -> List[Dict[str, Any]]:
+        """
+        تنفيذ print مع شروط تُقيَّم على الراوتر نفسه
+        
+        where: مساواة (القيم المنطقية تتحول إلى true/false)
+        prefixes: مطابقة بداية القيمة
+        any_of: مطابقة أي قيمة من قائمة
+        fields: الأعمدة المطلوبة (.proplist)، جميع الأعمدة إذا كانت فارغة
+        """
+        filters = []
+        for key, value in (where or {}).items():
+            if isinstance(value, bool):
+                value = 'true' if value else 'false'
+            filters.append(IsEqualQuery(key, str(value)))
+        for key, prefix in (prefixes or {}).items():
+            filters.append(_prefix_query(key, prefix))
+        for key, values in (any_of or {}).items():
+            filters.append(_any_of_query(key, values))
+        
+        arguments = _proplist(fields) if fields else {}
+        return self.api.get_resource(path).call('print', arguments, additional_queries=filters)
+    
+    def get_hotspot_active_users(self, extra_fields: Sequence[str] = ()) -> List[HotspotUser]:
+        """الحصول على المستخدمين النشطين في الهوتسبوت (extra_fields: أعمدة إضافية تُحفظ في extra)"""
+        return self.find_hotspot_active_users(extra_fields=extra_fields)
+    
+    def find_hotspot_active_users(self, users: Sequence[str] = None, extra_fields: Sequence[str] = (),
+                                  strict: bool = False) -> Optional[List[HotspotUser]]:
+        """الجلسات النشطة، مقتصرة على أسماء المستخدمين المحددة في users إن وُجدت (strict كما في find_hotspot_users)"""
         if not self.is_connected():
+            return None if strict else []
+        if users is not None and not users:
             return []
         
         try:
-            active_users = self.api.get_resource('/ip/hotspot/active').get()
-            result = []
-            
-            for user in active_users:
-                result.append(HotspotUser(
-                    name=user.get('user', ''),
-                    password='',  # لا يتم عرض كلمة المرور في الجلسات النشطة
-                    profile=user.get('server', ''),
-                    ip_address=user.get('address', ''),
-                    mac_address=user.get('mac-address', ''),
-                    uptime=user.get('uptime', ''),
-                    bytes_in=int(user.get('bytes-in', 0)),
-                    bytes_out=int(user.get('bytes-out', 0)),
-                    packets_in=int(user.get('packets-in', 0)),
-                    packets_out=int(user.get('packets-out', 0))
-                ))
-            
-            return result
+            active_users = self.query(
+                '/ip/hotspot/active', [*HOTSPOT_ACTIVE_FIELDS, *extra_fields],
+                any_of={'user': users} if users else None
+            )
+            return [parse_active_user(user, extra_fields) for user in active_users]
             
         except Exception as e:
             logger.error(f"خطأ في الحصول على المستخدمين النشطين: {e}")
-            return []
+            return None if strict else []
+    
+    def get_hotspot_users(self, extra_fields: Sequence[str] = ()) -> List[HotspotUser]:
+        """الحصول على جميع مستخدمي الهوتسبوت (extra_fields: أعمدة إضافية تُحفظ في extra)"""
+        return self.find_hotspot_users(extra_fields=extra_fields)
     
-    def get_hotspot_users(self) -> List[HotspotUser]:
-        """الحصول على جميع مستخدمي الهوتسبوت"""
+    def find_hotspot_users(self, name: str = None, name_prefix: str = None, profile: str = None,
+                           disabled: bool = None, extra_fields: Sequence[str] = (),
+                           names: Sequence[str] = None, strict: bool = False) -> Optional[List[HotspotUser]]:
+        """
+        البحث عن مستخدمي الهوتسبوت بشروط تُنفذ على الراوتر (names: أي اسم من القائمة)
+        
+        strict: يُعاد None بدلاً من القائمة الفارغة عند تعذر القراءة، ليُميز الخطأ عن عدم وجود نتائج.
+        """
         if not self.is_connected():
+            return None if strict else []
+        if names is not None and not names:
             return []
         
+        where = {key: value for key, value in
+                 (('name', name), ('profile', profile), ('disabled', disabled)) if value is not None}
+        
         try:
-            users = self.api.get_resource('/ip/hotspot/user').get()
-            result = []
-            
-            for user in users:
-                result.append(HotspotUser(
-                    name=user.get('name', ''),
-                    password=user.get('password', ''),
-                    profile=user.get('profile', 'default'),
-                    server=user.get('server', 'all'),
-                    disabled=user.get('disabled') == 'true',
-                    comment=user.get('comment', ''),
-                    limit_uptime=user.get('limit-uptime', ''),
-                    limit_bytes_in=user.get('limit-bytes-in', ''),
-                    limit_bytes_out=user.get('limit-bytes-out', ''),
-                    limit_bytes_total=user.get('limit-bytes-total', '')
-                ))
-            
-            return result
+            users = self.query(
+                '/ip/hotspot/user', [*HOTSPOT_USER_FIELDS, *extra_fields],
+                where=where, prefixes={'name': name_prefix} if name_prefix else None,
+                any_of={'name': names} if names else None
+            )
+            return [parse_hotspot_user(user, extra_fields) for user in users]
             
         except Exception as e:
             logger.error(f"خطأ في الحصول على مستخدمي الهوتسبوت: {e}")
+            return None if strict else []
+    
+    def get_hotspot_profiles(self) -> List[str]:
+        """أسماء بروفايلات مستخدمي الهوتسبوت"""
+        if not self.is_connected():
+            return []
+        
+        try:
+            arguments = _proplist(('name',))
+            profiles = self.cache.get_or_load(
+                make_key('/ip/hotspot/user/profile', arguments),
+                lambda: list(self.api.get_resource('/ip/hotspot/user/profile').call('print', arguments))
+            )
+            return [profile.get('name', '') for profile in profiles]
+            
+        except Exception as e:
+            logger.error(f"خطأ في الحصول على بروفايلات الهوتسبوت: {e}")
             return []
     
+    def _hotspot_user_data(self, user: HotspotUser) -> Dict[str, str]:
+        """وسائط أمر add لمستخدم هوتسبوت"""
+        user_data = {
+            'name': user.name,
+            'password': user.password,
+            'profile': user.profile,
+            'server': user.server,
+            'disabled': 'yes' if user.disabled else 'no',
+            'comment': user.comment
+        }
+        
+        # إضافة القيود إذا كانت محددة
+        if user.limit_uptime:
+            user_data['limit-uptime'] = user.limit_uptime
+        if user.limit_bytes_in:
+            user_data['limit-bytes-in'] = user.limit_bytes_in
+        if user.limit_bytes_out:
+            user_data['limit-bytes-out'] = user.limit_bytes_out
+        if user.limit_bytes_total:
+            user_data['limit-bytes-total'] = user.limit_bytes_total
+        
+        return user_data
+    
     def add_hotspot_user(self, user: HotspotUser) -> bool:
         """إضافة مستخدم هوتسبوت جديد"""
         if not self.is_connected():
             return False
         
         try:
-            user_data = {
-                'name': user.name,
-                'password': user.password,
-                'profile': user.profile,
-                'server': user.server,
-                'disabled': 'yes' if user.disabled else 'no',
-                'comment': user.comment
-            }
-            
-            # إضافة القيود إذا كانت محددة
-            if user.limit_uptime:
-                user_data['limit-uptime'] = user.limit_uptime
-            if user.limit_bytes_in:
-                user_data['limit-bytes-in'] = user.limit_bytes_in
-            if user.limit_bytes_out:
-                user_data['limit-bytes-out'] = user.limit_bytes_out
-            if user.limit_bytes_total:
-                user_data['limit-bytes-total'] = user.limit_bytes_total
-            
-            self.api.get_resource('/ip/hotspot/user').add(**user_data)
+            self.api.get_resource('/ip/hotspot/user').add(**self._hotspot_user_data(user))
             logger.info(f"تم إضافة المستخدم {user.name} بنجاح")
             return True
             
@@ -233,16 +493,160 @@ class MikroTikAPIClient:
             logger.error(f"خطأ في إضافة المستخدم {user.name}: {e}")
             return False
     
+    def add_hotspot_users(self, users: List[HotspotUser], window: int = MIKROTIK_BULK_WINDOW,
+                          progress: Optional[Callable[[int, int], None]] = None,
+                          retries: int = MIKROTIK_BULK_RETRIES) -> BulkAddResult:
+        """
+        إضافة عدد كبير من المستخدمين بأوامر add متتالية دون انتظار كل رد
+        
+        يبقى حتى window أمر معلق على الاتصال في نفس الوقت. تُجمع أخطاء كل
+        مستخدم على حدة، ثم يُعاد إرسال الفاشلة فقط (عدا المكررة) حتى retries مرة.
+        progress(المنجز، الإجمالي) تُستدعى من خيط الراوتر أثناء الجولة الأولى.
+        """
+        result = BulkAddResult()
+        if not self.is_connected():
+            result.failed = {user.name: 'غير متصل' for user in users}
+            return result
+        
+        items = [(user.name, self._hotspot_user_data(user)) for user in users]
+        self._run_pipelined('/ip/hotspot/user', 'add', items, window, progress, result)
+        
+        for _ in range(retries):
+            pending = [(name, arguments) for name, arguments in items
+                       if name in result.failed and 'already have' not in result.failed[name]]
+            if not pending:
+                break
+            if not self.check_connection() and not self.reconnect():
+                break
+            logger.info(f"إعادة محاولة إضافة {len(pending)} مستخدم على {self.device}")
+            for name, _ in pending:
+                del result.failed[name]
+            # بعد انقطاع سابق قد يكون الأمر نُفذ ولم يصل رده
+            self._run_pipelined('/ip/hotspot/user', 'add', pending, window, result=result,
+                                accept_error=lambda error: 'already have' in str(error))
+        
+        logger.info(f"إضافة جماعية على {self.device}: {result.success_count} نجح، {result.failed_count} فشل")
+        return result
+    
+    def _run_pipelined(self, path: str, command: str, items: List[tuple], window: int = MIKROTIK_BULK_WINDOW,
+                       progress: Optional[Callable[[int, int], None]] = None, result: BulkAddResult = None,
+                       accept_error: Optional[Callable[[Exception], bool]] = None) -> BulkAddResult:
+        """
+        تنفيذ نفس الأمر على عدة عناصر بأوامر متتالية مع نافذة محدودة
+        
+        items: قائمة (المفتاح في النتيجة، وسائط الأمر). result: نتيجة سابقة تُضاف إليها،
+        وaccept_error: خطأ يُعد نجاحاً إذا أعادت True. لا تُعاد المحاولة هنا لأن أوامر
+        set وremove ليست آمنة للتكرار دائماً؛ المستدعي يقرر ذلك.
+        """
+        if result is None:
+            result = BulkAddResult()
+        if not self.is_connected():
+            result.failed.update({key: 'غير متصل' for key, _ in items})
+            return result
+        
+        resource = self.api.get_resource(path)
+        in_flight = deque()
+        settled = 0
+        
+        def settle():
+            nonlocal settled
+            key, promise = in_flight.popleft()
+            try:
+                promise.get()
+                result.added.append(key)
+            except Exception as e:
+                if accept_error and accept_error(e):
+                    result.added.append(key)
+                else:
+                    result.failed[key] = str(e)
+            settled += 1
+            if progress:
+                progress(settled, len(items))
+        
+        sent = 0
+        try:
+            for key, arguments in items:
+                if len(in_flight) >= window:
+                    settle()
+                in_flight.append((key, resource.call_async(command, arguments)))
+                sent += 1
+            while in_flight:
+                settle()
+        except Exception as e:
+            # فشل الإرسال يعني مقبساً معطلاً: ما تبقى يُعد فاشلاً
+            logger.error(f"انقطع تنفيذ {path}/{command} الجماعي على {self.device}: {e}")
+            for key, _ in list(in_flight) + items[sent:]:
+                result.failed[key] = str(e)
+        
+        return result
+    
+    def update_hotspot_users(self, changes: Dict[str, Dict[str, str]],
+                             progress: Optional[Callable[[int, int], None]] = None) -> BulkAddResult:
+        """
+        تعديل عدة مستخدمين بأوامر set متتالية
+        
+        changes: اسم المستخدم -> القيم الجديدة، ويجب أن تحتوي على 'id' (معرف الصف)
+        """
+        return self._run_pipelined('/ip/hotspot/user', 'set', list(changes.items()), progress=progress)
+    
+    def select_hotspot_users(self, selector: UserSelector) -> List[HotspotUser]:
+        """
+        مستخدمو الهوتسبوت المطابقون للشروط مع معرف الصف والاستهلاك في extra
+        
+        البروفايل والتعطيل وبداية الاسم تُطابق على الراوتر، وبقية الشروط محلياً.
+        """
+        users = self.find_hotspot_users(
+            name_prefix=selector.name_prefix, profile=selector.profile,
+            disabled=selector.disabled, extra_fields=('.id', 'bytes-in', 'bytes-out')
+        )
+        return [user for user in users
+                if selector.matches(user, _to_int(user.extra.get('bytes-in')) + _to_int(user.extra.get('bytes-out')))]
+    
+    def select_hotspot_sessions(self, selector: UserSelector) -> List[HotspotUser]:
+        """الجلسات النشطة المطابقة للشروط (الاستهلاك هو استهلاك الجلسة نفسها)"""
+        names = None
+        if selector.needs_user_record:
+            # البروفايل والتعليق والتعطيل موجودة في سجل المستخدم فقط
+            user_selector = UserSelector(selector.profile, selector.comment_prefix,
+                                         selector.name_pattern, disabled=selector.disabled)
+            names = [user.name for user in self.select_hotspot_users(user_selector)]
+            if not names:
+                return []
+        
+        sessions = self.find_hotspot_active_users(names, extra_fields=('.id',))
+        return [session for session in sessions
+                if (not selector.name_pattern or fnmatchcase(session.name, selector.name_pattern))
+                and (selector.min_bytes is None or session.total_bytes_used >= selector.min_bytes)]
+    
+    def set_hotspot_users_disabled(self, users: List[HotspotUser], disabled: bool,
+                                   progress: Optional[Callable[[int, int], None]] = None) -> BulkAddResult:
+        """تعطيل أو تفعيل عدة مستخدمين (يجب أن يحتوي extra على id من select_hotspot_users)"""
+        value = 'yes' if disabled else 'no'
+        items = [(user.name, {'id': user.extra['id'], 'disabled': value}) for user in users]
+        return self._run_pipelined('/ip/hotspot/user', 'set', items, progress=progress)
+    
+    def remove_hotspot_users(self, users: List[HotspotUser],
+                             progress: Optional[Callable[[int, int], None]] = None) -> BulkAddResult:
+        """حذف عدة مستخدمين (يجب أن يحتوي extra على id)"""
+        items = [(user.name, {'id': user.extra['id']}) for user in users]
+        return self._run_pipelined('/ip/hotspot/user', 'remove', items, progress=progress)
+    
+    def remove_hotspot_sessions(self, sessions: List[HotspotUser],
+                                progress: Optional[Callable[[int, int], None]] = None) -> BulkAddResult:
+        """قطع عدة جلسات نشطة (يجب أن يحتوي extra على id من select_hotspot_sessions)"""
+        items = [(session_key(session), {'id': session.extra['id']}) for session in sessions]
+        return self._run_pipelined('/ip/hotspot/active', 'remove', items, progress=progress)
+    
     def remove_hotspot_user(self, username: str) -> bool:
         """حذف مستخدم هوتسبوت"""
         if not self.is_connected():
             return False
         
         try:
-            users = self.api.get_resource('/ip/hotspot/user').get(name=username)
+            users = self.query('/ip/hotspot/user', ('.id',), where={'name': username})
             if users:
                 user_id = users[0]['id']
-                self.api.get_resource('/ip/hotspot/user').remove(user_id)
+                self.api.get_resource('/ip/hotspot/user').remove(id=user_id)
                 logger.info(f"تم حذف المستخدم {username} بنجاح")
                 return True
             else:
@@ -377,6 +781,8 @@ class MikroTikAPIClient:
         
         try:
             self.api.get_resource('/system').call('reboot')
+            # كل القيم المخزنة تتغير بعد إعادة التشغيل
+            self.cache.clear()
             logger.info("تم إرسال أمر إعادة التشغيل")
             return True
             
@@ -390,12 +796,18 @@ class MikroTikAPIClient:
             return None
         
         try:
-            system_info = self.get_system_info()
-            interfaces = self.get_interfaces()
+            # الموارد والواجهات في دفعة واحدة (لا حاجة لعينة المعدل هنا)
+            resource, interface_rows = self.fetch_many(
+                '/system/resource', '/interface',
+                arguments={'/interface': {'stats': '', **_proplist(INTERFACE_FIELDS)}}
+            )
             
-            if not system_info:
+            if not resource:
                 return None
             
+            system_info = self._parse_system_info(resource[0])
+            interfaces = self._parse_interfaces(interface_rows)
+            
             # فحص المعالج
             if system_info.cpu_load >= 80:
                 cpu_status = DiagnosticResult("CPU", "error", f"استخدام عالي للمعالج: {system_info.cpu_load}%")
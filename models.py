@@ -2,8 +2,9 @@
 نماذج البيانات لبوت تليجرام الميكروتك
 """
 
-from dataclasses import dataclass
-from typing import Optional, List
+from dataclasses import dataclass, field
+from fnmatch import fnmatchcase
+from typing import Optional, List, Dict
 from datetime import datetime
 
 @dataclass
@@ -52,6 +53,10 @@ class NetworkInterface:
     tx_packets: int
     rx_errors: int
     tx_errors: int
+    rx_bits_per_second: int = 0
+    tx_bits_per_second: int = 0
+    # أعمدة إضافية طُلبت صراحةً عبر extra_fields
+    extra: Dict[str, str] = field(default_factory=dict)
     
     @property
     def rx_mb(self) -> float:
@@ -84,30 +89,165 @@ class HotspotUser:
     packets_in: Optional[int] = None
     packets_out: Optional[int] = None
     
+    # أعمدة إضافية طُلبت صراحةً عبر extra_fields
+    extra: Dict[str, str] = field(default_factory=dict)
+    
     @property
     def is_active(self) -> bool:
         return self.ip_address is not None
     
     @property
     def total_bytes_used(self) -> int:
-        if self.bytes_in and self.bytes_out:
-            return self.bytes_in + self.bytes_out
-        return 0
+        return (self.bytes_in or 0) + (self.bytes_out or 0)
+
+def format_data_quota(quota_bytes: int) -> str:
+    """تنسيق حصة البيانات للعرض (0 يعني بلا حد)"""
+    if not quota_bytes:
+        return "غير محدود"
+    elif quota_bytes < 1024 ** 3:
+        return f"{quota_bytes / 1024 ** 2:g} MB"
+    else:
+        return f"{quota_bytes / 1024 ** 3:.1f} GB"
+
+def format_time_quota(quota_seconds: int) -> str:
+    """تنسيق حصة الوقت للعرض (0 يعني بلا حد)"""
+    if not quota_seconds:
+        return "غير محدود"
+    hours = quota_seconds // 3600
+    if hours < 24:
+        return f"{quota_seconds / 3600:g} ساعة"
+    days, hours = divmod(hours, 24)
+    if hours == 0:
+        return f"{days} يوم"
+    return f"{days} يوم و {hours} ساعة"
 
 @dataclass
 class HotspotCard:
-    """كرت هوتسبوت"""
+    """كرت هوتسبوت (الحصص بالبايت والثانية، و0 يعني بلا حد)"""
     username: str
     password: str
     profile: str
-    data_quota: str
-    time_quota: str
+    data_quota_bytes: int
+    time_quota_seconds: int
     validity_days: int
     created_at: datetime = None
     
     def __post_init__(self):
         if self.created_at is None:
             self.created_at = datetime.now()
+    
+    @property
+    def data_quota(self) -> str:
+        return format_data_quota(self.data_quota_bytes)
+    
+    @property
+    def time_quota(self) -> str:
+        return format_time_quota(self.time_quota_seconds)
+
+@dataclass
+class CardSeries:
+    """سلسلة كروت تُشتق بياناتها من مفتاح سري ورقم تسلسلي (لا تُحفظ الكروت نفسها)"""
+    secret: bytes
+    prefix: str
+    start: int
+    count: int
+    profile: str
+    data_quota_bytes: int
+    time_quota_seconds: int
+    validity_days: int
+    serial_width: int = 6
+    id: Optional[int] = None
+    created_at: datetime = None
+
+    def __post_init__(self):
+        if self.created_at is None:
+            self.created_at = datetime.now()
+
+    @property
+    def end(self) -> int:
+        """أول رقم تسلسلي بعد السلسلة"""
+        return self.start + self.count
+
+    def username(self, serial: int) -> str:
+        return f"{self.prefix}{serial:0{self.serial_width}d}"
+
+    def serial_of(self, username: str) -> Optional[int]:
+        """الرقم التسلسلي من اسم المستخدم، أو None إن لم يكن من السلسلة"""
+        suffix = username[len(self.prefix):]
+        if not username.startswith(self.prefix) or len(suffix) != self.serial_width or not suffix.isdigit():
+            return None
+        serial = int(suffix)
+        return serial if self.start <= serial < self.end else None
+
+@dataclass
+class BulkAddResult:
+    """نتيجة إضافة مجموعة مستخدمين دفعة واحدة"""
+    added: List[str] = field(default_factory=list)
+    failed: Dict[str, str] = field(default_factory=dict)  # اسم المستخدم -> سبب الفشل
+    
+    @property
+    def success_count(self) -> int:
+        return len(self.added)
+    
+    @property
+    def failed_count(self) -> int:
+        return len(self.failed)
+
+@dataclass
+class UserSelector:
+    """شروط اختيار مستخدمي الهوتسبوت أو جلساتهم للعمليات الجماعية (الشرط الفارغ لا يُطبق)"""
+    profile: Optional[str] = None
+    comment_prefix: Optional[str] = None
+    name_pattern: Optional[str] = None  # نمط مثل card* أو user-??
+    min_bytes: Optional[int] = None  # حد الاستهلاك (وارد + صادر)
+    disabled: Optional[bool] = None
+    
+    @property
+    def name_prefix(self) -> Optional[str]:
+        """الجزء الثابت في بداية النمط (يُطابق على الراوتر لتقليل النتائج)"""
+        if not self.name_pattern:
+            return None
+        prefix = self.name_pattern
+        for wildcard in '*?[':
+            prefix = prefix.split(wildcard, 1)[0]
+        return prefix or None
+    
+    @property
+    def needs_user_record(self) -> bool:
+        """هل تحتاج الشروط إلى سجل المستخدم (غير موجودة في الجلسة النشطة)"""
+        return bool(self.profile or self.comment_prefix or self.disabled is not None)
+    
+    def matches(self, user: HotspotUser, used_bytes: Optional[int] = None) -> bool:
+        """مطابقة مستخدم أو جلسة؛ شرط الاستهلاك يُطبق فقط عند تمرير used_bytes"""
+        if self.profile and user.profile != self.profile:
+            return False
+        if self.comment_prefix and not user.comment.startswith(self.comment_prefix):
+            return False
+        if self.name_pattern and not fnmatchcase(user.name, self.name_pattern):
+            return False
+        if self.disabled is not None and user.disabled != self.disabled:
+            return False
+        if self.min_bytes is not None and used_bytes is not None and used_bytes < self.min_bytes:
+            return False
+        return True
+
+@dataclass
+class ReconcileReport:
+    """الفروقات بين الكروت المحفوظة ومستخدمي الهوتسبوت على الراوتر"""
+    missing: List[HotspotUser] = field(default_factory=list)  # كروت غير موجودة على الراوتر
+    orphaned: List[HotspotUser] = field(default_factory=list)  # مستخدمون مولدون بلا كرت محفوظ
+    mismatched: Dict[str, Dict[str, str]] = field(default_factory=dict)  # اسم المستخدم -> القيم الصحيحة
+    in_sync: List[str] = field(default_factory=list)
+    added: BulkAddResult = field(default_factory=BulkAddResult)  # نتيجة إضافة الناقص
+    updated: BulkAddResult = field(default_factory=BulkAddResult)  # نتيجة تصحيح المختلف
+    
+    @property
+    def is_clean(self) -> bool:
+        return not (self.missing or self.orphaned or self.mismatched)
+    
+    @property
+    def failed_count(self) -> int:
+        return self.added.failed_count + self.updated.failed_count
 
 @dataclass
 class NetworkDevice:
@@ -10,7 +10,7 @@ import asyncio
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
-from mikrotik_api_client import MikroTikAPIClient
+from async_mikrotik_client import AsyncMikroTikClient
 from database import DatabaseManager
 from models import PingResult, TracerouteResult, NetworkDevice, SystemHealth
 
@@ -59,7 +59,7 @@ class NetworkTools:
         # تنفيذ اختبار Ping
         processing_msg = await update.message.reply_text(f"🏓 جاري اختبار Ping لـ {target}...")
         
-        ping_result = client.ping(target, count=4)
+        ping_result = await client.ping(target, count=4)
         
         if ping_result:
             # تنسيق النتيجة
@@ -147,7 +147,7 @@ class NetworkTools:
         # تنفيذ تتبع المسار
         processing_msg = await update.message.reply_text(f"🛤️ جاري تتبع المسار إلى {target}...")
         
-        traceroute_result = client.traceroute(target)
+        traceroute_result = await client.traceroute(target)
         
         if traceroute_result:
             # تنسيق النتيجة
@@ -213,9 +213,9 @@ class NetworkTools:
         await query.edit_message_text("🔍 جاري إجراء تشخيص شامل للشبكة...")
         
         # جمع معلومات شاملة
-        system_info = client.get_system_info()
-        interfaces = client.get_interfaces()
-        health = client.get_system_health()
+        system_info = await client.get_system_info()
+        interfaces = await client.get_interfaces()
+        health = await client.get_system_health()
         
         if not system_info or not health:
             await query.edit_message_text("❌ فشل في جمع معلومات التشخيص")
@@ -303,7 +303,7 @@ class NetworkTools:
         # الحصول على معلومات الواجهات
         await query.edit_message_text("🌐 جاري جمع معلومات الواجهات...")
         
-        interfaces = client.get_interfaces()
+        interfaces = await client.get_interfaces()
         
         if not interfaces:
             await query.edit_message_text("❌ فشل في الحصول على معلومات الواجهات")
@@ -387,7 +387,7 @@ class NetworkTools:
         results = []
         
         for server_ip, server_name in test_servers:
-            ping_result = client.ping(server_ip, count=3)
+            ping_result = await client.ping(server_ip, count=3)
             if ping_result and ping_result.packets_received > 0:
                 results.append({
                     'name': server_name,
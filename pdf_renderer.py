@@ -0,0 +1,105 @@
+"""
+رسم ملفات PDF للكروت في مجمع عمليات
+
+الرسم يستهلك المعالج فلا يُنفذ في خيط حلقة الأحداث: تُقسم الكروت إلى أجزاء
+بعدد صفحات كامل وتُرسم الأجزاء بالتوازي في مجمع عمليات على جميع الأنوية، ثم
+تُدمج الأجزاء بمكتبة pypdf (إن لم تكن مثبتة يُرسم الملف كاملاً في عملية
+واحدة). عدد الملفات التي تُرسم في نفس الوقت محدود، فينتظر باقي المشغلين دورهم
+بدلاً من إشغال جميع الأنوية.
+"""
+
+import asyncio
+import io
+import logging
+import multiprocessing
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import BinaryIO, List, Optional
+
+from card_generator import HotspotCardGenerator
+from config import PDF_RENDER_WORKERS, PDF_RENDER_MAX_PENDING, PDF_RENDER_PAGES_PER_PART, PDF_SPOOL_MAX_SIZE
+from models import HotspotCard
+
+try:
+    from pypdf import PdfWriter
+except ImportError:
+    PdfWriter = None
+
+logger = logging.getLogger(__name__)
+
+# مولد واحد لكل عملية رسم (تهيئة الأنماط والخطوط مرة واحدة)
+_worker_generator: Optional[HotspotCardGenerator] = None
+
+
+def _render_part(cards: List[HotspotCard], first_index: int, total_cards: int, version: int) -> bytes:
+    """رسم جزء من الدفعة داخل عملية الرسم"""
+    global _worker_generator
+    if _worker_generator is None:
+        _worker_generator = HotspotCardGenerator()
+    output = io.BytesIO()
+    _worker_generator.render_cards_pdf(cards, output, first_index=first_index, total_cards=total_cards,
+                                       version=version)
+    return output.getvalue()
+
+
+def merge_parts(parts: List[bytes]) -> BinaryIO:
+    """دمج أجزاء PDF بالترتيب في ملف مؤقت مع إعادة المؤشر إلى البداية"""
+    output = tempfile.SpooledTemporaryFile(max_size=PDF_SPOOL_MAX_SIZE)
+    if len(parts) == 1:
+        output.write(parts[0])
+    else:
+        writer = PdfWriter()
+        for part in parts:
+            writer.append(io.BytesIO(part))
+        writer.write(output)
+    output.seek(0)
+    return output
+
+
+class PdfRenderService:
+    """رسم ملفات PDF للكروت خارج حلقة الأحداث مع حد لعدد الملفات المتزامنة"""
+
+    def __init__(self, workers: int = PDF_RENDER_WORKERS, max_pending: int = PDF_RENDER_MAX_PENDING,
+                 pages_per_part: int = PDF_RENDER_PAGES_PER_PART):
+        self.workers = workers or os.cpu_count() or 1
+        self._generator = HotspotCardGenerator()
+        self.cards_per_part = pages_per_part * self._generator.cards_per_page()
+        self._slots = asyncio.Semaphore(max_pending)
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        # spawn: البوت يستخدم خيوطاً (منفذات الراوترات) فلا يُنسخ بـ fork
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def split(self, cards: List[HotspotCard]) -> List[int]:
+        """بدايات الأجزاء التي تُرسم كل منها في عملية مستقلة"""
+        if PdfWriter is None or len(cards) <= self.cards_per_part:
+            return [0]
+        return list(range(0, len(cards), self.cards_per_part))
+
+    async def render(self, cards: List[HotspotCard]) -> BinaryIO:
+        """رسم ملف PDF للكروت؛ يُعاد ملف مؤقت مؤشره في البداية"""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            executor = self._get_executor()
+            starts = self.split(cards)
+            ends = starts[1:] + [len(cards)]
+            # إصدار QR واحد للدفعة كاملة وليس لكل جزء
+            version = await asyncio.to_thread(self._generator.batch_qr_version, cards)
+            parts = await asyncio.gather(*(
+                loop.run_in_executor(executor, _render_part, cards[start:end], start, len(cards), version)
+                for start, end in zip(starts, ends)
+            ))
+            if len(parts) > 1:
+                logger.info(f"تم رسم {len(cards)} كرت في {len(parts)} جزء")
+            return await asyncio.to_thread(merge_parts, parts)
+
+    def shutdown(self, wait: bool = False):
+        """إيقاف عمليات الرسم"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,146 @@
+"""
+ذاكرة تخزين مؤقت لقراءات الراوتر
+
+مدة صلاحية (TTL) لكل مسار، ودمج الطلبات المتزامنة لنفس المفتاح في طلب
+واحد (single-flight)، وحد أقصى لعدد العناصر مع إزالة الأقدم استخداماً،
+وإبطال المسار عند الكتابة عليه.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+CacheKey = Tuple[str, Hashable]
+
+_MISSING = object()
+
+
+def make_key(path: str, arguments: Optional[Dict[str, Any]] = None) -> CacheKey:
+    """مفتاح التخزين: المسار مع وسائط الأمر"""
+    return (path, tuple(sorted((arguments or {}).items())))
+
+
+class RouterCache:
+    """ذاكرة مؤقتة لراوتر واحد آمنة للاستخدام من عدة خيوط"""
+
+    def __init__(self, ttls: Dict[str, float], max_entries: int = 64):
+        self.ttls = dict(ttls)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries: 'OrderedDict[CacheKey, Tuple[float, Any]]' = OrderedDict()
+        self._inflight: Dict[CacheKey, Future] = {}
+        self._lock = threading.Lock()
+
+    def cacheable(self, path: str) -> bool:
+        """هل للمسار مدة صلاحية محددة"""
+        return self.ttls.get(path, 0) > 0
+
+    def get(self, key: CacheKey) -> Any:
+        """القيمة المخزنة إن كانت صالحة، وإلا _MISSING"""
+        with self._lock:
+            return self._get_locked(key)
+
+    def _get_locked(self, key: CacheKey) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def claim(self, key: CacheKey) -> Tuple[Future, bool]:
+        """
+        حجز تحميل المفتاح
+
+        يعيد (future, leader): القائد يحمّل القيمة ثم يستدعي fill أو fail،
+        والبقية ينتظرون future.result(). إذا كانت القيمة صالحة تُعاد في future جاهز.
+        """
+        with self._lock:
+            value = self._get_locked(key)
+            if value is not _MISSING:
+                self.hits += 1
+                future = Future()
+                future.set_result(value)
+                return future, False
+
+            future = self._inflight.get(key)
+            if future is not None:
+                # طلب مطابق قيد التنفيذ: ننتظر نتيجته بدلاً من طلب جديد
+                self.hits += 1
+                return future, False
+
+            self.misses += 1
+            future = Future()
+            self._inflight[key] = future
+            return future, True
+
+    def fill(self, key: CacheKey, future: Future, value: Any):
+        """تخزين القيمة التي حمّلها القائد وإيقاظ المنتظرين"""
+        with self._lock:
+            # لا نخزن نتيجة أُبطل مسارها أثناء تحميلها
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+                self._entries[key] = (time.monotonic() + self.ttls.get(key[0], 0), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+
+    def fail(self, key: CacheKey, future: Future, error: BaseException):
+        """إبلاغ المنتظرين بفشل التحميل دون تخزين شيء"""
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+        future.set_exception(error)
+
+    def get_or_load(self, key: CacheKey, loader: Callable[[], Any]) -> Any:
+        """قراءة عبر الذاكرة: تحميل القيمة مرة واحدة عند انتهاء صلاحيتها"""
+        if not self.cacheable(key[0]):
+            return loader()
+
+        future, leader = self.claim(key)
+        if not leader:
+            return future.result()
+
+        try:
+            value = loader()
+        except BaseException as e:
+            self.fail(key, future, e)
+            raise
+        self.fill(key, future, value)
+        return value
+
+    def invalidate(self, *paths: str):
+        """إبطال جميع القيم المخزنة للمسارات المحددة"""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in paths]:
+                del self._entries[key]
+            # التحميل الجاري لن يُخزن، لكن من ينتظره يحصل على نتيجته
+            for key in [key for key in self._inflight if key[0] in paths]:
+                del self._inflight[key]
+
+    def clear(self):
+        """إفراغ الذاكرة بالكامل"""
+        with self._lock:
+            self._entries.clear()
+            self._inflight.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """عدادات الإصابة والإخفاق"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'hit_rate': self.hits / total if total else 0.0,
+            }
+
+    def __len__(self) -> int:
+        return len(self._entries)
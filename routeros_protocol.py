@@ -0,0 +1,478 @@
+"""
+تنفيذ غير متزامن (asyncio) لبروتوكول RouterOS API
+
+يدعم ترميز الكلمات بطول مسبق، تسجيل الدخول، وتعدد الأوامر المتزامنة
+على مقبس واحد عبر الوسم .tag مع معالجة الردود !re و !done و !trap و !fatal.
+
+يحتوي أيضاً على محول متزامن (NativeRouterOsApiPool) بنفس واجهة
+routeros_api.RouterOsApiPool ليُستخدم كخلفية بديلة في MikroTikAPIClient.
+"""
+
+import asyncio
+import binascii
+import hashlib
+import logging
+import ssl
+import threading
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class RouterOsProtocolError(Exception):
+    """خطأ عام في بروتوكول RouterOS API"""
+
+
+class RouterOsTrapError(RouterOsProtocolError):
+    """رد !trap من الراوتر (فشل الأمر مع بقاء الاتصال)"""
+
+    def __init__(self, message: str, category: Optional[str] = None):
+        super().__init__(message)
+        self.message = message
+        self.category = category
+
+
+class RouterOsFatalError(RouterOsProtocolError):
+    """رد !fatal أو انقطاع الاتصال (يُغلق المقبس)"""
+
+
+# ترميز الكلمات
+
+def encode_length(length: int) -> bytes:
+    """ترميز طول الكلمة حسب مواصفات RouterOS API"""
+    if length < 0x80:
+        return bytes([length])
+    if length < 0x4000:
+        return (length | 0x8000).to_bytes(2, 'big')
+    if length < 0x200000:
+        return (length | 0xC00000).to_bytes(3, 'big')
+    if length < 0x10000000:
+        return (length | 0xE0000000).to_bytes(4, 'big')
+    return b'\xf0' + length.to_bytes(4, 'big')
+
+
+async def read_length(reader: asyncio.StreamReader) -> int:
+    """قراءة طول الكلمة من المقبس"""
+    first = (await reader.readexactly(1))[0]
+    if first & 0x80 == 0x00:
+        return first
+    if first & 0xC0 == 0x80:
+        return ((first & 0x3F) << 8) + (await reader.readexactly(1))[0]
+    if first & 0xE0 == 0xC0:
+        return ((first & 0x1F) << 16) + int.from_bytes(await reader.readexactly(2), 'big')
+    if first & 0xF0 == 0xE0:
+        return ((first & 0x0F) << 24) + int.from_bytes(await reader.readexactly(3), 'big')
+    if first == 0xF0:
+        return int.from_bytes(await reader.readexactly(4), 'big')
+    raise RouterOsProtocolError(f"بايت طول غير صالح: {first:#x}")
+
+
+def encode_sentence(words: Iterable[str]) -> bytes:
+    """ترميز جملة كاملة (كلمات + كلمة فارغة للإنهاء)"""
+    encoded = bytearray()
+    for word in words:
+        data = word.encode('utf-8')
+        encoded += encode_length(len(data)) + data
+    encoded += b'\x00'
+    return bytes(encoded)
+
+
+async def read_sentence(reader: asyncio.StreamReader) -> List[str]:
+    """قراءة جملة كاملة من المقبس"""
+    words = []
+    while True:
+        length = await read_length(reader)
+        if length == 0:
+            return words
+        data = await reader.readexactly(length)
+        words.append(data.decode('utf-8', errors='backslashreplace'))
+
+
+def parse_sentence(words: List[str]) -> Tuple[str, Optional[str], Dict[str, str]]:
+    """تحليل جملة رد إلى (النوع، الوسم، السمات)"""
+    if not words:
+        raise RouterOsProtocolError("جملة فارغة")
+
+    reply_type = words[0]
+    tag = None
+    attributes = {}
+    for word in words[1:]:
+        if word.startswith('.tag='):
+            tag = word[5:]
+        elif word.startswith('='):
+            key, _, value = word[1:].partition('=')
+            attributes[key] = value
+    return reply_type, tag, attributes
+
+
+def build_command(command: str, arguments: Dict[str, Any] = None,
+                  queries: Iterable[str] = (), tag: Optional[str] = None) -> List[str]:
+    """بناء كلمات الأمر"""
+    words = [command]
+    for key, value in (arguments or {}).items():
+        words.append(f"={key}={'' if value is None else value}")
+    words.extend(queries)
+    if tag is not None:
+        words.append(f".tag={tag}")
+    return words
+
+
+class _PendingCommand:
+    """أمر معلق بانتظار الرد"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, streaming: bool = False):
+        self.rows: List[Dict[str, str]] = []
+        self.done_message: Dict[str, str] = {}
+        self.trap: Optional[RouterOsTrapError] = None
+        self.future = loop.create_future()
+        self.queue: Optional[asyncio.Queue] = asyncio.Queue() if streaming else None
+
+
+class AsyncRouterOsConnection:
+    """اتصال RouterOS API غير متزامن يدعم عدة أوامر متزامنة على مقبس واحد"""
+
+    def __init__(self, host: str, port: int = 8728, use_ssl: bool = False, timeout: float = 15.0):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._pending: Dict[str, _PendingCommand] = {}
+        self._next_tag = 0
+        self.connected = False
+
+    async def connect(self):
+        """فتح المقبس وبدء قارئ الردود"""
+        ssl_context = None
+        if self.use_ssl:
+            ssl_context = ssl.create_default_context()
+            ssl_context.check_hostname = False
+            ssl_context.verify_mode = ssl.CERT_NONE
+
+        self._reader, self._writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_context), self.timeout
+        )
+        self.connected = True
+        self._reader_task = asyncio.create_task(self._read_loop())
+
+    async def login(self, username: str, password: str):
+        """تسجيل الدخول (الطريقة الحديثة مع دعم طريقة التحدي القديمة)"""
+        done = await self.execute('/login', {'name': username, 'password': password},
+                                  timeout=self.timeout, with_done=True)
+        challenge = done.get('ret')
+        if challenge:
+            # RouterOS قبل 6.43: تحدي MD5
+            hasher = hashlib.md5()
+            hasher.update(b'\x00')
+            hasher.update(password.encode('utf-8'))
+            hasher.update(binascii.unhexlify(challenge))
+            await self.execute('/login', {'name': username, 'response': '00' + hasher.hexdigest()},
+                               timeout=self.timeout)
+
+    def _allocate(self, streaming: bool = False) -> Tuple[str, _PendingCommand]:
+        if not self.connected:
+            raise RouterOsFatalError(f"غير متصل بـ {self.host}:{self.port}")
+        self._next_tag += 1
+        tag = str(self._next_tag)
+        pending = _PendingCommand(asyncio.get_running_loop(), streaming)
+        self._pending[tag] = pending
+        return tag, pending
+
+    def _send(self, words: List[str]):
+        self._writer.write(encode_sentence(words))
+
+    async def execute(self, command: str, arguments: Dict[str, Any] = None,
+                      queries: Iterable[str] = (), timeout: Optional[float] = None,
+                      with_done: bool = False):
+        """تنفيذ أمر وانتظار جميع ردوده
+
+        تُرسل الجملة فوراً دون انتظار، لذا يمكن تشغيل عدة أوامر معاً
+        (asyncio.gather) لتتشارك زمن رحلة واحد على نفس المقبس.
+        """
+        tag, pending = self._allocate()
+        self._send(build_command(command, arguments, queries, tag))
+        await self._writer.drain()
+
+        try:
+            if timeout is None:
+                await pending.future
+            else:
+                await asyncio.wait_for(asyncio.shield(pending.future), timeout)
+        except asyncio.TimeoutError:
+            await self.cancel(tag)
+            raise
+        finally:
+            self._pending.pop(tag, None)
+
+        if pending.trap:
+            raise pending.trap
+        return pending.done_message if with_done else pending.rows
+
+    async def stream(self, command: str, arguments: Dict[str, Any] = None,
+                     queries: Iterable[str] = ()) -> AsyncIterator[Dict[str, str]]:
+        """تنفيذ أمر مستمر (listen / follow) وإرجاع الصفوف عند وصولها"""
+        tag, pending = self._allocate(streaming=True)
+        self._send(build_command(command, arguments, queries, tag))
+        await self._writer.drain()
+
+        try:
+            while True:
+                row = await pending.queue.get()
+                if row is None:
+                    break
+                yield row
+            if pending.trap and pending.trap.category != '2':
+                # الفئة 2 تعني أن الأمر أُلغي (interrupted)
+                raise pending.trap
+        finally:
+            if not pending.future.done():
+                await self.cancel(tag)
+            self._pending.pop(tag, None)
+
+    async def cancel(self, tag: str):
+        """إلغاء أمر جارٍ بواسطة وسمه"""
+        if self.connected:
+            self._send(build_command('/cancel', {'tag': tag}))
+            try:
+                await self._writer.drain()
+            except Exception:
+                pass
+
+    async def _read_loop(self):
+        """قراءة الردود وتوزيعها على الأوامر حسب الوسم"""
+        error: Exception = RouterOsFatalError("تم إغلاق الاتصال")
+        try:
+            while True:
+                reply_type, tag, attributes = parse_sentence(await read_sentence(self._reader))
+                if reply_type == '!fatal':
+                    error = RouterOsFatalError(attributes.get('message', 'fatal'))
+                    break
+
+                pending = self._pending.get(tag)
+                if pending is None:
+                    # رد لأمر ملغى أو غير معروف (مثل /cancel)
+                    continue
+
+                if reply_type == '!re':
+                    if pending.queue is not None:
+                        pending.queue.put_nowait(attributes)
+                    else:
+                        pending.rows.append(attributes)
+                elif reply_type == '!trap':
+                    pending.trap = RouterOsTrapError(attributes.get('message', ''), attributes.get('category'))
+                elif reply_type in ('!done', '!empty'):
+                    pending.done_message = attributes
+                    if not pending.future.done():
+                        pending.future.set_result(None)
+                    if pending.queue is not None:
+                        pending.queue.put_nowait(None)
+        except (asyncio.IncompleteReadError, ConnectionError, OSError) as e:
+            error = RouterOsFatalError(f"انقطع الاتصال: {e}")
+        except RouterOsProtocolError as e:
+            error = RouterOsFatalError(str(e))
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._fail_all(error)
+
+    def _fail_all(self, error: Exception):
+        self.connected = False
+        for pending in self._pending.values():
+            if not pending.future.done():
+                pending.future.set_exception(error)
+                # تجنب تحذير "exception was never retrieved"
+                pending.future.exception()
+            if pending.queue is not None:
+                pending.trap = pending.trap or RouterOsTrapError(str(error))
+                pending.queue.put_nowait(None)
+        self._pending.clear()
+
+    async def close(self):
+        """إغلاق الاتصال"""
+        self.connected = False
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self._writer:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except Exception:
+                pass
+            self._writer = None
+
+
+# محول متزامن متوافق مع routeros_api
+
+class _LoopThread:
+    """حلقة asyncio مشتركة في خيط خلفي لجميع الاتصالات الأصلية"""
+
+    _instance = None
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="routeros-native", daemon=True)
+        self.thread.start()
+
+    @classmethod
+    def get(cls) -> '_LoopThread':
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def run(self, coroutine, timeout: Optional[float] = None):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+    def submit(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+def _encode_key(key: str) -> str:
+    """تحويل مفاتيح بايثون إلى مفاتيح RouterOS (مثل routeros_api)"""
+    key = key.replace('_', '-')
+    if key in ('id', 'proplist'):
+        return '.' + key
+    return key
+
+
+def _decode_row(row: Dict[str, str]) -> Dict[str, str]:
+    return {(key[1:] if key in ('.id', '.proplist') else key): value for key, value in row.items()}
+
+
+def _encode_queries(queries: Dict[str, Any], additional_queries: Iterable[Any]) -> List[str]:
+    words = [f"?{_encode_key(key)}={value}" for key, value in (queries or {}).items()]
+    for query in additional_queries:
+        # كائنات الاستعلام في routeros_api تعيد كلمات بصيغة bytes
+        words.extend(word.decode('utf-8') if isinstance(word, bytes) else word
+                     for word in query.get_api_format())
+    return words
+
+
+class NativeResponse(list):
+    """نتيجة أمر (صفوف !re) مع رسالة !done"""
+
+    def __init__(self, rows=(), done_message: Dict[str, str] = None):
+        super().__init__(rows)
+        self.done_message = done_message or {}
+
+
+class NativePromise:
+    """وعد بنتيجة أمر مرسل مسبقاً"""
+
+    def __init__(self, future, timeout: Optional[float]):
+        self._future = future
+        self._timeout = timeout
+
+    def get(self) -> NativeResponse:
+        return self._future.result(self._timeout)
+
+    def __iter__(self):
+        return iter(self.get())
+
+
+class NativeResource:
+    """مورد RouterOS بواجهة متوافقة مع routeros_api.RouterOsResource"""
+
+    def __init__(self, api: 'NativeRouterOsApi', path: str):
+        self.api = api
+        self.path = '/' + path.strip('/') + '/'
+
+    def get(self, **kwargs):
+        return self.call('print', {}, kwargs)
+
+    def add(self, **kwargs):
+        return self.call('add', kwargs)
+
+    def set(self, **kwargs):
+        return self.call('set', kwargs)
+
+    def remove(self, **kwargs):
+        return self.call('remove', kwargs)
+
+    def add_async(self, **kwargs):
+        return self.call_async('add', kwargs)
+
+    def call(self, command, arguments=None, queries=None, additional_queries=()):
+        return self.call_async(command, arguments, queries, additional_queries).get()
+
+    def call_async(self, command, arguments=None, queries=None, additional_queries=()):
+        arguments = {_encode_key(key): value for key, value in (arguments or {}).items()}
+        words = _encode_queries(queries, additional_queries)
+        return self.api.submit(self.path + command, arguments, words)
+
+
+class NativeRouterOsApi:
+    """واجهة API متزامنة فوق AsyncRouterOsConnection"""
+
+    def __init__(self, connection: AsyncRouterOsConnection, loop_thread: _LoopThread,
+                 command_timeout: Optional[float] = None):
+        self.connection = connection
+        self.loop_thread = loop_thread
+        self.command_timeout = command_timeout
+
+    def get_resource(self, path: str) -> NativeResource:
+        return NativeResource(self, path)
+
+    async def _execute(self, command, arguments, queries) -> NativeResponse:
+        rows = await self.connection.execute(command, arguments, queries)
+        return NativeResponse(_decode_row(row) for row in rows)
+
+    def submit(self, command: str, arguments: Dict[str, Any], queries: List[str]) -> NativePromise:
+        future = self.loop_thread.submit(self._execute(command, arguments, queries))
+        return NativePromise(future, self.command_timeout)
+
+
+class NativeRouterOsApiPool:
+    """بديل لـ routeros_api.RouterOsApiPool يعتمد على AsyncRouterOsConnection
+
+    جميع عمليات المقبس تجري في حلقة asyncio خلفية واحدة، لذا يمكن
+    لعدة خيوط إرسال أوامر في نفس الوقت على نفس الاتصال.
+    """
+
+    socket_timeout = 15.0
+    # المهلة القصوى لانتظار نتيجة أمر واحد (القوائم الكبيرة قد تستغرق وقتاً)
+    command_timeout = 120.0
+
+    def __init__(self, host, username='admin', password='', port=None, use_ssl=False, **kwargs):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.use_ssl = use_ssl
+        self.port = port or (8729 if use_ssl else 8728)
+        self.loop_thread = _LoopThread.get()
+        self.connection: Optional[AsyncRouterOsConnection] = None
+        self.api: Optional[NativeRouterOsApi] = None
+
+    @property
+    def connected(self) -> bool:
+        return self.connection is not None and self.connection.connected
+
+    async def _open(self) -> AsyncRouterOsConnection:
+        connection = AsyncRouterOsConnection(self.host, self.port, self.use_ssl, self.socket_timeout)
+        await connection.connect()
+        try:
+            await connection.login(self.username, self.password)
+        except Exception:
+            await connection.close()
+            raise
+        return connection
+
+    def get_api(self) -> NativeRouterOsApi:
+        if not self.connected:
+            self.connection = self.loop_thread.run(self._open(), self.socket_timeout * 2)
+            self.api = NativeRouterOsApi(self.connection, self.loop_thread, self.command_timeout)
+        return self.api
+
+    def disconnect(self):
+        if self.connection is not None:
+            self.loop_thread.run(self.connection.close(), self.socket_timeout)
+            self.connection = None
+            self.api = None
@@ -6,9 +6,15 @@ import re
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton
 from telegram.ext import ContextTypes
 
-from config import MESSAGES, TEMPLATES, ALLOWED_USERS
+from config import MESSAGES, TEMPLATES, ALLOWED_USERS, USAGE_HISTORY_DAYS
 from database import DatabaseManager
-from mikrotik_api_client import MikroTikAPIClient
+from async_mikrotik_client import AsyncMikroTikClient
+from card_jobs import CardJobQueue
+from card_reconciler import CardReconciler
+from connection_pool import RouterConnectionPool
+from hotspot_manager import HotspotManager
+from listing_pager import ListingPager
+from top_talkers import TopTalkers, METRICS as TOP_TALKER_METRICS
 from models import MikroTikDevice
 
 logger = logging.getLogger(__name__)
@@ -18,7 +24,19 @@ class TelegramHandlers:
     
     def __init__(self, db_manager: DatabaseManager):
         self.db = db_manager
-        self.active_connections: Dict[int, MikroTikAPIClient] = {}
+        # الاتصالات مشتركة بين المستخدمين لكل راوتر
+        self.pool = RouterConnectionPool()
+        self.user_devices: Dict[int, MikroTikDevice] = {}
+        self.hotspot_manager = HotspotManager(db_manager)
+        # لقطات القوائم الطويلة لتصفحها على صفحات
+        self.pager = ListingPager()
+        # ترتيب الأكثر استهلاكاً لكل راوتر (يُخزن لمدة التحديث)
+        self.top_talkers = TopTalkers()
+        # مطابقة الكروت المحفوظة مع الراوترات (تعمل دورياً من main)
+        self.reconciler = CardReconciler(db_manager, self.pool)
+        # مهام توليد الكروت في الخلفية (تعمل وتُستأنف من main)
+        self.card_jobs = CardJobQueue(db_manager, self.pool, self.hotspot_manager.card_generator,
+                                      self.hotspot_manager.pdf_renderer)
     
     def is_user_authorized(self, user_id: int) -> bool:
         """فحص تفويض المستخدم"""
@@ -26,9 +44,12 @@ class TelegramHandlers:
             return False
         return self.db.is_user_authorized(user_id) or not ALLOWED_USERS
     
-    def get_user_connection(self, user_id: int) -> MikroTikAPIClient:
+    def get_user_connection(self, user_id: int) -> AsyncMikroTikClient:
         """الحصول على اتصال المستخدم بالميكروتك"""
-        return self.active_connections.get(user_id)
+        device = self.user_devices.get(user_id)
+        if device is None:
+            return None
+        return self.pool.get(device)
     
     def create_main_keyboard(self) -> InlineKeyboardMarkup:
         """إنشاء لوحة المفاتيح الرئيسية بتصميم أنيق"""
@@ -63,6 +84,13 @@ class TelegramHandlers:
                 InlineKeyboardButton("➕ إضافة مستخدم جديد", callback_data="hotspot_add"),
                 InlineKeyboardButton("🔎 البحث عن مستخدم", callback_data="hotspot_search")
             ],
+            [
+                InlineKeyboardButton("📊 الأكثر استهلاكاً", callback_data="hotspot_top"),
+                InlineKeyboardButton("⚙️ عمليات جماعية", callback_data="hotspot_bulk")
+            ],
+            [
+                InlineKeyboardButton("📥 استيراد من ملف CSV", callback_data="hotspot_import")
+            ],
             [
                 InlineKeyboardButton("🔙 العودة للقائمة الرئيسية", callback_data="main_menu")
             ]
@@ -76,6 +104,9 @@ class TelegramHandlers:
                 InlineKeyboardButton("🎫 توليد كروت جديدة", callback_data="generate_cards"),
                 InlineKeyboardButton("🗂️ عرض الكروت المحفوظة", callback_data="saved_cards")
             ],
+            [
+                InlineKeyboardButton("🔄 مطابقة الكروت مع الراوتر", callback_data="reconcile_cards")
+            ],
             [
                 InlineKeyboardButton("🔙 العودة للقائمة الرئيسية", callback_data="main_menu")
             ]
@@ -165,8 +196,14 @@ class TelegramHandlers:
         # محاولة الاتصال
         processing_msg = await update.message.reply_text(MESSAGES["processing"])
         
-        client = MikroTikAPIClient(device)
-        if client.connect():
+        # تحرير الجهاز السابق إن وجد
+        previous_device = self.user_devices.pop(user_id, None)
+        if previous_device:
+            await self.pool.release(user_id, previous_device)
+        self.pager.discard(user_id)
+        
+        client = await self.pool.acquire(user_id, device)
+        if client:
             # حفظ الجهاز في قاعدة البيانات
             device_id = self.db.add_mikrotik_device(user_id, device)
             
@@ -174,8 +211,8 @@ class TelegramHandlers:
                 # إنشاء جلسة المستخدم
                 self.db.create_user_session(user_id, device_id)
                 
-                # حفظ الاتصال النشط
-                self.active_connections[user_id] = client
+                # ربط المستخدم بالاتصال المشترك
+                self.user_devices[user_id] = device
                 
                 await processing_msg.edit_text(
                     MESSAGES["login_success"],
@@ -184,7 +221,7 @@ class TelegramHandlers:
                 
                 self.db.log_operation(user_id, "login", f"تسجيل دخول ناجح إلى {device}", True)
             else:
-                client.disconnect()
+                await self.pool.release(user_id, device)
                 await processing_msg.edit_text("❌ خطأ في حفظ بيانات الجهاز")
         else:
             await processing_msg.edit_text(MESSAGES["login_failed"])
@@ -216,9 +253,13 @@ class TelegramHandlers:
         elif data == "hotspot_menu":
             await self.show_hotspot_menu(query)
         elif data == "hotspot_active":
-            await self.show_hotspot_active_users(query)
+            await self.show_hotspot_active_users(query, refresh=True)
+        elif data.startswith("hotspot_active_page:"):
+            await self.show_hotspot_active_users(query, page=int(data.split(":", 1)[1]))
         elif data == "hotspot_all":
-            await self.show_hotspot_all_users(query)
+            await self.show_hotspot_all_users(query, refresh=True)
+        elif data.startswith("hotspot_all_page:"):
+            await self.show_hotspot_all_users(query, page=int(data.split(":", 1)[1]))
         elif data == "hotspot_cards":
             await self.show_hotspot_cards_menu(query)
         elif data == "troubleshoot":
@@ -234,7 +275,7 @@ class TelegramHandlers:
         elif data == "operation_logs":
             await self.show_operation_logs(query)
         elif data == "generate_cards":
-            await self.prompt_generate_cards(query, context)
+            await self.hotspot_manager.handle_generate_cards_callback(query, context)
         elif data == "saved_cards":
             await self.show_saved_cards(query)
         elif data == "system_health_check":
@@ -245,6 +286,27 @@ class TelegramHandlers:
             await self.prompt_traceroute_test(query, context)
         elif data == "speed_test":
             await self.prompt_speed_test(query, context)
+        elif data == "hotspot_search":
+            await self.hotspot_manager.handle_hotspot_search(query, context)
+        elif data.startswith("hotspot_search_page:"):
+            await self.hotspot_manager.handle_search_page(query, context, int(data.split(":", 1)[1]))
+        elif data == "reconcile_cards":
+            await self.hotspot_manager.handle_reconcile_cards(query, context)
+        elif data == "reconcile_cards_apply":
+            await self.hotspot_manager.handle_reconcile_cards(query, context, apply=True)
+        elif data == "hotspot_top":
+            await self.show_top_talkers(query)
+        elif data.startswith("hotspot_top:"):
+            metric, _, refresh = data.split(":", 1)[1].partition(":")
+            await self.show_top_talkers(query, metric, refresh=refresh == "refresh")
+        elif data.startswith("hotspot_usage:"):
+            await self.show_usage_history(query, int(data.split(":", 1)[1]))
+        elif data == "hotspot_bulk":
+            await self.hotspot_manager.handle_bulk_prompt(query, context)
+        elif data.startswith("bulk_action:"):
+            await self.hotspot_manager.handle_bulk_action(query, context, data.split(":", 1)[1])
+        elif data == "hotspot_import":
+            await self.hotspot_manager.handle_import_prompt(query, context)
         else:
             await query.edit_message_text("❌ أمر غير معروف")
     
@@ -264,13 +326,13 @@ class TelegramHandlers:
             await query.edit_message_text(MESSAGES["not_logged_in"])
             return
         
-        system_info = client.get_system_info()
+        system_info = await client.get_system_info()
         if not system_info:
             await query.edit_message_text("❌ فشل في الحصول على معلومات النظام")
             return
         
         # الحصول على معلومات الشبكة
-        interfaces = client.get_interfaces()
+        interfaces = await client.get_interfaces()
         total_rx = sum(iface.rx_mb for iface in interfaces if iface.running)
         total_tx = sum(iface.tx_mb for iface in interfaces if iface.running)
         
@@ -305,7 +367,21 @@ class TelegramHandlers:
             reply_markup=self.create_hotspot_keyboard()
         )
     
-    async def show_hotspot_active_users(self, query):
+    async def _listing_snapshot(self, user_id: int, listing: str, client: AsyncMikroTikClient,
+                                refresh: bool):
+        """لقطة القائمة من الذاكرة، أو تحميلها من الراوتر عند التحديث أو انتهاء صلاحيتها"""
+        snapshot = None if refresh else self.pager.get(user_id, listing)
+        if snapshot is not None:
+            return snapshot
+        
+        active_users = await client.get_hotspot_active_users()
+        if listing == "hotspot_active":
+            items = sorted(active_users, key=lambda user: user.name.lower())
+        else:
+            items = sorted(await client.get_hotspot_users(), key=lambda user: user.name.lower())
+        return self.pager.put(user_id, listing, items, {user.name for user in active_users})
+    
+    async def show_hotspot_active_users(self, query, page: int = 0, refresh: bool = False):
         """عرض المستخدمين النشطين في الهوتسبوت"""
         user_id = query.from_user.id
         client = self.get_user_connection(user_id)
@@ -314,34 +390,122 @@ class TelegramHandlers:
             await query.edit_message_text(MESSAGES["not_logged_in"])
             return
         
-        active_users = client.get_hotspot_active_users()
+        snapshot = await self._listing_snapshot(user_id, "hotspot_active", client, refresh)
+        active_users = snapshot.items
         
         if not active_users:
             message = "👥 المستخدمون النشطون\n\n❌ لا يوجد مستخدمون نشطون حالياً"
+            navigation = []
         else:
+            users, page, offset = self.pager.page(snapshot, page)
             message = f"👥 المستخدمون النشطون ({len(active_users)})\n\n"
             
-            for i, user in enumerate(active_users[:10], 1):  # عرض أول 10 مستخدمين
-                total_mb = (user.bytes_in + user.bytes_out) / (1024 * 1024) if user.bytes_in and user.bytes_out else 0
+            for i, user in enumerate(users, offset + 1):
+                total_mb = user.total_bytes_used / (1024 * 1024)
                 message += f"{i}. 👤 {user.name}\n"
                 message += f"   📍 IP: {user.ip_address}\n"
                 message += f"   ⏰ الوقت: {user.uptime}\n"
                 message += f"   📊 البيانات: {total_mb:.1f} MB\n\n"
             
-            if len(active_users) > 10:
-                message += f"... و {len(active_users) - 10} مستخدمين آخرين"
+            navigation = self.pager.keyboard(snapshot, page, "hotspot_active_page")
         
-        keyboard = [[InlineKeyboardButton("🔄 تحديث القائمة", callback_data="hotspot_active"),
-                    InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")]]
+        keyboard = navigation + [[InlineKeyboardButton("🔄 تحديث القائمة", callback_data="hotspot_active"),
+                                  InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")]]
         
         await query.edit_message_text(
             message,
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         
-        self.db.log_operation(user_id, "hotspot_active", f"عرض {len(active_users)} مستخدم نشط", True)
+        if refresh:
+            self.db.log_operation(user_id, "hotspot_active", f"عرض {len(active_users)} مستخدم نشط", True)
     
-    async def show_hotspot_all_users(self, query):
+    async def show_top_talkers(self, query, metric: str = "bytes", refresh: bool = False):
+        """عرض أعلى الجلسات النشطة استهلاكاً مع الإجماليات لكل بروفايل وسيرفر"""
+        user_id = query.from_user.id
+        client = self.get_user_connection(user_id)
+        
+        if not client or not client.is_connected():
+            await query.edit_message_text(MESSAGES["not_logged_in"])
+            return
+        
+        if metric not in TOP_TALKER_METRICS:
+            metric = "bytes"
+        snapshot = await self.top_talkers.snapshot(client, refresh)
+        titles = {"bytes": "البيانات", "rate": "المعدل", "uptime": "مدة الاتصال"}
+        
+        message = f"📊 الأكثر استهلاكاً حسب {titles[metric]} ({snapshot.session_count} جلسة نشطة)\n\n"
+        if not snapshot.session_count:
+            message += "❌ لا يوجد مستخدمون نشطون حالياً"
+        elif metric == "rate" and not snapshot.has_rates:
+            message += "⏳ المعدل يُحسب من الفرق بين تحديثين، اضغط تحديث بعد قليل\n"
+        else:
+            for i, (value, user) in enumerate(snapshot.top[metric], 1):
+                if metric == "bytes":
+                    shown = f"{value / (1024 * 1024):.1f} MB"
+                elif metric == "rate":
+                    shown = f"{value / 1_000_000:.2f} Mbps"
+                else:
+                    shown = user.uptime
+                message += f"{i}. 👤 {user.name} - {shown}\n"
+        
+        for title, groups in (("📦 حسب البروفايل", snapshot.by_profile), ("🖥️ حسب السيرفر", snapshot.by_server)):
+            if groups:
+                message += f"\n{title}:\n"
+                for name, totals in sorted(groups.items(), key=lambda item: -item[1].total_bytes):
+                    message += f"• {name}: {totals.sessions} جلسة - {totals.total_bytes / (1024 * 1024):.1f} MB\n"
+        
+        keyboard = [
+            [InlineKeyboardButton(("✅ " if name == metric else "") + titles[name], callback_data=f"hotspot_top:{name}")
+             for name in TOP_TALKER_METRICS],
+            [InlineKeyboardButton("📈 الاستهلاك المسجل", callback_data="hotspot_usage:7")],
+            [InlineKeyboardButton("🔄 تحديث", callback_data=f"hotspot_top:{metric}:refresh"),
+             InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")]
+        ]
+        
+        await query.edit_message_text(
+            message,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    async def show_usage_history(self, query, days: int = 7):
+        """عرض الأكثر استهلاكاً خلال فترة من العينات المسجلة (تشمل الجلسات المنتهية)"""
+        user_id = query.from_user.id
+        client = self.get_user_connection(user_id)
+        
+        if not client or not client.is_connected():
+            await query.edit_message_text(MESSAGES["not_logged_in"])
+            return
+        
+        if days not in USAGE_HISTORY_DAYS:
+            days = 7
+        # مفتاح الراوتر نفسه الذي يسجل به جامع العينات
+        router = str(client.device)
+        since = int(datetime.now().timestamp()) - days * 86400
+        
+        message = f"📈 الأكثر استهلاكاً خلال آخر {days} يوم\n"
+        for title, scope in (("👤 المستخدمون", "user"), ("📦 البروفايلات", "profile")):
+            rows = self.db.get_top_usage(router, scope, since)
+            message += f"\n{title}:\n"
+            if not rows:
+                message += "❌ لا يوجد استهلاك مسجل\n"
+            for i, row in enumerate(rows, 1):
+                message += (f"{i}. {row['name']} - {row['total_bytes'] / (1024 * 1024):.1f} MB "
+                            f"(⬇️ {row['bytes_out'] / (1024 * 1024):.1f} / ⬆️ {row['bytes_in'] / (1024 * 1024):.1f})\n")
+        
+        keyboard = [
+            [InlineKeyboardButton(("✅ " if period == days else "") + f"{period} يوم",
+                                  callback_data=f"hotspot_usage:{period}")
+             for period in USAGE_HISTORY_DAYS],
+            [InlineKeyboardButton("🔙 العودة للأكثر استهلاكاً", callback_data="hotspot_top")]
+        ]
+        
+        await query.edit_message_text(
+            message,
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    
+    async def show_hotspot_all_users(self, query, page: int = 0, refresh: bool = False):
         """عرض جميع مستخدمي الهوتسبوت"""
         user_id = query.from_user.id
         client = self.get_user_connection(user_id)
@@ -350,31 +514,35 @@ class TelegramHandlers:
             await query.edit_message_text(MESSAGES["not_logged_in"])
             return
         
-        all_users = client.get_hotspot_users()
+        snapshot = await self._listing_snapshot(user_id, "hotspot_all", client, refresh)
+        all_users = snapshot.items
         
         if not all_users:
             message = "📋 جميع مستخدمي الهوتسبوت\n\n❌ لا يوجد مستخدمون مسجلون"
+            navigation = []
         else:
+            users, page, offset = self.pager.page(snapshot, page)
             message = f"📋 جميع مستخدمي الهوتسبوت ({len(all_users)})\n\n"
             
-            for i, user in enumerate(all_users[:15], 1):  # عرض أول 15 مستخدم
-                status = "🟢 نشط" if user.is_active else ("🔴 معطل" if user.disabled else "⚪ غير متصل")
+            for i, user in enumerate(users, offset + 1):
+                is_active = user.name in snapshot.active_names
+                status = "🟢 نشط" if is_active else ("🔴 معطل" if user.disabled else "⚪ غير متصل")
                 message += f"{i}. 👤 {user.name}\n"
                 message += f"   📊 البروفايل: {user.profile}\n"
                 message += f"   🔘 الحالة: {status}\n\n"
             
-            if len(all_users) > 15:
-                message += f"... و {len(all_users) - 15} مستخدمين آخرين"
+            navigation = self.pager.keyboard(snapshot, page, "hotspot_all_page")
         
-        keyboard = [[InlineKeyboardButton("🔄 تحديث القائمة", callback_data="hotspot_all"),
-                    InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")]]
+        keyboard = navigation + [[InlineKeyboardButton("🔄 تحديث القائمة", callback_data="hotspot_all"),
+                                  InlineKeyboardButton("🔙 العودة لقائمة الهوتسبوت", callback_data="hotspot_menu")]]
         
         await query.edit_message_text(
             message,
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
         
-        self.db.log_operation(user_id, "hotspot_all", f"عرض {len(all_users)} مستخدم", True)
+        if refresh:
+            self.db.log_operation(user_id, "hotspot_all", f"عرض {len(all_users)} مستخدم", True)
     
     async def show_reboot_confirmation(self, query):
         """عرض تأكيد إعادة التشغيل"""
@@ -401,16 +569,17 @@ class TelegramHandlers:
             await query.edit_message_text(MESSAGES["not_logged_in"])
             return
         
-        if client.reboot_system():
+        if await client.reboot_system():
             await query.edit_message_text(
                 "✅ تم إرسال أمر إعادة التشغيل بنجاح!\n\n"
                 "سيتم إعادة تشغيل الجهاز خلال ثوانٍ قليلة.\n"
                 "قد تحتاج إلى تسجيل الدخول مرة أخرى بعد إعادة التشغيل."
             )
             
-            # قطع الاتصال
-            client.disconnect()
-            self.active_connections.pop(user_id, None)
+            # تحرير الاتصال المشترك
+            device = self.user_devices.pop(user_id, None)
+            if device:
+                await self.pool.release(user_id, device)
             
             self.db.log_operation(user_id, "reboot", "إعادة تشغيل الجهاز", True)
         else:
@@ -430,12 +599,42 @@ class TelegramHandlers:
             await self.handle_login_data(update, context)
             return
         
+        if context.user_data.get("waiting_for_search_query"):
+            await self.hotspot_manager.handle_search_query(update, context)
+            return
+        
+        if context.user_data.get("waiting_for_bulk_selector"):
+            await self.hotspot_manager.handle_bulk_selector(update, context)
+            return
+        
+        if context.user_data.get("waiting_for_card_params"):
+            await self.hotspot_manager.handle_card_generation_params(update, context)
+            return
+        
         # رسالة افتراضية للرسائل غير المعروفة
         await update.message.reply_text(
             "لم أفهم هذا الأمر. 🧐 يرجى استخدام الأزرار أو الأمر /start لعرض القائمة الرئيسية.",
             reply_markup=self.create_main_keyboard()
         )
     
+    async def handle_document(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        """معالج المستندات المرسلة (ملفات CSV لاستيراد المستخدمين)"""
+        user_id = update.effective_user.id
+        
+        if not self.is_user_authorized(user_id):
+            await update.message.reply_text(MESSAGES["unauthorized"])
+            return
+        
+        file_name = (update.message.document.file_name or "").lower()
+        if context.user_data.get("waiting_for_import_file") or file_name.endswith(".csv"):
+            await self.hotspot_manager.handle_import_document(update, context)
+            return
+        
+        await update.message.reply_text(
+            "❌ نوع الملف غير مدعوم. لاستيراد المستخدمين أرسل ملف CSV من قائمة الهوتسبوت.",
+            reply_markup=self.create_main_keyboard()
+        )
+    
     async def show_settings(self, query):
         """عرض الإعدادات"""
         user_id = query.from_user.id
@@ -448,7 +647,7 @@ class TelegramHandlers:
         if devices:
             message += "📱 الأجهزة المحفوظة:\n"
             for device in devices:
-                status = "🟢 متصل" if user_id in self.active_connections else "🔴 غير متصل"
+                status = "🟢 متصل" if user_id in self.user_devices else "🔴 غير متصل"
                 message += f"• {device["device_name"]} ({device["ip_address"]}:{device["port"]}) - {status}\n"
         
         keyboard = [[InlineKeyboardButton("🔙 العودة للقائمة الرئيسية", callback_data="main_menu")]]
@@ -494,7 +693,7 @@ class TelegramHandlers:
         # عرض رسالة المعالجة
         await query.edit_message_text("🔍 جاري اكتشاف الأجهزة في الشبكة... قد يستغرق الأمر بعض الوقت.")
         
-        devices = client.discover_devices()
+        devices = await client.discover_devices()
         
         if not devices:
             message = "🌐 اكتشاف الأجهزة\n\n❌ لم يتم العثور على أجهزة في الشبكة."
@@ -548,7 +747,7 @@ class TelegramHandlers:
         
         await query.edit_message_text("🩺 جاري فحص صحة النظام... يرجى الانتظار.")
         
-        health = client.get_system_health()
+        health = await client.get_system_health()
         
         if not health:
             await query.edit_message_text("❌ فشل في فحص صحة النظام. يرجى التأكد من اتصال الراوتر.")
@@ -685,7 +884,7 @@ class TelegramHandlers:
             await query.edit_message_text(MESSAGES["not_logged_in"])
             return
         
-        interfaces = client.get_interfaces()
+        interfaces = await client.get_interfaces()
         if not interfaces:
             await query.edit_message_text("❌ لا توجد واجهات متاحة لاختبار السرعة.")
             return
@@ -733,68 +932,6 @@ class TelegramHandlers:
         self.db.log_operation(user_id, "speed_test", f"اختبار السرعة للواجهة {interface_name}", True)
         context.user_data.pop("waiting_for_speed_test_iface", None)
 
-    async def prompt_generate_cards(self, query, context):
-        """طلب تفاصيل توليد الكروت"""
-        user_id = query.from_user.id
-        client = self.get_user_connection(user_id)
-        
-        if not client or not client.is_connected():
-            await query.edit_message_text(MESSAGES["not_logged_in"])
-            return
-        
-        await query.edit_message_text("🎫 توليد كروت هوتسبوت جديدة\n\nيرجى إدخال التفاصيل بالتنسيق التالي:\nالعدد:البيانات:الوقت:الصلاحية\n\nمثال:\n10:1GB:1H:7 (10 كروت، 1 جيجابايت، ساعة واحدة، صالحة لمدة 7 أيام)\n\nالبيانات: يمكن أن تكون 1GB, 500MB, unlimited\nالوقت: يمكن أن يكون 1H, 30M, unlimited\nالصلاحية: عدد الأيام (مثال: 7, 30, 365)")
-        context.user_data["waiting_for_card_details"] = True
-
-    async def handle_generate_cards_data(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        """معالجة بيانات توليد الكروت وتنفيذ العملية"""
-        user_id = update.effective_user.id
-        details = update.message.text.strip()
-        client = self.get_user_connection(user_id)
-
-        if not client or not client.is_connected():
-            await update.message.reply_text(MESSAGES["not_logged_in"])
-            context.user_data.pop("waiting_for_card_details", None)
-            return
-
-        parts = details.split(":")
-        if len(parts) != 4:
-            await update.message.reply_text("❌ تنسيق خاطئ. يرجى استخدام التنسيق:\nالعدد:البيانات:الوقت:الصلاحية")
-            return
-
-        try:
-            count = int(parts[0])
-            data_quota = parts[1]
-            time_quota = parts[2]
-            validity_days = int(parts[3])
-        except ValueError:
-            await update.message.reply_text("❌ بيانات غير صالحة. يرجى التحقق من الأرقام.")
-            return
-
-        await update.message.reply_text(f"🎫 جاري توليد {count} كرت هوتسبوت... يرجى الانتظار.")
-        
-        generated_cards = client.generate_hotspot_cards(count, data_quota, time_quota, validity_days)
-
-        if not generated_cards:
-            message = "❌ فشل في توليد الكروت. يرجى التحقق من إعدادات الميكروتك."
-        else:
-            message = f"✅ تم توليد {len(generated_cards)} كرت بنجاح!\n\n"
-            for i, card in enumerate(generated_cards[:5], 1):
-                message += f"{i}. 👤 {card.username} | 🔑 {card.password}\n"
-            if len(generated_cards) > 5:
-                message += f"... و {len(generated_cards) - 5} كروت أخرى.\n"
-            message += "\nيمكنك عرض جميع الكروت المولدة في قائمة 'الكروت المحفوظة'."
-
-        keyboard = [[InlineKeyboardButton("🗂️ عرض الكروت المحفوظة", callback_data="saved_cards"),
-                    InlineKeyboardButton("🔙 العودة لقائمة الكروت", callback_data="hotspot_cards")]]
-        
-        await update.message.reply_text(
-            message,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
-        
-        self.db.log_operation(user_id, "generate_cards", f"توليد {count} كرت هوتسبوت", True)
-        context.user_data.pop("waiting_for_card_details", None)
-
     async def show_saved_cards(self, query):
         """عرض الكروت المحفوظة"""
         user_id = query.from_user.id
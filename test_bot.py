@@ -3,17 +3,40 @@
 """
 
 import unittest
-from unittest.mock import Mock, patch
+from unittest.mock import AsyncMock, Mock, patch
+import asyncio
+import io
 import sys
 import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 # إضافة مجلد المشروع إلى المسار
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database import DatabaseManager
-from models import MikroTikDevice, HotspotUser, HotspotCard
-from card_generator import HotspotCardGenerator
-from mikrotik_api_client import MikroTikAPIClient
+from models import MikroTikDevice, HotspotUser, HotspotCard, UserSelector, BulkAddResult
+from card_generator import HotspotCardGenerator, qr_data_ops, qr_matrices, qr_version
+from mikrotik_api_client import MikroTikAPIClient, parse_active_user
+from async_mikrotik_client import AsyncMikroTikClient, get_router_executor
+from connection_pool import RouterConnectionPool
+from hotspot_mirror import HotspotActiveMirror, HotspotUserIndex, RouterTableMirror
+from router_cache import RouterCache, make_key
+from listing_pager import ListingPager
+from usage_sampler import UsageSampler
+from csv_importer import iter_csv_users, error_report_csv
+from card_reconciler import CardReconciler, diff_cards, expected_users, series_users
+from top_talkers import TopTalkers
+from hotspot_manager import HotspotManager, parse_user_selector
+from card_expiry import CardExpiryEnforcer
+from pdf_renderer import PdfRenderService
+from card_jobs import CardJobQueue
+from routeros_protocol import (
+    AsyncRouterOsConnection, RouterOsTrapError, encode_length, encode_sentence,
+    read_length, read_sentence
+)
 
 class TestDatabaseManager(unittest.TestCase):
     """اختبار مدير قاعدة البيانات"""
@@ -103,13 +126,87 @@ class TestHotspotCardGenerator(unittest.TestCase):
             self.assertTrue(card.username.startswith("user"))
             self.assertEqual(len(card.password), 8)
             self.assertEqual(card.profile, "default")
+            self.assertEqual(card.data_quota_bytes, 1024 ** 3)
+            self.assertEqual(card.time_quota_seconds, 86400)
             self.assertEqual(card.data_quota, "1.0 GB")
             self.assertEqual(card.time_quota, "1 يوم")
             self.assertEqual(card.validity_days, 30)
-    
+
+    def test_generate_credentials_bulk_unique(self):
+        """اختبار توليد 100 ألف اسم فريد بسرعة ودون تكرار الأسماء الموجودة"""
+        existing = {f"user{number:06d}" for number in range(0, 1000000, 3)}
+
+        start = time.perf_counter()
+        credentials = self.generator.generate_credentials(100000, "user", existing=existing)
+        elapsed = time.perf_counter() - start
+
+        names = [name for name, _ in credentials]
+        self.assertEqual(len(set(names)), 100000)
+        self.assertFalse(existing & set(names))
+        self.assertTrue(all(len(name) == 10 and name[4:].isdigit() for name in names))
+        self.assertTrue(all(len(password) == 8 and password.isalnum() for _, password in credentials))
+        self.assertLess(elapsed, 1.0)
+
+    def test_series_cards_deterministic(self):
+        """اختبار اشتقاق كروت السلسلة من المفتاح والتحقق منها"""
+        series = self.generator.create_card_series(1000, "v", start=500)
+        cards = self.generator.generate_series_cards(series)
+
+        self.assertEqual(len(cards), 1000)
+        self.assertEqual(cards[0].username, "v000500")
+        self.assertEqual(len({card.password for card in cards}), 1000)
+        # إعادة توليد جزء من السلسلة تعطي نفس الكروت
+        again = self.generator.generate_series_cards(series, start=900, count=5)
+        self.assertEqual([(c.username, c.password) for c in again],
+                         [(c.username, c.password) for c in cards[400:405]])
+
+        self.assertTrue(self.generator.verify_series_card(series, cards[7].username, cards[7].password))
+        self.assertFalse(self.generator.verify_series_card(series, cards[7].username, cards[8].password))
+        self.assertFalse(self.generator.verify_series_card(series, "v001500", "x"))
+        other = self.generator.create_card_series(1000, "v", start=500)
+        self.assertFalse(self.generator.verify_series_card(other, cards[7].username, cards[7].password))
+
+    def test_render_cards_pdf_pages(self):
+        """اختبار رسم شبكة الكروت على عدة صفحات مع رسم الأجزاء الثابتة مرة واحدة"""
+        cards = self.generator.generate_cards(20, "user", "default", 1024, 24, 30)
+        with self.generator.render_cards_pdf(cards) as output:
+            pdf_data = output.read()
+
+        self.assertEqual(self.generator.cards_per_page(), 8)
+        self.assertTrue(pdf_data.startswith(b'%PDF'))
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', pdf_data)), 3)
+        # نموذج للصفحة ونموذج للكرت فقط مهما كان عدد الكروت
+        self.assertEqual(pdf_data.count(b'/Subtype /Form'), 2)
+
+    def test_qr_matrices_batch(self):
+        """اختبار رموز QR للدفعة بإصدار واحد ورسم الوحدات خارج أنماط التحديد فقط"""
+        cards = self.generator.generate_cards(5, "user", "default", 1024, 24, 30)
+        urls = [self.generator.card_login_url(card) for card in cards]
+        self.assertIn(f"username={cards[0].username}", urls[0])
+
+        version = qr_version(urls)
+        matrices = qr_matrices(urls, version)
+        self.assertEqual({len(matrix) for matrix in matrices}, {version * 4 + 17})
+        self.assertNotEqual(matrices[0], matrices[1])
+        # نمط التحديد العلوي الأيسر ثابت في كل رمز
+        self.assertEqual(matrices[0][0][:7], [True] * 7)
+        self.assertEqual(matrices[0][1][:7], [True] + [False] * 5 + [True])
+
+        ops = qr_data_ops(matrices[0]).splitlines()
+        self.assertEqual(ops[-1], 'f')
+        for op in ops[:-1]:
+            column, row, width, _ = map(int, op.split()[:4])
+            self.assertTrue(all(matrices[0][row][column:column + width]))
+            self.assertFalse(row < 8 and column < 8)
+
+    def test_generate_credentials_space_exhausted(self):
+        """اختبار رفض طلب أسماء أكثر مما تسمح به المساحة"""
+        with self.assertRaises(ValueError):
+            self.generator.generate_credentials(60, "u", length=2)
+
     def test_create_single_card_pdf(self):
         """اختبار إنشاء PDF لكرت واحد"""
-        card = HotspotCard("testuser", "testpass", "default", "1.0 GB", "1 يوم", 30)
+        card = HotspotCard("testuser", "testpass", "default", 1024 ** 3, 86400, 30)
         pdf_data = self.generator.create_single_card_pdf(card)
         
         self.assertIsInstance(pdf_data, bytes)
@@ -129,8 +226,15 @@ class TestHotspotCardGenerator(unittest.TestCase):
             self.assertEqual(user.name, cards[i].username)
             self.assertEqual(user.password, cards[i].password)
             self.assertEqual(user.profile, cards[i].profile)
-            self.assertEqual(user.limit_bytes_total, "1024M")
-            self.assertEqual(user.limit_uptime, "24h")
+            self.assertEqual(user.limit_bytes_total, "1073741824")
+            self.assertEqual(user.limit_uptime, "86400s")
+        
+        # الحصص الكسرية والمفتوحة تصل للراوتر دون فقد
+        cards = self.generator.generate_cards(1, "user", "default", 1536, 0, 30)
+        user = self.generator.convert_cards_to_hotspot_users(cards)[0]
+        self.assertEqual(cards[0].data_quota, "1.5 GB")
+        self.assertEqual(user.limit_bytes_total, str(1536 * 1024 ** 2))
+        self.assertEqual(user.limit_uptime, "")
 
 class TestMikroTikAPIClient(unittest.TestCase):
     """اختبار عميل API الميكروتك"""
@@ -162,6 +266,1241 @@ class TestMikroTikAPIClient(unittest.TestCase):
         self.assertFalse(result)
         self.assertFalse(self.client.is_connected())
 
+    def test_get_interfaces_uses_two_requests(self):
+        """اختبار جلب إحصائيات جميع الواجهات بطلبين فقط مهما كان عددها"""
+        rows = [
+            {'name': f'vlan{i}', 'type': 'vlan', 'running': 'true', 'disabled': 'false',
+             'rx-byte': str(i * 100), 'tx-byte': str(i * 200), 'rx-packet': '5', 'tx-packet': '6',
+             'rx-error': '0', 'tx-error': '1'}
+            for i in range(40)
+        ]
+        samples = [{'name': row['name'], 'rx-bits-per-second': '800', 'tx-bits-per-second': '1600'}
+                   for row in rows]
+
+        resource = Mock()
+        resource.call.side_effect = lambda command, arguments=None: rows if command == 'print' else samples
+        self.client.api = Mock()
+        self.client.api.get_resource.return_value = resource
+
+        interfaces = self.client.get_interfaces()
+
+        self.assertEqual(len(interfaces), 40)
+        self.assertEqual(resource.call.call_count, 2)
+        self.assertEqual(interfaces[3].rx_bytes, 300)
+        self.assertEqual(interfaces[3].tx_bytes, 600)
+        self.assertEqual(interfaces[3].tx_errors, 1)
+        self.assertEqual(interfaces[3].rx_bits_per_second, 800)
+
+    def test_get_system_info_pipelines_requests(self):
+        """اختبار إرسال جميع أوامر معلومات النظام قبل انتظار أي رد"""
+        events = []
+        replies = {
+            '/system/resource': [{'cpu-load': '12', 'total-memory': '1000', 'free-memory': '250',
+                                  'uptime': '1d', 'version': '7.15'}],
+            '/system/identity': [{'name': 'core'}],
+            '/system/routerboard': [{'model': 'RB5009'}],
+        }
+
+        def get_resource(path):
+            def call_async(command, arguments=None):
+                events.append(('send', path))
+                promise = Mock()
+                promise.get.side_effect = lambda: events.append(('receive', path)) or replies[path]
+                return promise
+            return Mock(call_async=call_async)
+
+        self.client.api = Mock()
+        self.client.api.get_resource.side_effect = get_resource
+
+        info = self.client.get_system_info()
+
+        self.assertEqual(info.cpu_load, 12.0)
+        self.assertEqual(info.memory_usage_percent, 75)
+        self.assertEqual([kind for kind, _ in events], ['send'] * 3 + ['receive'] * 3)
+
+    def test_get_hotspot_users_requests_only_needed_columns(self):
+        """اختبار طلب الأعمدة المطلوبة فقط (.proplist) مع أعمدة إضافية"""
+        resource = Mock()
+        resource.call.return_value = [{'id': '*A', 'name': 'u1', 'profile': 'vip', 'disabled': 'true'}]
+        self.client.api = Mock()
+        self.client.api.get_resource.return_value = resource
+
+        users = self.client.get_hotspot_users(extra_fields=('.id',))
+
+        command, arguments = resource.call.call_args[0]
+        columns = arguments['proplist'].split(',')
+        self.assertEqual(command, 'print')
+        self.assertIn('limit-bytes-total', columns)
+        self.assertEqual(columns[-1], '.id')
+        self.assertNotIn('bytes-in', columns)
+        self.assertEqual(users[0].profile, 'vip')
+        self.assertTrue(users[0].disabled)
+        self.assertEqual(users[0].extra, {'id': '*A'})
+
+    def test_find_hotspot_users_filters_on_router(self):
+        """اختبار إرسال شروط البحث إلى الراوتر بدلاً من التصفية محلياً"""
+        resource = Mock()
+        resource.call.return_value = [{'name': 'card01', 'disabled': 'false'}]
+        self.client.api = Mock()
+        self.client.api.get_resource.return_value = resource
+
+        users = self.client.find_hotspot_users(name_prefix='card', disabled=False)
+
+        words = [word for query in resource.call.call_args[1]['additional_queries']
+                 for word in query.get_api_format()]
+        self.assertEqual(words, [b'?disabled=false', b'?name=card', b'?>name=card', b'?#|',
+                                 b'?<name=care', b'?#&'])
+        self.assertEqual([user.name for user in users], ['card01'])
+
+    def test_remove_hotspot_user_looks_up_by_name(self):
+        """اختبار حذف المستخدم بالبحث عن معرفه فقط"""
+        resource = Mock()
+        resource.call.return_value = [{'id': '*7'}]
+        self.client.api = Mock()
+        self.client.api.get_resource.return_value = resource
+
+        self.assertTrue(self.client.remove_hotspot_user('card01'))
+
+        self.assertEqual(resource.call.call_args[0], ('print', {'proplist': '.id'}))
+        words = resource.call.call_args[1]['additional_queries'][0].get_api_format()
+        self.assertEqual(words, [b'?name=card01'])
+        resource.remove.assert_called_once_with(id='*7')
+
+    def test_add_hotspot_users_pipelines_with_window(self):
+        """اختبار الإضافة الجماعية بنافذة أوامر معلقة وإعادة محاولة الفاشلة فقط"""
+        in_flight = []
+        sent = []
+        max_in_flight = []
+        flaky = {'user3': 1}
+
+        def call_async(command, arguments):
+            name = arguments['name']
+            sent.append(name)
+            in_flight.append(name)
+            max_in_flight.append(len(in_flight))
+
+            def get():
+                in_flight.remove(name)
+                if name == 'user5':
+                    raise Exception('failure: already have user with this name')
+                if name == 'user7':
+                    # نُفذ في الجولة الأولى ولم يصل رده
+                    raise Exception('timed out' if sent.count(name) == 1 else 'failure: already have user')
+                if flaky.get(name):
+                    flaky[name] -= 1
+                    raise Exception('timed out')
+                return []
+            return Mock(get=get)
+
+        self.client.api = Mock()
+        self.client.api.get_resource.return_value.call_async.side_effect = call_async
+        self.client.check_connection = Mock(return_value=True)
+        users = [HotspotUser(f'user{i}', 'pass') for i in range(10)]
+        progress = []
+
+        result = self.client.add_hotspot_users(users, window=3, progress=lambda done, total: progress.append(done))
+
+        self.assertLessEqual(max(max_in_flight), 3)
+        self.assertEqual(sent[10:], ['user3', 'user7'])
+        self.assertEqual(result.success_count, 9)
+        self.assertEqual(list(result.failed), ['user5'])
+        self.assertEqual(progress[-1], 10)
+
+    def test_bulk_disable_selects_then_pipelines_set(self):
+        """اختبار اختيار المستخدمين بالشروط ثم تعطيلهم بأوامر set متتالية"""
+        resource = Mock()
+        resource.call.return_value = [
+            {'id': '*1', 'name': 'card01', 'comment': 'Generated on 2024-01-01', 'bytes-in': '600', 'bytes-out': '0'},
+            {'id': '*2', 'name': 'card02', 'comment': 'Generated on 2024-01-01', 'bytes-in': '10', 'bytes-out': '0'},
+            {'id': '*3', 'name': 'cardX1', 'comment': 'vip', 'bytes-in': '900', 'bytes-out': '0'},
+        ]
+        resource.call_async.return_value.get.return_value = []
+        self.client.api = Mock()
+        self.client.api.get_resource.return_value = resource
+
+        selector = UserSelector(comment_prefix='Generated', name_pattern='card0?', min_bytes=500)
+        users = self.client.select_hotspot_users(selector)
+        result = self.client.set_hotspot_users_disabled(users, disabled=True)
+
+        words = [word for query in resource.call.call_args[1]['additional_queries']
+                 for word in query.get_api_format()]
+        self.assertIn(b'?name=card0', words)
+        self.assertEqual([user.name for user in users], ['card01'])
+        resource.call_async.assert_called_once_with('set', {'id': '*1', 'disabled': 'yes'})
+        self.assertEqual(result.added, ['card01'])
+
+class TestAsyncMikroTikClient(unittest.IsolatedAsyncioTestCase):
+    """اختبار الواجهة غير المتزامنة لعميل الميكروتك"""
+
+    def setUp(self):
+        """إعداد الاختبار"""
+        self.device = MikroTikDevice("192.168.1.1", 8728, "admin", "password")
+        self.client = MikroTikAPIClient(self.device)
+
+    async def test_call_runs_in_router_executor(self):
+        """اختبار تنفيذ الأمر في خيط منفصل وإرجاع النتيجة"""
+        self.client.get_interfaces = Mock(return_value=["ether1"])
+        async_client = AsyncMikroTikClient(self.client)
+
+        self.assertEqual(await async_client.get_interfaces(), ["ether1"])
+        self.assertIs(async_client.executor, get_router_executor(self.device))
+
+    async def test_call_timeout_returns_default(self):
+        """اختبار إرجاع القيمة الافتراضية عند تجاوز المهلة"""
+        self.client.get_hotspot_users = lambda extra_fields=(): time.sleep(0.5) or ["late"]
+        async_client = AsyncMikroTikClient(self.client, timeout=0.05)
+
+        self.assertEqual(await async_client.get_hotspot_users(), [])
+
+    async def test_slow_router_does_not_block_other_router(self):
+        """اختبار أن الراوتر البطيء لا يعطل راوتر آخر"""
+        slow = MikroTikAPIClient(MikroTikDevice("10.0.0.1", 8728, "admin", "password"))
+        fast = MikroTikAPIClient(MikroTikDevice("10.0.0.2", 8728, "admin", "password"))
+        slow.get_system_info = lambda: time.sleep(0.5)
+        fast.get_system_info = Mock(return_value="info")
+
+        slow_task = asyncio.ensure_future(AsyncMikroTikClient(slow).get_system_info())
+        started = time.monotonic()
+        result = await AsyncMikroTikClient(fast).get_system_info()
+
+        self.assertEqual(result, "info")
+        self.assertLess(time.monotonic() - started, 0.4)
+        await slow_task
+
+class TestRouterConnectionPool(unittest.IsolatedAsyncioTestCase):
+    """اختبار مجمع الاتصالات المشتركة"""
+
+    def setUp(self):
+        """إعداد الاختبار"""
+        self.device = MikroTikDevice("192.168.50.1", 8728, "admin", "password")
+        self.pool = RouterConnectionPool(keepalive_interval=0, idle_timeout=3600)
+
+    @patch.object(MikroTikAPIClient, 'connect', return_value=True)
+    async def test_operators_share_one_connection(self, mock_connect):
+        """اختبار مشاركة اتصال واحد بين عدة مشغلين"""
+        first = await self.pool.acquire(1, self.device)
+        second = await self.pool.acquire(2, MikroTikDevice("192.168.50.1", 8728, "admin", "password"))
+
+        self.assertIs(first, second)
+        self.assertEqual(mock_connect.call_count, 1)
+        self.assertEqual(len(self.pool), 1)
+
+        await self.pool.release(1, self.device)
+        self.assertEqual(len(self.pool), 1)
+        await self.pool.release(2, self.device)
+        self.assertEqual(len(self.pool), 0)
+
+    @staticmethod
+    def fake_connect(client):
+        client.api = Mock()
+        return True
+
+    @patch.object(MikroTikAPIClient, 'connect', autospec=True, side_effect=fake_connect)
+    async def test_dead_connection_is_reconnected(self, mock_connect):
+        """اختبار اكتشاف الاتصال الميت وإعادة الاتصال"""
+        client = await self.pool.acquire(1, self.device)
+
+        with patch.object(MikroTikAPIClient, 'check_connection', return_value=False):
+            await self.pool.maintain()
+
+        self.assertEqual(mock_connect.call_count, 2)
+        self.assertTrue(client.is_connected())
+
+    @patch.object(MikroTikAPIClient, 'connect', return_value=True)
+    async def test_is_connected_reports_socket_state(self, mock_connect):
+        """اختبار أن الاتصال الميت الذي تعذرت إعادته يظهر منقطعاً"""
+        client = await self.pool.acquire(1, self.device)
+
+        self.assertFalse(client.is_connected())
+        self.assertEqual(await client.get_interfaces(), [])
+        self.assertFalse(client.is_connected())
+
+    @patch.object(MikroTikAPIClient, 'connect', autospec=True, side_effect=fake_connect)
+    async def test_idle_socket_is_reaped(self, mock_connect):
+        """اختبار إغلاق المقبس الخامل مع بقاء الجلسة وإعادة فتحه عند أول أمر"""
+        client = await self.pool.acquire(1, self.device)
+        self.pool.idle_timeout = 0
+
+        await self.pool.maintain()
+
+        self.assertFalse(client.client.is_connected())
+        self.assertTrue(client.is_connected())
+        self.assertIs(self.pool.get(self.device), client)
+
+        client.client.get_interfaces = Mock(return_value=["ether1"])
+        self.assertEqual(await client.get_interfaces(), ["ether1"])
+        self.assertTrue(client.client.is_connected())
+        self.assertFalse(client.idle_closed)
+
+    @patch.object(MikroTikAPIClient, 'connect', autospec=True, side_effect=fake_connect)
+    async def test_periodic_use_keeps_socket_open(self, mock_connect):
+        """اختبار أن استخدام المهام الدورية للاتصال يمنع إغلاقه كخامل"""
+        client = await self.pool.acquire(1, self.device)
+        self.pool.idle_timeout = 0.05
+        await asyncio.sleep(0.06)
+
+        self.assertEqual(self.pool.clients(), [client])
+        await self.pool.maintain()
+        self.assertTrue(client.client.is_connected())
+
+        await asyncio.sleep(0.06)
+        client.client.get_interfaces = Mock(return_value=[])
+        await client.get_interfaces()
+        await self.pool.maintain()
+        self.assertTrue(client.client.is_connected())
+        self.assertEqual(mock_connect.call_count, 1)
+
+class FakeRouterOsServer:
+    """خادم محلي بسيط يحاكي RouterOS API للاختبار"""
+
+    def __init__(self):
+        self.server = None
+        self.port = None
+        self.sentences = []
+        self.active_rows = []
+        self.listeners = []
+
+    async def start(self):
+        self.server = await asyncio.start_server(self.handle, '127.0.0.1', 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                words = await read_sentence(reader)
+                self.sentences.append(words)
+                asyncio.ensure_future(self.reply(words, writer))
+        except asyncio.IncompleteReadError:
+            writer.close()
+
+    def push(self, event):
+        """إرسال حدث إلى جميع أوامر listen الجارية"""
+        for writer, tail in self.listeners:
+            writer.write(encode_sentence(['!re'] + [f'={k}={v}' for k, v in event.items()] + tail))
+
+    async def reply(self, words, writer):
+        command = words[0]
+        tag = next((w for w in words if w.startswith('.tag=')), None)
+        tail = [tag] if tag else []
+
+        def send(*reply):
+            writer.write(encode_sentence(list(reply) + tail))
+
+        if command == '/ip/hotspot/active/listen':
+            self.listeners.append((writer, tail))
+            return
+        if command == '/ip/hotspot/active/print':
+            for row in self.active_rows:
+                send('!re', *[f'={k}={v}' for k, v in row.items()])
+        elif command == '/slow/print':
+            await asyncio.sleep(0.2)
+            send('!re', '=name=slow')
+        elif command == '/fail/print':
+            send('!trap', '=message=no such command')
+        elif command == '/system/identity/print':
+            send('!re', '=.id=*1', '=name=core')
+        elif command != '/login':
+            send('!re', '=name=' + command.split('/')[1])
+        send('!done')
+
+
+class TestRouterOsProtocol(unittest.IsolatedAsyncioTestCase):
+    """اختبار التنفيذ الأصلي لبروتوكول RouterOS API"""
+
+    async def asyncSetUp(self):
+        self.server = FakeRouterOsServer()
+        await self.server.start()
+
+    async def asyncTearDown(self):
+        await self.server.stop()
+
+    async def test_length_encoding_round_trip(self):
+        """اختبار ترميز وفك ترميز أطوال الكلمات"""
+        for length in (0, 0x7F, 0x80, 0x3FFF, 0x4000, 0x1FFFFF, 0x200000, 0xFFFFFFF, 0x10000000):
+            reader = asyncio.StreamReader()
+            reader.feed_data(encode_length(length))
+            self.assertEqual(await read_length(reader), length)
+
+    async def test_tagged_commands_share_one_socket(self):
+        """اختبار تنفيذ عدة أوامر متزامنة على مقبس واحد بردود غير مرتبة"""
+        connection = AsyncRouterOsConnection('127.0.0.1', self.server.port)
+        await connection.connect()
+        await connection.login('admin', 'password')
+
+        finished = []
+
+        async def run(path):
+            rows = await connection.execute(path)
+            finished.append(rows[0]['name'])
+
+        await asyncio.gather(run('/slow/print'), run('/fast/print'))
+        await connection.close()
+
+        self.assertEqual(finished, ['fast', 'slow'])
+
+    async def test_trap_keeps_connection_usable(self):
+        """اختبار أن رد !trap يرفع استثناء دون إغلاق الاتصال"""
+        connection = AsyncRouterOsConnection('127.0.0.1', self.server.port)
+        await connection.connect()
+
+        with self.assertRaises(RouterOsTrapError):
+            await connection.execute('/fail/print')
+        rows = await connection.execute('/system/identity/print')
+        await connection.close()
+
+        self.assertEqual(rows[0]['name'], 'core')
+
+    async def test_native_backend_for_api_client(self):
+        """اختبار استخدام التنفيذ الأصلي كخلفية لـ MikroTikAPIClient"""
+        device = MikroTikDevice('127.0.0.1', self.server.port, 'admin', 'password')
+        client = MikroTikAPIClient(device, backend='native')
+
+        connected = await asyncio.to_thread(client.connect)
+        identity = await asyncio.to_thread(lambda: client.api.get_resource('/system/identity').get())
+        await asyncio.to_thread(client.disconnect)
+
+        self.assertTrue(connected)
+        self.assertEqual(identity[0], {'id': '*1', 'name': 'core'})
+        self.assertIn(['/login', '=name=admin', '=password=password', '.tag=1'], self.server.sentences)
+
+
+class TestHotspotActiveMirror(unittest.IsolatedAsyncioTestCase):
+    """اختبار النسخة المحلية من الجلسات النشطة"""
+
+    async def wait_for(self, condition):
+        for _ in range(100):
+            if condition():
+                return
+            await asyncio.sleep(0.02)
+        self.fail("لم يتحقق الشرط في الوقت المحدد")
+
+    async def test_mirror_applies_listen_events(self):
+        """اختبار تحميل الجدول مرة واحدة ثم تطبيق أحداث listen"""
+        server = FakeRouterOsServer()
+        await server.start()
+        server.active_rows = [{'.id': '*1', 'user': 'card01', 'address': '10.5.50.2',
+                               'mac-address': 'AA:BB:CC:00:00:01', 'bytes-in': '10'}]
+        mirror = HotspotActiveMirror(MikroTikDevice('127.0.0.1', server.port, 'admin', 'password'))
+        mirror.start()
+
+        try:
+            await self.wait_for(lambda: mirror.ready)
+            self.assertEqual(mirror.find_by_user('card01')[0].ip_address, '10.5.50.2')
+
+            server.push({'.id': '*2', 'user': 'card02', 'address': '10.5.50.3',
+                         'mac-address': 'AA:BB:CC:00:00:02'})
+            server.push({'.id': '*1', '.dead': 'true'})
+            await self.wait_for(lambda: mirror.find_by_user('card02') and not mirror.find_by_user('card01'))
+
+            self.assertEqual(len(mirror), 1)
+            self.assertEqual(mirror.find_by_ip('10.5.50.3').name, 'card02')
+            self.assertEqual(mirror.find_by_mac('aa:bb:cc:00:00:02').name, 'card02')
+            self.assertIsNone(mirror.find_by_ip('10.5.50.2'))
+            print_commands = [w for w in server.sentences if w[0] == '/ip/hotspot/active/print']
+            self.assertEqual(len(print_commands), 1)
+        finally:
+            await mirror.stop()
+            await server.stop()
+
+    async def test_search_before_index_ready_filters_full_read(self):
+        """اختبار البحث الجزئي وبالتعليق بقراءة كاملة من الراوتر قبل جاهزية الفهرس"""
+        client = MikroTikAPIClient(MikroTikDevice("192.168.1.1", 8728, "admin", "password"))
+        client.get_hotspot_users = Mock(return_value=[
+            HotspotUser('mohamed', ''), HotspotUser('guest', '', comment='for Ahmed'),
+            HotspotUser('ahmed', ''), HotspotUser('card01', ''),
+        ])
+        async_client = AsyncMikroTikClient(client)
+        async_client.mirror_enabled = True
+        # فهرس لم يكتمل تحميله بعد
+        async_client.user_index = HotspotUserIndex(client.device)
+
+        users, total = await async_client.search_hotspot_users('med')
+        self.assertEqual((total, [user.name for user in users]), (3, ['ahmed', 'mohamed', 'guest']))
+        users, total = await async_client.search_hotspot_users('ahmed', offset=1, limit=1)
+        self.assertEqual((total, [user.name for user in users]), (2, ['guest']))
+
+    async def test_client_serves_active_users_from_mirror(self):
+        """اختبار خدمة الجلسات النشطة من الذاكرة دون طلب من الراوتر"""
+        client = MikroTikAPIClient(MikroTikDevice("192.168.1.1", 8728, "admin", "password"))
+        client.get_hotspot_active_users = Mock(return_value=[])
+        async_client = AsyncMikroTikClient(client)
+        async_client.mirror_enabled = True
+        async_client.active_mirror = HotspotActiveMirror(client.device)
+        async_client.active_mirror.load([{'.id': '*1', 'user': 'card01'}, {'.id': '*2', 'user': 'card02'}])
+
+        users = await async_client.find_hotspot_active_users(['card02'])
+
+        self.assertEqual([user.name for user in users], ['card02'])
+        self.assertEqual(len(await async_client.get_hotspot_active_users()), 2)
+        client.get_hotspot_active_users.assert_not_called()
+
+class TestHotspotUserIndex(unittest.TestCase):
+    """اختبار فهرس البحث في مستخدمي الهوتسبوت"""
+
+    def test_incomplete_mirror_fails_on_construction(self):
+        """اختبار رفض نسخة محلية لا تنفذ جميع دوال الفهارس عند إنشائها"""
+        class Incomplete(RouterTableMirror):
+            def _index(self, row_id, row):
+                pass
+
+        with self.assertRaises(TypeError):
+            Incomplete(MikroTikDevice("192.168.1.1", 8728, "admin", "password"), 60, 1)
+
+    def setUp(self):
+        self.index = HotspotUserIndex(MikroTikDevice("192.168.1.1", 8728, "admin", "password"))
+        rows = [{'.id': f'*{i}', 'name': f'card{i:05d}', 'comment': ''} for i in range(5000)]
+        rows += [
+            {'.id': '*a', 'name': 'ahmed', 'comment': 'room 12'},
+            {'.id': '*b', 'name': 'mohamed', 'comment': 'vip'},
+            {'.id': '*c', 'name': 'guest', 'comment': 'for ahmed'},
+            {'.id': '*d', 'name': 'ahmed2', 'comment': ''},
+        ]
+        self.index.load(rows)
+
+    def test_ranked_substring_search(self):
+        """اختبار ترتيب النتائج: تطابق تام ثم بداية الاسم ثم جزء منه ثم التعليق"""
+        users, total = self.index.search('AHMED')
+        self.assertEqual(total, 3)
+        self.assertEqual([user.name for user in users], ['ahmed', 'ahmed2', 'guest'])
+
+        users, total = self.index.search('med')
+        self.assertEqual([user.name for user in users], ['ahmed', 'ahmed2', 'mohamed', 'guest'])
+
+    def test_pagination(self):
+        """اختبار تقسيم النتائج إلى صفحات"""
+        users, total = self.index.search('card001', offset=10, limit=5)
+
+        self.assertEqual(total, 100)
+        self.assertEqual([user.name for user in users], [f'card{i:05d}' for i in range(110, 115)])
+
+    def test_incremental_updates(self):
+        """اختبار تحديث الفهرس بأحداث التعديل والحذف"""
+        self.index.apply({'.id': '*a', 'name': 'khaled'})
+        self.index.apply({'.id': '*b', '.dead': 'true'})
+
+        self.assertEqual([user.name for user in self.index.search('ahmed')[0]], ['ahmed2', 'guest'])
+        self.assertEqual(self.index.get('khaled').comment, 'room 12')
+        self.assertIsNone(self.index.get('mohamed'))
+        self.assertEqual(len(self.index), 5003)
+
+class TestListingPager(unittest.TestCase):
+    """اختبار تصفح القوائم الطويلة من لقطة"""
+
+    def test_pages_and_navigation(self):
+        """اختبار الصفحات وأزرار التنقل والقفز"""
+        pager = ListingPager(ttl=60, page_size=10)
+        snapshot = pager.put(1, 'hotspot_all', list(range(995)))
+
+        items, page, offset = pager.page(snapshot, 99)
+        self.assertEqual((items, page, offset), (list(range(990, 995)), 99, 990))
+        self.assertEqual(pager.page(snapshot, 500)[1], 99)
+
+        buttons = [button.callback_data for row in pager.keyboard(snapshot, 50, 'hotspot_all_page') for button in row]
+        self.assertEqual(buttons, ['hotspot_all_page:0', 'hotspot_all_page:49', 'hotspot_all_page:50',
+                                   'hotspot_all_page:51', 'hotspot_all_page:99',
+                                   'hotspot_all_page:40', 'hotspot_all_page:60'])
+
+    def test_snapshot_expires(self):
+        """اختبار انتهاء صلاحية اللقطة وفصل لقطات كل مستخدم"""
+        pager = ListingPager(ttl=0.05)
+        pager.put(1, 'hotspot_active', ['a'])
+
+        self.assertEqual(pager.get(1, 'hotspot_active').items, ['a'])
+        self.assertIsNone(pager.get(2, 'hotspot_active'))
+        time.sleep(0.06)
+        self.assertIsNone(pager.get(1, 'hotspot_active'))
+
+class TestRouterCache(unittest.TestCase):
+    """اختبار الذاكرة المؤقتة لقراءات الراوتر"""
+
+    def test_ttl_and_invalidation(self):
+        """اختبار انتهاء الصلاحية وإبطال المسار"""
+        cache = RouterCache({'/system/resource': 0.05, '/interface': 60})
+        loader = Mock(side_effect=lambda: ['rows'])
+        resource_key = make_key('/system/resource')
+        interface_key = make_key('/interface', {'stats': ''})
+
+        cache.get_or_load(resource_key, loader)
+        cache.get_or_load(resource_key, loader)
+        time.sleep(0.06)
+        cache.get_or_load(resource_key, loader)
+        cache.get_or_load(interface_key, loader)
+        cache.invalidate('/interface')
+        cache.get_or_load(interface_key, loader)
+
+        self.assertEqual(loader.call_count, 4)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 4)
+
+    def test_size_bound_evicts_least_recently_used(self):
+        """اختبار إزالة الأقدم استخداماً عند امتلاء الذاكرة"""
+        cache = RouterCache({'/interface': 60}, max_entries=2)
+        for name in ('a', 'b'):
+            cache.get_or_load(make_key('/interface', {'name': name}), lambda: name)
+        cache.get_or_load(make_key('/interface', {'name': 'a'}), lambda: 'reloaded')
+        cache.get_or_load(make_key('/interface', {'name': 'c'}), lambda: 'c')
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.get_or_load(make_key('/interface', {'name': 'a'}), lambda: 'reloaded'), 'a')
+        self.assertEqual(cache.get_or_load(make_key('/interface', {'name': 'b'}), lambda: 'reloaded'), 'reloaded')
+
+    def test_concurrent_misses_load_once(self):
+        """اختبار دمج الطلبات المتزامنة لنفس المسار في تحميل واحد"""
+        cache = RouterCache({'/system/routerboard': 60})
+        calls = []
+
+        def loader():
+            calls.append(1)
+            time.sleep(0.1)
+            return ['board']
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(pool.map(lambda _: cache.get_or_load(make_key('/system/routerboard'), loader),
+                                    range(4)))
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [['board']] * 4)
+
+    def test_client_write_invalidates_cached_reads(self):
+        """اختبار خدمة القراءات المتكررة من الذاكرة وإبطالها بعد إعادة التشغيل"""
+        client = MikroTikAPIClient(MikroTikDevice("192.168.1.1", 8728, "admin", "password"))
+        client.api = Mock()
+        client.api.get_resource.return_value.call_async.return_value.get.return_value = [
+            {'cpu-load': '5', 'total-memory': '100', 'free-memory': '50'}
+        ]
+
+        # الهوية لا تُخزن، أما الموارد ولوحة الراوتر فتُخدمان من الذاكرة
+        client.get_system_info()
+        client.get_system_info()
+        self.assertEqual(client.api.get_resource.return_value.call_async.call_count, 4)
+
+        client.reboot_system()
+        client.get_system_info()
+        self.assertEqual(client.api.get_resource.return_value.call_async.call_count, 7)
+        self.assertEqual(client.cache_stats()['hits'], 2)
+
+class TestUsageSampler(unittest.TestCase):
+    """اختبار حساب فروقات الاستهلاك وتجميعها"""
+
+    def setUp(self):
+        self.db_path = f"test_usage_{os.getpid()}.db"
+        self.db = DatabaseManager(self.db_path)
+        self.sampler = UsageSampler(self.db, RouterConnectionPool())
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    @staticmethod
+    def session(session_id, name, bytes_in, bytes_out, uptime):
+        return HotspotUser(name=name, password='', bytes_in=bytes_in, bytes_out=bytes_out, uptime=uptime,
+                           extra={'id': session_id})
+
+    def test_deltas_handle_new_sessions_and_resets(self):
+        """اختبار اعتماد العينة الأولى كبداية واحتساب الجلسات الجديدة وتصفير العدادات"""
+        first = [self.session('*1', 'ahmed', 1000, 500, '10m'), self.session('*2', 'sara', 300, 100, '1m')]
+        self.assertEqual(self.sampler.compute_deltas('r1', first), {})
+
+        second = [
+            self.session('*1', 'ahmed', 1500, 700, '11m'),
+            # نفس المعرف لكن مدة أقل: جلسة جديدة
+            self.session('*2', 'sara', 50, 20, '10s'),
+            self.session('*3', 'ahmed', 200, 100, '30s'),
+        ]
+        self.assertEqual(self.sampler.compute_deltas('r1', second),
+                         {'ahmed': (700, 300), 'sara': (50, 20)})
+
+        # الجلسات المنتهية لا تُحتسب ولا تبقى في الذاكرة
+        self.assertEqual(self.sampler.compute_deltas('r1', [self.session('*1', 'ahmed', 1600, 700, '12m')]),
+                         {'ahmed': (100, 0)})
+        self.assertEqual(list(self.sampler._sessions['r1']), ['*1'])
+
+    def test_failed_read_keeps_baseline(self):
+        """اختبار عدم تكرار احتساب الاستهلاك بعد فشل قراءة الجلسات"""
+        client = Mock()
+        client.device = 'r1'
+        client.get_hotspot_users = AsyncMock(return_value=[HotspotUser('ahmed', '', profile='1day')])
+        client.find_hotspot_active_users = AsyncMock(side_effect=[
+            [self.session('*1', 'ahmed', 1000, 500, '10m')],
+            None,
+            [self.session('*1', 'ahmed', 1500, 700, '12m')],
+        ])
+
+        self.assertEqual(asyncio.run(self.sampler.sample(client)), 0)
+        self.assertEqual(asyncio.run(self.sampler.sample(client)), 0)
+        self.assertEqual(asyncio.run(self.sampler.sample(client)), 1)
+        self.assertTrue(client.find_hotspot_active_users.await_args.kwargs['strict'])
+
+        top = self.db.get_top_usage('r1', 'user', 0)
+        self.assertEqual([(row['name'], row['bytes_in'], row['bytes_out']) for row in top], [('ahmed', 500, 200)])
+
+    def test_rollups_answer_top_usage(self):
+        """اختبار تجميع الفروقات حسب الدقة واستعلام الأكثر استهلاكاً"""
+        now = int(time.time())
+        self.db.record_usage('r1', [('user', 'ahmed', 100, 50), ('user', 'sara', 10, 5)], now - 7200)
+        self.db.record_usage('r1', [('user', 'ahmed', 100, 50)], now - 60)
+        self.db.record_usage('r2', [('user', 'sara', 5000, 0)], now)
+
+        top = self.db.get_top_usage('r1', 'user', now - 7 * 86400)
+        self.assertEqual([(row['name'], row['total_bytes']) for row in top], [('ahmed', 300), ('sara', 15)])
+
+        self.db.prune_usage({60: 3600, 3600: 90 * 86400, 86400: 730 * 86400}, now=now)
+        recent = self.db.get_top_usage('r1', 'user', now - 3 * 3600, resolution=60)
+        self.assertEqual([(row['name'], row['bytes_in']) for row in recent], [('ahmed', 100)])
+
+class TestCsvImporter(unittest.TestCase):
+    """اختبار قراءة ملف استيراد المستخدمين والتحقق من صفوفه"""
+
+    def test_rows_are_validated_one_by_one(self):
+        """اختبار سطر العناوين والقيم الافتراضية ورفض الصفوف الخاطئة والمكررة"""
+        lines = [
+            "Name;Password;MB;Hours;Comment\r\n",
+            "ahmed;p1;2048;48;room 12\r\n",
+            "\r\n",
+            "sara;;0;0;\r\n",
+            "ali;p3;abc;1;\r\n",
+            "ahmed;p4;;;\r\n",
+            "omar;p5\r\n",
+        ]
+        rows = list(iter_csv_users(lines))
+
+        accepted = [(line, user) for line, _, user, _ in rows if user]
+        rejected = [(line, name) for line, name, user, _ in rows if user is None]
+        self.assertEqual([(line, user.name) for line, user in accepted], [(2, 'ahmed'), (7, 'omar')])
+        self.assertEqual(rejected, [(4, 'sara'), (5, 'ali'), (6, 'ahmed')])
+
+        ahmed, omar = accepted[0][1], accepted[1][1]
+        self.assertEqual((ahmed.profile, ahmed.limit_bytes_total, ahmed.limit_uptime, ahmed.comment),
+                         ('default', '2048M', '48h', 'room 12'))
+        self.assertEqual((omar.limit_bytes_total, omar.limit_uptime), ('', ''))
+        self.assertTrue(omar.comment.startswith('Imported on'))
+
+    def test_header_after_leading_blank_lines(self):
+        """اختبار اكتشاف سطر العناوين في أول صف غير فارغ حتى بعد BOM وأسطر فارغة"""
+        lines = ["\ufeff\r\n", "\r\n", "name;pass;comment\r\n", "ahmed;p1;vip\r\n"]
+        rows = list(iter_csv_users(lines))
+
+        self.assertEqual([(line, name, error) for line, name, _, error in rows], [(4, 'ahmed', '')])
+        self.assertEqual((rows[0][2].password, rows[0][2].comment), ('p1', 'vip'))
+        self.assertEqual(list(iter_csv_users(["\r\n", "  \n"])), [])
+
+    def test_error_report(self):
+        """اختبار ملف تقرير الأخطاء"""
+        report = error_report_csv([(4, 'sara', 'اسم المستخدم وكلمة المرور مطلوبان')]).decode('utf-8-sig')
+        self.assertEqual(report.splitlines(), ['line,username,error', '4,sara,اسم المستخدم وكلمة المرور مطلوبان'])
+
+class TestCardReconciler(unittest.TestCase):
+    """اختبار مطابقة الكروت المحفوظة مع مستخدمي الراوتر"""
+
+    def setUp(self):
+        self.db_path = f"test_reconcile_{os.getpid()}.db"
+        self.db = DatabaseManager(self.db_path)
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    @staticmethod
+    def card(username, password='pw', data_quota_bytes=1024 ** 3, time_quota_seconds=86400):
+        return {'username': username, 'password': password, 'profile': 'default',
+                'data_quota_bytes': data_quota_bytes, 'time_quota_seconds': time_quota_seconds,
+                'validity_days': 30}
+
+    def test_diff_sets(self):
+        """اختبار استخراج الناقص والمختلف والمولد بلا كرت مع توحيد صيغ الحصص"""
+        expected = expected_users([self.card('c1'), self.card('c2'), self.card('c3'), self.card('c4')])
+        actual = {
+            # نفس الحصص بصيغة الراوتر
+            'c1': HotspotUser('c1', 'pw', limit_bytes_total='1073741824', limit_uptime='1d'),
+            'c2': HotspotUser('c2', 'changed', limit_bytes_total='1073741824', limit_uptime='1d',
+                              extra={'id': '*2'}),
+            'c3': HotspotUser('c3', 'pw', limit_bytes_total='', limit_uptime='1d', extra={'id': '*3'}),
+            'old': HotspotUser('old', 'x', comment='Generated on 2024-01-01'),
+            'manual': HotspotUser('manual', 'x', comment='owner'),
+        }
+        report = diff_cards(expected, actual)
+
+        self.assertEqual([user.name for user in report.missing], ['c4'])
+        self.assertEqual([user.name for user in report.orphaned], ['old'])
+        self.assertEqual(report.mismatched, {'c2': {'password': 'pw', 'id': '*2'},
+                                             'c3': {'limit-bytes-total': '1073741824', 'id': '*3'}})
+        self.assertEqual(report.in_sync, ['c1'])
+
+    def test_reconcile_reports_adds_and_updates_separately(self):
+        """اختبار فصل نتائج إضافة الناقص عن تصحيح المختلف"""
+        self.db.save_hotspot_cards(1, [self.card('c1'), self.card('c2'), self.card('c3')], device_id=7)
+        client = Mock()
+        client.find_hotspot_users = AsyncMock(return_value=[
+            HotspotUser('c1', 'changed', limit_bytes_total='1G', limit_uptime='1d', extra={'id': '*1'})
+        ])
+        client.add_hotspot_users = AsyncMock(return_value=BulkAddResult(added=['c2'], failed={'c3': 'x'}))
+        client.update_hotspot_users = AsyncMock(return_value=BulkAddResult(added=['c1']))
+
+        report = asyncio.run(CardReconciler(self.db, pool=None).reconcile(client, [7]))
+
+        self.assertEqual(report.added.added, ['c2'])
+        self.assertEqual(report.updated.added, ['c1'])
+        self.assertEqual(report.failed_count, 1)
+        provisioned = {card['username'] for card in self.db.get_device_cards([7]) if card['provisioned_at']}
+        self.assertEqual(provisioned, {'c2'})
+
+    def test_failed_router_read_skips_reconcile(self):
+        """اختبار عدم إضافة الكروت عند فشل قراءة مستخدمي الراوتر"""
+        self.db.save_hotspot_cards(1, [self.card('c1'), self.card('c2')], device_id=7)
+        client = Mock()
+        client.device = "r1"
+        client.find_hotspot_users = AsyncMock(return_value=None)
+        client.add_hotspot_users = AsyncMock()
+        client.update_hotspot_users = AsyncMock()
+
+        report = asyncio.run(CardReconciler(self.db, pool=None).reconcile(client, [7]))
+
+        self.assertIsNone(report)
+        self.assertTrue(client.find_hotspot_users.await_args.kwargs['strict'])
+        client.add_hotspot_users.assert_not_awaited()
+        client.update_hotspot_users.assert_not_awaited()
+        self.assertTrue(all(card['provisioned_at'] is None for card in self.db.get_device_cards([7])))
+
+    def test_device_cards_and_provisioning(self):
+        """اختبار ربط الكروت بالجهاز وتسجيل وقت إضافتها للراوتر"""
+        self.db.save_hotspot_cards(1, [self.card('c1'), self.card('c2')], device_id=7)
+        self.db.save_hotspot_cards(1, [self.card('c3')], device_id=8)
+        self.db.mark_cards_provisioned([7], ['c1', 'c3'])
+
+        cards = {card['username']: card for card in self.db.get_device_cards([7])}
+        self.assertEqual(sorted(cards), ['c1', 'c2'])
+        self.assertIsNotNone(cards['c1']['provisioned_at'])
+        self.assertIsNone(cards['c2']['provisioned_at'])
+        self.assertIsNone(self.db.get_device_cards([8])[0]['provisioned_at'])
+
+    def test_legacy_quotas_migrated(self):
+        """اختبار تحويل الحصص المنسقة في قاعدة بيانات قديمة إلى أرقام"""
+        os.remove(self.db_path)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute('''CREATE TABLE hotspot_cards (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                            telegram_user_id INTEGER, username TEXT, password TEXT, profile TEXT,
+                            data_quota TEXT, time_quota TEXT, validity_days INTEGER,
+                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+            conn.executemany(
+                'INSERT INTO hotspot_cards (telegram_user_id, username, password, profile, data_quota, time_quota, '
+                'validity_days) VALUES (1, ?, ?, ?, ?, ?, 30)',
+                [('c1', 'pw', 'default', '1.5 GB', '2 يوم و 3 ساعة'),
+                 ('c2', 'pw', 'default', '512 MB', '12 ساعة'),
+                 ('c3', 'pw', 'default', 'غير محدود', 'غير محدود')])
+
+        cards = {card['username']: card for card in DatabaseManager(self.db_path).get_user_hotspot_cards(1)}
+        self.assertEqual((cards['c1']['data_quota_bytes'], cards['c1']['time_quota_seconds']),
+                         (1536 * 1024 ** 2, 51 * 3600))
+        self.assertEqual((cards['c2']['data_quota_bytes'], cards['c2']['time_quota_seconds']),
+                         (512 * 1024 ** 2, 12 * 3600))
+        self.assertEqual((cards['c3']['data_quota_bytes'], cards['c3']['time_quota_seconds']), (0, 0))
+        self.assertEqual(expected_users([cards['c1']])['c1'].limit_uptime, f"{51 * 3600}s")
+
+    def test_series_saved_and_expected(self):
+        """اختبار حفظ السلسلة كسجل واحد وإعادة توليد كروتها للمطابقة"""
+        generator = HotspotCardGenerator()
+        series = generator.create_card_series(50, "v", start=self.db.next_series_serial("v", 6))
+        self.assertIsNotNone(self.db.save_card_series(1, series, device_id=7))
+        self.assertEqual(self.db.next_series_serial("v", 6), 50)
+
+        loaded = self.db.get_device_series([7])[0]
+        self.assertEqual(loaded.secret, series.secret)
+        self.assertEqual([(c.username, c.password) for c in generator.generate_series_cards(loaded)],
+                         [(c.username, c.password) for c in generator.generate_series_cards(series)])
+
+        users = series_users(loaded)
+        self.assertEqual(len(users), 50)
+        self.assertEqual(users['v000049'].password, generator.series_password(series, 49))
+        self.assertEqual(self.db.get_device_series([8]), [])
+
+class TestTopTalkers(unittest.TestCase):
+    """اختبار ترتيب الأكثر استهلاكاً والتجميع لكل بروفايل وسيرفر"""
+
+    @staticmethod
+    def sessions(extra_bytes=0):
+        # صفوف /ip/hotspot/active كما يعيدها الراوتر
+        rows = [{'user': f"u{i}", 'server': 'hs1' if i % 2 else 'hs2', 'mac-address': f"M{i}",
+                 'bytes-in': str(i * 1000 + (extra_bytes if i == 7 else 0)), 'bytes-out': '0',
+                 'uptime': f"{5000 - i}s"}
+                for i in range(5000)]
+        return [parse_active_user(row) for row in rows]
+
+    def test_rank_and_aggregate(self):
+        """اختبار أعلى N بكل مقياس والإجماليات والمعدل من تحديثين"""
+        talkers = TopTalkers(count=3)
+        profiles = {f"u{i}": 'gold' if i < 10 else 'basic' for i in range(5000)}
+
+        first = talkers.build('r1', self.sessions(), profiles, now=100.0)
+        self.assertEqual([user.name for _, user in first.top['bytes']], ['u4999', 'u4998', 'u4997'])
+        self.assertEqual([user.name for _, user in first.top['uptime']], ['u0', 'u1', 'u2'])
+        self.assertFalse(first.has_rates)
+        self.assertEqual(first.by_profile['gold'].sessions, 10)
+        self.assertEqual(first.by_server['hs1'].sessions, 2500)
+        self.assertEqual(first.by_profile['gold'].total_bytes + first.by_profile['basic'].total_bytes,
+                         sum(i * 1000 for i in range(5000)))
+
+        second = talkers.build('r1', self.sessions(extra_bytes=1_000_000), profiles, now=110.0)
+        self.assertTrue(second.has_rates)
+        self.assertEqual(second.top['rate'][0], (800_000, second.top['rate'][0][1]))
+        self.assertEqual(second.top['rate'][0][1].name, 'u7')
+
+class TestUserSelector(unittest.TestCase):
+    """اختبار شروط اختيار المستخدمين للعمليات الجماعية"""
+
+    def test_parse_and_match(self):
+        """اختبار تحليل الشروط ومطابقتها"""
+        selector = parse_user_selector("profile=monthly name=card* min_mb=1 disabled=no")
+        self.assertEqual(selector.name_prefix, 'card')
+        self.assertEqual(selector.min_bytes, 1024 * 1024)
+        self.assertTrue(selector.matches(HotspotUser('card7', '', profile='monthly'), 2 * 1024 * 1024))
+        self.assertTrue(selector.matches(HotspotUser('card7', '', profile='monthly')))
+        self.assertFalse(selector.matches(HotspotUser('card7', '', profile='monthly'), 10))
+        self.assertFalse(selector.matches(HotspotUser('vip7', '', profile='monthly')))
+        self.assertFalse(selector.matches(HotspotUser('card7', '', profile='monthly', disabled=True)))
+
+        for text in ("", "profile", "size=5", "min_mb=abc", "disabled=maybe"):
+            with self.assertRaises(ValueError):
+                parse_user_selector(text)
+
+class TestBulkAction(unittest.IsolatedAsyncioTestCase):
+    """اختبار تنفيذ العمليات الجماعية من قائمة الهوتسبوت"""
+
+    def setUp(self):
+        self.db_path = f"test_bulk_{os.getpid()}.db"
+        self.manager = HotspotManager(DatabaseManager(self.db_path))
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    async def test_disable_kicks_sessions_of_disabled_users(self):
+        """اختبار قطع جلسات المستخدمين الذين عُطلوا فعلاً حتى مع شرط disabled=no"""
+        client = Mock()
+        client.is_connected = Mock(return_value=True)
+        client.select_hotspot_users = AsyncMock(return_value=[HotspotUser('a', ''), HotspotUser('b', '')])
+        client.set_hotspot_users_disabled = AsyncMock(return_value=BulkAddResult(added=['a'], failed={'b': 'x'}))
+        sessions = [HotspotUser('a', '', ip_address='10.0.0.5', extra={'id': '*1'})]
+        client.find_hotspot_active_users = AsyncMock(return_value=sessions)
+        client.remove_hotspot_sessions = AsyncMock(return_value=BulkAddResult(added=['a']))
+        client.select_hotspot_sessions = AsyncMock(return_value=[])
+
+        query = Mock()
+        query.from_user.id = 1
+        query.edit_message_text = AsyncMock()
+        context = Mock()
+        context.user_data = {'bulk_selector': parse_user_selector("name=card* disabled=no")}
+        context.bot_data = {'handlers': Mock(get_user_connection=Mock(return_value=client))}
+
+        await self.manager.handle_bulk_action(query, context, 'disable')
+
+        client.find_hotspot_active_users.assert_awaited_once_with(['a'], extra_fields=('.id',))
+        client.remove_hotspot_sessions.assert_awaited_once_with(sessions)
+        client.select_hotspot_sessions.assert_not_awaited()
+        self.assertIn("جلسات تم قطعها: 1", query.edit_message_text.await_args.args[0])
+
+    async def test_card_request_checks_router_profiles(self):
+        """اختبار رفض طلب الكروت ببروفايل غير موجود على الراوتر"""
+        client = Mock()
+        client.is_connected = Mock(return_value=True)
+        client.get_hotspot_profiles = AsyncMock(return_value=['default', 'monthly'])
+        handlers = Mock(get_user_connection=Mock(return_value=client))
+        handlers.card_jobs.submit = AsyncMock(return_value=1)
+
+        update = Mock()
+        update.effective_user.id = 1
+        update.message.reply_text = AsyncMock()
+        context = Mock()
+        context.user_data = {}
+        context.bot_data = {'handlers': handlers}
+
+        update.message.text = "10:user:gold:1024:24:30"
+        await self.manager.handle_card_generation_params(update, context)
+        self.assertIn("monthly", update.message.reply_text.await_args.args[0])
+        handlers.card_jobs.submit.assert_not_awaited()
+
+        update.message.text = "10:user:monthly:1024:24:30"
+        await self.manager.handle_card_generation_params(update, context)
+        self.assertEqual(handlers.card_jobs.submit.await_args.args[4]['profile'], 'monthly')
+
+    async def test_import_reports_every_failed_row(self):
+        """اختبار تسجيل كل صف في تقرير الأخطاء عند رفض الراوتر لاسم يتكرر في الدفعة"""
+        client = Mock()
+        client.is_connected = Mock(return_value=True)
+        client.add_hotspot_users = AsyncMock(return_value=BulkAddResult(added=['sara'], failed={'Ali': 'exists'}))
+
+        telegram_file = Mock()
+        telegram_file.download_to_memory = AsyncMock(
+            side_effect=lambda out: out.write(b"\r\nname,pass\r\nAli,p1\r\nsara,p2\r\nAli ,p3\r\n"))
+        update = Mock()
+        update.effective_user.id = 1
+        update.message.document.file_size = 100
+        update.message.document.file_name = "users.csv"
+        update.message.document.get_file = AsyncMock(return_value=telegram_file)
+        update.message.reply_text = AsyncMock(return_value=Mock(edit_text=AsyncMock()))
+        update.message.reply_document = AsyncMock()
+        context = Mock()
+        context.user_data = {}
+        context.bot_data = {'handlers': Mock(get_user_connection=Mock(return_value=client))}
+
+        with patch('hotspot_manager.iter_csv_users', side_effect=lambda lines: [
+                (3, 'Ali', HotspotUser('Ali', 'p1'), ''), (4, 'sara', HotspotUser('sara', 'p2'), ''),
+                (5, 'Ali', HotspotUser('Ali', 'p3'), '')]):
+            await self.manager.handle_import_document(update, context)
+
+        report = update.message.reply_document.await_args.kwargs['document'].decode('utf-8-sig')
+        self.assertEqual(report.splitlines()[1:], ['3,Ali,exists', '5,Ali,exists'])
+
+class TestCardExpiryEnforcer(unittest.IsolatedAsyncioTestCase):
+    """اختبار تطبيق انتهاء صلاحية الكروت على الراوتر"""
+
+    def setUp(self):
+        self.db_path = f"test_expiry_{os.getpid()}.db"
+        self.db = DatabaseManager(self.db_path)
+        cards = [{'username': f"c{i}", 'password': 'pw', 'profile': 'default', 'data_quota_bytes': 0,
+                  'time_quota_seconds': 0, 'validity_days': 0 if i == 4 else 30} for i in range(5)]
+        self.db.save_hotspot_cards(1, cards, device_id=7)
+        # c0..c2 منتهية، c3 سارية، c4 بلا مدة صلاحية
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE hotspot_cards SET expires_at = datetime('now', '-1 day') "
+                         "WHERE username IN ('c0', 'c1', 'c2')")
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    async def test_expired_cards_processed_once(self):
+        """اختبار حذف المنتهية الموجودة على الراوتر وتسجيل الغائبة وعدم إعادة فحصها"""
+        client = Mock()
+        client.device = "r1"
+        client.check_connection = AsyncMock(return_value=True)
+        client.find_hotspot_users = AsyncMock(return_value=[
+            HotspotUser('c0', '', extra={'id': '*0'}), HotspotUser('c1', '', extra={'id': '*1'})
+        ])
+        client.remove_hotspot_users = AsyncMock(return_value=BulkAddResult(added=['c0'], failed={'c1': 'busy'}))
+        client.find_hotspot_active_users = AsyncMock(return_value=[])
+
+        self.assertEqual([card['username'] for card in self.db.get_expired_cards([7])], ['c0', 'c1', 'c2'])
+        enforcer = CardExpiryEnforcer(self.db, pool=None, batch_size=3)
+        totals = await enforcer.enforce(client, [7])
+
+        self.assertEqual(totals, {'removed': 1, 'missing': 1})
+        self.assertEqual(client.find_hotspot_users.await_args.kwargs['names'], ['c0', 'c1', 'c2'])
+        client.find_hotspot_active_users.assert_awaited_with(['c0'], extra_fields=('.id',))
+        # الفاشل يبقى للجولة التالية، والسارية ليست ضمن المنتهية ولا تُعاد إلى الراوتر بالمطابقة
+        self.assertEqual([card['username'] for card in self.db.get_expired_cards([7])], ['c1'])
+        self.assertEqual(sorted(card['username'] for card in self.db.get_device_cards([7])), ['c3', 'c4'])
+
+    async def test_lookup_failure_keeps_cards_pending(self):
+        """اختبار عدم تسجيل الكروت كغائبة عند فشل قراءة المستخدمين من الراوتر"""
+        client = Mock()
+        client.device = "r1"
+        client.check_connection = AsyncMock(return_value=True)
+        client.find_hotspot_users = AsyncMock(return_value=None)
+        client.remove_hotspot_users = AsyncMock()
+
+        totals = await CardExpiryEnforcer(self.db, pool=None, batch_size=3).enforce(client, [7])
+
+        self.assertEqual(totals, {})
+        self.assertTrue(client.find_hotspot_users.await_args.kwargs['strict'])
+        client.remove_hotspot_users.assert_not_awaited()
+        self.assertEqual([card['username'] for card in self.db.get_expired_cards([7])], ['c0', 'c1', 'c2'])
+
+    async def test_expired_series_processed(self):
+        """اختبار حذف كروت السلسلة المنتهية بأسمائها المشتقة وتسجيل السلسلة مرة واحدة"""
+        generator = HotspotCardGenerator()
+        series = generator.create_card_series(5, "s", validity_days=1)
+        self.db.save_card_series(1, series, device_id=7)
+        live = generator.create_card_series(5, "t", validity_days=30)
+        self.db.save_card_series(1, live, device_id=7)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE hotspot_cards SET expires_at = NULL")
+            conn.execute("UPDATE card_series SET expires_at = datetime('now', '-1 day') WHERE id = ?",
+                         (series.id,))
+
+        client = Mock()
+        client.device = "r1"
+        client.check_connection = AsyncMock(return_value=True)
+        client.find_hotspot_users = AsyncMock(
+            side_effect=lambda names, **kwargs: [HotspotUser(name, '', extra={'id': name}) for name in names
+                                                 if name != 's000004'])
+        client.remove_hotspot_users = AsyncMock(
+            side_effect=lambda users: BulkAddResult(added=[user.name for user in users]))
+        client.find_hotspot_active_users = AsyncMock(return_value=[])
+
+        enforcer = CardExpiryEnforcer(self.db, pool=None, batch_size=3)
+        self.assertEqual(await enforcer.enforce(client, [7]), {'removed': 4, 'missing': 1})
+        names = [name for call in client.find_hotspot_users.await_args_list for name in call.kwargs['names']]
+        self.assertEqual(names, [series.username(serial) for serial in range(5)])
+        self.assertEqual(self.db.get_expired_series([7]), [])
+        self.assertEqual(await enforcer.enforce(client, [7]), {})
+        self.assertEqual([s.id for s in self.db.get_device_series([7])], [live.id])
+
+    async def test_series_kept_when_lookup_fails(self):
+        """اختبار إبقاء السلسلة المنتهية للجولة التالية عند فشل قراءة المستخدمين"""
+        series = HotspotCardGenerator().create_card_series(5, "s", validity_days=1)
+        self.db.save_card_series(1, series, device_id=7)
+        with sqlite3.connect(self.db_path) as conn:
+            conn.execute("UPDATE hotspot_cards SET expires_at = NULL")
+            conn.execute("UPDATE card_series SET expires_at = datetime('now', '-1 day')")
+
+        client = Mock()
+        client.device = "r1"
+        client.check_connection = AsyncMock(return_value=True)
+        client.find_hotspot_users = AsyncMock(return_value=None)
+
+        await CardExpiryEnforcer(self.db, pool=None, batch_size=3).enforce(client, [7])
+        self.assertEqual([s.id for s in self.db.get_expired_series([7])], [series.id])
+
+class TestPdfRenderService(unittest.IsolatedAsyncioTestCase):
+    """اختبار رسم ملفات PDF في مجمع العمليات"""
+
+    async def asyncSetUp(self):
+        self.service = PdfRenderService(workers=2, pages_per_part=1)
+        self.cards = HotspotCardGenerator().generate_cards(20, "user", "default", 1024, 24, 30)
+
+    async def asyncTearDown(self):
+        self.service.shutdown(wait=True)
+
+    def test_split_by_pages(self):
+        """اختبار تقسيم الدفعة إلى أجزاء بصفحات كاملة (فقط عند توفر pypdf للدمج)"""
+        per_page = HotspotCardGenerator().cards_per_page()
+        with patch('pdf_renderer.PdfWriter', object):
+            self.assertEqual(self.service.split(self.cards), [0, per_page, 2 * per_page])
+        with patch('pdf_renderer.PdfWriter', None):
+            self.assertEqual(self.service.split(self.cards), [0])
+
+    async def test_parts_share_batch_qr_version(self):
+        """اختبار رسم جميع الأجزاء بإصدار QR الدفعة كاملة"""
+        generator = HotspotCardGenerator()
+        self.cards[-1].username = "u" * 120
+        self.service._executor = ThreadPoolExecutor(max_workers=2)
+        with patch('pdf_renderer.PdfWriter', object), \
+                patch('pdf_renderer._render_part', return_value=b'%PDF') as render_part, \
+                patch('pdf_renderer.merge_parts'):
+            await self.service.render(self.cards)
+
+        versions = {call.args[3] for call in render_part.call_args_list}
+        self.assertEqual(render_part.call_count, 3)
+        self.assertEqual(versions, {generator.batch_qr_version(self.cards)})
+        self.assertGreater(versions.pop(), generator.batch_qr_version(self.cards[:-1]))
+
+    async def test_render(self):
+        """اختبار رسم الدفعة كاملة خارج حلقة الأحداث"""
+        with await self.service.render(self.cards) as output:
+            pdf_data = output.read()
+        self.assertTrue(pdf_data.startswith(b'%PDF'))
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', pdf_data)), 3)
+
+class TestCardJobQueue(unittest.IsolatedAsyncioTestCase):
+    """اختبار مهام توليد الكروت في الخلفية واستئنافها"""
+
+    def setUp(self):
+        self.db_path = f"test_card_jobs_{os.getpid()}.db"
+        self.db = DatabaseManager(self.db_path)
+        self.db.add_user(1, "operator")
+        self.device_id = self.db.add_mikrotik_device(1, MikroTikDevice("10.0.0.1", 8728, "admin", "pw"))
+
+        self.client = Mock()
+        self.client.find_hotspot_users = AsyncMock(return_value=[])
+        self.client.add_hotspot_users = AsyncMock(
+            side_effect=lambda users: BulkAddResult(added=[user.name for user in users]))
+        self.pool = Mock()
+        self.pool.acquire = AsyncMock(return_value=self.client)
+        self.pool.release = AsyncMock()
+        self.renderer = Mock()
+        self.renderer.render = AsyncMock(side_effect=lambda cards: io.BytesIO(b'%PDF'))
+        self.bot = AsyncMock()
+        self.queue = CardJobQueue(self.db, self.pool, HotspotCardGenerator(), self.renderer, batch_size=4)
+        self.params = {'count': 10, 'prefix': 'job', 'profile': 'default', 'data_quota_mb': 1024,
+                       'time_quota_hours': 24, 'validity_days': 30, 'series': False}
+
+    def tearDown(self):
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+
+    async def test_job_runs_all_stages(self):
+        """اختبار تنفيذ المراحل بالترتيب: توليد وحفظ ثم PDF ثم الإضافة للراوتر على دفعات"""
+        job_id = await self.queue.submit(1, 100, 200, self.device_id, self.params)
+        await self.queue.process(self.bot, job_id)
+
+        job = self.db.get_card_job(job_id)
+        self.assertEqual(job['status'], 'done')
+        cards = self.db.get_job_cards(job_id)
+        self.assertEqual(len(cards), 10)
+        self.assertTrue(all(card['provisioned_at'] for card in cards))
+        self.bot.send_document.assert_awaited_once()
+        self.assertEqual(self.client.add_hotspot_users.await_count, 3)
+        self.pool.release.assert_awaited_once()
+        self.assertEqual(self.bot.edit_message_text.await_args.kwargs['message_id'], 200)
+
+    async def test_resume_from_saved_stage(self):
+        """اختبار الاستئناف دون إعادة التوليد أو الرسم، وإضافة غير الموجود على الراوتر فقط"""
+        job_id = self.db.create_card_job(1, 100, 200, self.device_id, self.params)
+        cards = HotspotCardGenerator().generate_cards(5, "job", "default", 1024, 24, 30)
+        self.db.save_hotspot_cards(1, [{
+            'username': card.username, 'password': card.password, 'profile': card.profile,
+            'data_quota_bytes': card.data_quota_bytes, 'time_quota_seconds': card.time_quota_seconds,
+            'validity_days': card.validity_days
+        } for card in cards], self.device_id, job_id)
+        self.db.update_card_job(job_id, 'provisioning')
+        self.client.find_hotspot_users.return_value = [HotspotUser(cards[0].username, '')]
+
+        self.assertEqual(await self.queue.resume(), 1)
+        await self.queue.process(self.bot, await self.queue._queue.get())
+
+        self.assertEqual(self.db.get_card_job(job_id)['status'], 'done')
+        self.assertEqual(len(self.db.get_job_cards(job_id)), 5)
+        self.renderer.render.assert_not_awaited()
+        added = [user.name for user in self.client.add_hotspot_users.await_args.args[0]]
+        self.assertEqual(added, [card.username for card in cards[1:]])
+        self.assertEqual(self.db.get_unfinished_card_jobs(), [])
+
+    async def test_pdf_not_resent_after_upload(self):
+        """اختبار حفظ مرحلة الإضافة فور إرسال الملف حتى لا يُعاد إرساله عند الاستئناف"""
+        # توقف البوت أثناء الإضافة إلى الراوتر
+        self.client.find_hotspot_users.side_effect = [[], asyncio.CancelledError()]
+        job_id = await self.queue.submit(1, 100, 200, self.device_id, self.params)
+        with self.assertRaises(asyncio.CancelledError):
+            await self.queue.process(self.bot, job_id)
+        self.assertEqual(self.db.get_card_job(job_id)['status'], 'provisioning')
+
+        self.client.find_hotspot_users.side_effect = None
+        self.assertEqual(await self.queue.resume(), 1)
+        await self.queue.process(self.bot, await self.queue._queue.get())
+
+        self.assertEqual(self.db.get_card_job(job_id)['status'], 'done')
+        self.bot.send_document.assert_awaited_once()
+        self.renderer.render.assert_awaited_once()
+
+    async def test_failed_router_read_fails_job(self):
+        """اختبار فشل المهمة عند تعذر قراءة الراوتر بدلاً من اعتباره فارغاً"""
+        self.client.device = "r1"
+        job_id = await self.queue.submit(1, 100, 200, self.device_id, self.params)
+        self.db.update_card_job(job_id, 'rendering')
+        self.client.find_hotspot_users.return_value = None
+        await self.queue.process(self.bot, job_id)
+
+        self.assertEqual(self.db.get_card_job(job_id)['status'], 'failed')
+        self.assertTrue(self.client.find_hotspot_users.await_args.kwargs['strict'])
+        self.client.add_hotspot_users.assert_not_awaited()
+        self.pool.release.assert_awaited_once()
+
+    async def test_failed_job_reported(self):
+        """اختبار تسجيل فشل المهمة وإبلاغ المستخدم"""
+        self.renderer.render.side_effect = RuntimeError("boom")
+        job_id = await self.queue.submit(1, 100, 200, None, self.params)
+        await self.queue.process(self.bot, job_id)
+
+        job = self.db.get_card_job(job_id)
+        self.assertEqual(job['status'], 'failed')
+        self.assertEqual(job['error_message'], "boom")
+        self.assertIn("boom", self.bot.edit_message_text.await_args.args[0])
+        self.pool.acquire.assert_not_awaited()
+
 def run_basic_tests():
     """تشغيل الاختبارات الأساسية"""
     print("🧪 بدء تشغيل الاختبارات الأساسية...")
@@ -0,0 +1,123 @@
+"""
+الأكثر استهلاكاً بين الجلسات النشطة
+
+يُرتب أعلى N جلسة بالبيانات أو المعدل أو مدة الاتصال باختيار جزئي عبر
+كومة (heapq.nlargest) دون ترتيب جميع الجلسات، وتُجمع الإجماليات لكل
+بروفايل ولكل سيرفر في مرور واحد. تُخزن النتيجة لكل راوتر لمدة التحديث،
+والمعدل هو فرق العدادات بين تحديثين متتاليين.
+"""
+
+import heapq
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from config import TOP_TALKERS_REFRESH, TOP_TALKERS_COUNT
+from mikrotik_api_client import parse_duration
+from models import HotspotUser
+
+METRICS = ('bytes', 'rate', 'uptime')
+
+
+@dataclass
+class GroupTotals:
+    """إجماليات مجموعة من الجلسات (بروفايل أو سيرفر)"""
+    sessions: int = 0
+    bytes_in: int = 0
+    bytes_out: int = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self.bytes_in + self.bytes_out
+
+
+@dataclass
+class TalkersSnapshot:
+    """ترتيب الجلسات النشطة لراوتر واحد في لحظة معينة"""
+    session_count: int
+    top: Dict[str, List[Tuple[int, HotspotUser]]]  # المقياس -> [(القيمة، الجلسة)]
+    by_profile: Dict[str, GroupTotals]
+    by_server: Dict[str, GroupTotals]
+    has_rates: bool = False
+    created_at: float = field(default_factory=time.monotonic)
+
+
+def _session_key(session: HotspotUser) -> Tuple[str, str]:
+    return session.name, session.mac_address or ''
+
+
+class TopTalkers:
+    """ترتيب الأكثر استهلاكاً مع تخزين النتيجة لكل راوتر"""
+
+    def __init__(self, refresh_interval: float = TOP_TALKERS_REFRESH, count: int = TOP_TALKERS_COUNT):
+        self.refresh_interval = refresh_interval
+        self.count = count
+        self._snapshots: Dict[str, TalkersSnapshot] = {}
+        # router -> (وقت العينة، (المستخدم، MAC) -> إجمالي البايتات)
+        self._counters: Dict[str, Tuple[float, Dict[Tuple[str, str], int]]] = {}
+
+    def build(self, router: str, sessions: List[HotspotUser], profiles: Dict[str, str],
+              now: float = None) -> TalkersSnapshot:
+        """حساب الترتيب والإجماليات من قائمة الجلسات (ذاكرة بحجم N والمجموعات فقط)"""
+        now = time.monotonic() if now is None else now
+        previous_at, previous = self._counters.get(router, (None, {}))
+        elapsed = now - previous_at if previous_at is not None else 0
+
+        counters = {}
+        rates: Dict[Tuple[str, str], int] = {}
+        by_profile: Dict[str, GroupTotals] = {}
+        by_server: Dict[str, GroupTotals] = {}
+
+        for session in sessions:
+            key = _session_key(session)
+            total = session.total_bytes_used
+            counters[key] = total
+            last = previous.get(key)
+            if elapsed > 0 and last is not None and total >= last:
+                rates[key] = int((total - last) * 8 / elapsed)
+
+            for groups, group in ((by_profile, profiles.get(session.name, 'unknown')),
+                                  (by_server, session.server or 'all')):
+                totals = groups.setdefault(group, GroupTotals())
+                totals.sessions += 1
+                totals.bytes_in += session.bytes_in or 0
+                totals.bytes_out += session.bytes_out or 0
+
+        self._counters[router] = (now, counters)
+
+        values = {
+            'bytes': lambda session: session.total_bytes_used,
+            'rate': lambda session: rates.get(_session_key(session), 0),
+            'uptime': lambda session: parse_duration(session.uptime),
+        }
+        top = {
+            metric: [(value(session), session)
+                     for session in heapq.nlargest(self.count, sessions, key=value)]
+            for metric, value in values.items()
+        }
+
+        snapshot = TalkersSnapshot(len(sessions), top, by_profile, by_server, has_rates=bool(rates))
+        self._snapshots[router] = snapshot
+        return snapshot
+
+    def get(self, router: str) -> Optional[TalkersSnapshot]:
+        """الترتيب المخزن إن كان ضمن مدة التحديث، وإلا None"""
+        snapshot = self._snapshots.get(router)
+        if snapshot is None or time.monotonic() - snapshot.created_at >= self.refresh_interval:
+            return None
+        return snapshot
+
+    async def snapshot(self, client, refresh: bool = False) -> TalkersSnapshot:
+        """ترتيب الجلسات النشطة للراوتر (من الذاكرة ضمن مدة التحديث)"""
+        router = str(client.device)
+        snapshot = None if refresh else self.get(router)
+        if snapshot is not None:
+            return snapshot
+
+        # معرف الجلسة يُطلب صراحةً فتأتي العدادات الحالية من الراوتر وليس من النسخة المحلية
+        sessions = await client.get_hotspot_active_users(extra_fields=('.id',))
+        # البروفايل غير موجود في الجلسات النشطة، فيُقرأ من قائمة المستخدمين (من الفهرس إن كان جاهزاً)
+        profiles = {}
+        if sessions:
+            profiles = {user.name: user.profile for user in await client.get_hotspot_users()}
+        return self.build(router, sessions, profiles)
@@ -0,0 +1,132 @@
+"""
+تسجيل استهلاك الهوتسبوت على فترات
+
+يقرأ عدادات الجلسات النشطة دورياً ويحوّلها إلى فروقات منذ العينة السابقة
+(مع معالجة تصفير العدادات وبدء جلسة جديدة)، ثم يجمعها لكل مستخدم ولكل
+بروفايل في جدول usage_rollups بدقة دقيقة وساعة ويوم.
+"""
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from config import USAGE_SAMPLE_INTERVAL, USAGE_RETENTION, USAGE_PROFILE_REFRESH
+from connection_pool import RouterConnectionPool
+from database import DatabaseManager
+from mikrotik_api_client import parse_duration
+from models import HotspotUser
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class SessionCounters:
+    """آخر عدادات معروفة لجلسة نشطة"""
+    bytes_in: int
+    bytes_out: int
+    uptime: int
+
+
+class UsageSampler:
+    """جامع عينات الاستهلاك لجميع الراوترات المتصلة"""
+
+    def __init__(self, db: DatabaseManager, pool: RouterConnectionPool,
+                 interval: float = USAGE_SAMPLE_INTERVAL):
+        self.db = db
+        self.pool = pool
+        self.interval = interval
+        # router -> (session id -> counters)
+        self._sessions: Dict[str, Dict[str, SessionCounters]] = {}
+        # router -> (وقت آخر تحديث، اسم المستخدم -> البروفايل)
+        self._profiles: Dict[str, Tuple[float, Dict[str, str]]] = {}
+        self._last_prune = 0.0
+
+    def compute_deltas(self, router: str, sessions: List[HotspotUser]) -> Dict[str, Tuple[int, int]]:
+        """
+        فروقات الاستهلاك لكل مستخدم منذ العينة السابقة
+
+        الجلسات الموجودة عند أول عينة للراوتر تُعتمد كنقطة بداية فقط، أما الجلسة
+        التي تظهر لاحقاً فكل عداداتها استهلاك جديد. نقصان العداد أو مدة الاتصال
+        يعني جلسة جديدة بنفس المعرف فتُحتسب قيمتها الحالية كاملة.
+        """
+        first_sample = router not in self._sessions
+        previous = self._sessions.get(router, {})
+        current: Dict[str, SessionCounters] = {}
+        deltas: Dict[str, Tuple[int, int]] = {}
+
+        for session in sessions:
+            session_id = session.extra.get('id') or f"{session.name}/{session.mac_address}"
+            counters = SessionCounters(session.bytes_in or 0, session.bytes_out or 0,
+                                       parse_duration(session.uptime))
+            current[session_id] = counters
+
+            last = previous.get(session_id)
+            if last is None:
+                if first_sample:
+                    continue
+                delta_in, delta_out = counters.bytes_in, counters.bytes_out
+            elif (counters.uptime < last.uptime or counters.bytes_in < last.bytes_in
+                  or counters.bytes_out < last.bytes_out):
+                delta_in, delta_out = counters.bytes_in, counters.bytes_out
+            else:
+                delta_in, delta_out = counters.bytes_in - last.bytes_in, counters.bytes_out - last.bytes_out
+
+            if delta_in or delta_out:
+                total_in, total_out = deltas.get(session.name, (0, 0))
+                deltas[session.name] = (total_in + delta_in, total_out + delta_out)
+
+        # الجلسات المنتهية تُحذف تلقائياً باستبدال القاموس
+        self._sessions[router] = current
+        return deltas
+
+    async def _user_profiles(self, router: str, client) -> Dict[str, str]:
+        """بروفايل كل مستخدم (الجلسات النشطة لا تحتوي على البروفايل)"""
+        refreshed_at, profiles = self._profiles.get(router, (0.0, {}))
+        if time.monotonic() - refreshed_at >= USAGE_PROFILE_REFRESH:
+            users = await client.get_hotspot_users()
+            if users:
+                profiles = {user.name: user.profile for user in users}
+                self._profiles[router] = (time.monotonic(), profiles)
+        return profiles
+
+    async def sample(self, client) -> int:
+        """أخذ عينة من راوتر واحد وتسجيل فروقاتها؛ يعيد عدد المستخدمين المسجلين"""
+        router = str(client.device)
+        # معرف الجلسة يُطلب صراحةً فتأتي العدادات من الراوتر مباشرة وليس من النسخة المحلية
+        sessions = await client.find_hotspot_active_users(extra_fields=('.id',), strict=True)
+        if sessions is None:
+            # القائمة الفارغة كانت ستمحو خط الأساس فتُحسب العدادات كاملة مرة أخرى في العينة التالية
+            logger.warning(f"تعذر قراءة الجلسات النشطة من {router}؛ تخطي العينة")
+            return 0
+        deltas = self.compute_deltas(router, sessions)
+        if not deltas:
+            return 0
+
+        profiles = await self._user_profiles(router, client)
+        by_profile: Dict[str, Tuple[int, int]] = {}
+        for name, (bytes_in, bytes_out) in deltas.items():
+            profile = profiles.get(name, 'unknown')
+            total_in, total_out = by_profile.get(profile, (0, 0))
+            by_profile[profile] = (total_in + bytes_in, total_out + bytes_out)
+
+        rows = [('user', name, bytes_in, bytes_out) for name, (bytes_in, bytes_out) in deltas.items()]
+        rows += [('profile', name, bytes_in, bytes_out) for name, (bytes_in, bytes_out) in by_profile.items()]
+        await asyncio.to_thread(self.db.record_usage, router, rows, int(time.time()))
+        return len(deltas)
+
+    async def run(self):
+        """أخذ العينات دورياً من جميع الراوترات المتصلة"""
+        while True:
+            for client in self.pool.clients():
+                try:
+                    await self.sample(client)
+                except Exception as e:
+                    logger.error(f"خطأ في تسجيل استهلاك {client.device}: {e}")
+
+            if time.monotonic() - self._last_prune >= 3600:
+                self._last_prune = time.monotonic()
+                await asyncio.to_thread(self.db.prune_usage, USAGE_RETENTION)
+
+            await asyncio.sleep(self.interval)